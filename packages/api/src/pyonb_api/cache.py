@@ -0,0 +1,203 @@
+"""Content-addressed cache of OCR results."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from enum import StrEnum
+from pathlib import Path
+from typing import BinaryIO
+
+logger = logging.getLogger()
+
+# Directory the OCR result cache is stored in
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", default="ocr-cache")
+# Maximum size of the OCR result cache, in MB. Set to 0 to disable caching
+OCR_CACHE_MAX_SIZE_MB = float(os.getenv("OCR_CACHE_MAX_SIZE_MB", default="1024"))
+
+# Size of the chunks documents are read in to hash them
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class CacheMode(StrEnum):
+    """
+    How a request uses the OCR result cache.
+
+    - use: return cached results if present, otherwise run OCR and cache the result
+    - bypass: always run OCR and do not cache the result
+    - refresh: discard any cached result, run OCR and cache the new result
+    """
+
+    USE = "use"
+    BYPASS = "bypass"
+    REFRESH = "refresh"
+
+
+class ResultCache:
+    """
+    On-disk OCR result cache with least-recently-used eviction.
+
+    Each result is stored in its own file, named by its key. Reading a result updates the file's modification time,
+    and when the cache grows beyond `max_bytes` the least recently used results are deleted.
+
+    Hit/miss counters are kept per process (i.e. per uvicorn worker).
+    """
+
+    def __init__(self, cache_dir: str | Path, max_bytes: int) -> None:
+        """Set up the cache; its directory is only created when it is first used."""
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._opened = False
+
+    def _open(self) -> None:
+        """Create the cache directory and measure the results already in it, the first time the cache is used."""
+        if self._opened:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.size = sum(f.stat().st_size for f in self._files())
+        self._opened = True
+
+    @property
+    def enabled(self) -> bool:
+        """Whether results are cached at all."""
+        return self.max_bytes > 0
+
+    def _files(self) -> list[Path]:
+        return list(self.cache_dir.glob("*.json"))
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def _size_of(self, path: Path) -> int:
+        try:
+            return path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def get(self, key: str) -> str | None:
+        """Return the cached result for key, or None if it is not cached."""
+        if not self.enabled:
+            return None
+        self._open()
+        path = self._path(key)
+        try:
+            result = path.read_text(encoding="utf-8")
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result: str) -> None:
+        """Cache a result, evicting least recently used results if the cache is full."""
+        if not self.enabled:
+            return
+        self._open()
+        path = self._path(key)
+        # write to a temporary file first, so other workers never read a partly written result
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(result)
+        # a result replacing an earlier one for the same key only grows the cache by the difference
+        replaced = self._size_of(path)
+        Path(tmp_name).replace(path)
+        self.size += self._size_of(path) - replaced
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def invalidate(self, key: str) -> None:
+        """Remove the cached result for key, if any."""
+        if not self.enabled:
+            return
+        self._open()
+        path = self._path(key)
+        size = self._size_of(path)
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return
+        self.size = max(0, self.size - size)
+
+    def evict(self) -> None:
+        """Delete least recently used results until the cache fits in max_bytes."""
+        self._open()
+        # other workers share the cache directory, so recompute the size from disk
+        files = []
+        for f in self._files():
+            try:
+                files.append((f.stat(), f))
+            except FileNotFoundError:
+                continue
+        files.sort(key=lambda entry: entry[0].st_mtime)
+        self.size = sum(stat.st_size for stat, _ in files)
+        for stat, f in files:
+            if self.size <= self.max_bytes:
+                break
+            f.unlink(missing_ok=True)
+            self.size -= stat.st_size
+            self.evictions += 1
+            logger.info("Evicted %s from OCR result cache", f.name)
+
+    def clear(self) -> None:
+        """Delete every cached result."""
+        if not self.enabled:
+            return
+        self._open()
+        for f in self._files():
+            f.unlink(missing_ok=True)
+        self.size = 0
+
+    def stats(self) -> dict:
+        """Cache size and hit/miss counters."""
+        if self.enabled:
+            self._open()
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._files()) if self.enabled else 0,
+            "size_in_bytes": self.size,
+            "max_size_in_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+result_cache = ResultCache(OCR_CACHE_DIR, max_bytes=int(OCR_CACHE_MAX_SIZE_MB * 1024 * 1024))
+
+
+def hash_file(file: BinaryIO) -> str:
+    """SHA-256 of an open binary file's content; the file is rewound afterwards."""
+    file.seek(0)
+    digest = hashlib.sha256()
+    while chunk := file.read(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def cache_key(content_hash: str, engine: str, options: dict[str, str] | None = None) -> str:
+    """Cache key for a document's OCR result from an engine run with the given options."""
+    key = json.dumps([content_hash, engine, sorted((options or {}).items())])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+async def lookup(key: str, mode: CacheMode) -> str | None:
+    """Return the cached OCR result for key, unless the cache mode says to ignore (or discard) it."""
+    if mode == CacheMode.REFRESH:
+        await asyncio.to_thread(result_cache.invalidate, key)
+    if mode != CacheMode.USE:
+        return None
+    return await asyncio.to_thread(result_cache.get, key)
+
+
+async def store(key: str, mode: CacheMode, result: str) -> None:
+    """Cache an OCR result, unless the cache mode is bypass."""
+    if mode != CacheMode.BYPASS:
+        await asyncio.to_thread(result_cache.put, key, result)
@@ -0,0 +1,106 @@
+"""Single-flight coalescing: identical OCR requests in flight at the same time share one request to the OCR service."""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TypeVar
+
+from fastapi import UploadFile
+
+from pyonb_api.metrics import COALESCED_REQUESTS
+from pyonb_api.uploads import spool_upload
+
+logger = logging.getLogger()
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Call:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Calls in flight, by key.
+
+    The first caller with a key starts the call; callers with the same key that arrive before it finishes wait for
+    it, and get the same result (or exception). The call runs in its own task, so it carries on for the others if the
+    caller that started it goes away, and is only cancelled once every caller has gone.
+
+    Calls are only shared within a process, i.e. by requests to the same uvicorn worker.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty set of calls."""
+        self._calls: dict[Hashable, _Call] = {}
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if key in self._calls and self._calls[key].task is task:
+            del self._calls[key]
+        # the exception is raised to the waiters; don't also report it as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Return the result of fn(), or of the call in flight with the same key, and whether it was shared."""
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task: self._finished(key, task))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.waiters == 1:
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def __len__(self) -> int:
+        """Number of calls in flight."""
+        return len(self._calls)
+
+
+in_flight = SingleFlight()
+
+
+async def coalesce(key: Hashable, engine: str, fn: Callable[[], Awaitable[T]]) -> T:
+    """
+    Run fn(), a request to an OCR service, unless an identical request is already in flight.
+
+    If one is, wait for its result instead of sending another. The key is the result's cache key and the kind of
+    call, e.g. ("folder", cache_key), as calls of different kinds return results of different types.
+    """
+    result, shared = await in_flight.do(key, fn)
+    if shared:
+        logger.debug("Shared an in-flight %s request", engine)
+        COALESCED_REQUESTS.labels(engine).inc()
+    return result
+
+
+async def coalesce_upload(key: Hashable, engine: str, file: UploadFile, fn: Callable[[Path], Awaitable[T]]) -> T:
+    """
+    Like coalesce, for a request that sends an upload to an OCR service: fn(path) sends the file at path.
+
+    The request that starts the call copies its upload to a temporary file, and the copy is sent rather than the
+    upload itself, which is closed once the request that received it is finished, e.g. if its client goes away while
+    others wait for the result. Requests that share the call don't copy their uploads. The copy is deleted once the
+    request to the service is done.
+    """
+
+    async def send() -> T:
+        document = await spool_upload(file, engine)
+        try:
+            return await fn(document)
+        finally:
+            document.unlink(missing_ok=True)
+
+    return await coalesce(key, engine, send)
@@ -0,0 +1,222 @@
+"""Concurrent OCR inference over a folder of documents."""
+
+import asyncio
+import json
+import logging
+import time
+from collections.abc import AsyncGenerator
+from enum import StrEnum
+from pathlib import Path
+
+import aiohttp
+from fastapi.responses import StreamingResponse
+
+from pyonb_api.cache import CacheMode, cache_key, hash_file, lookup, store
+from pyonb_api.coalesce import coalesce
+from pyonb_api.metrics import stage
+from pyonb_api.pools import BackendPool
+from pyonb_api.sharding import page_headers
+
+logger = logging.getLogger()
+
+# Fields of a document's entry for the page headers of the OCR service's response
+PAGE_FIELDS = {"text_layer_pages": "X-Text-Layer-Pages", "ocr_pages": "X-OCR-Pages"}
+
+# Slots for documents in flight to each OCR service, by engine (see engine_semaphore)
+_semaphores: dict[str, asyncio.Semaphore] = {}
+
+
+class StreamFormat(StrEnum):
+    """
+    How folder results are streamed.
+
+    - ndjson: newline-delimited JSON, one line per document
+    - sse: server-sent events, one `result` event per document, then a `done` event
+    """
+
+    NDJSON = "ndjson"
+    SSE = "sse"
+
+
+def list_pdfs(data_folder: str | Path) -> list[Path]:
+    """Return the PDF files in data_folder, sorted by name."""
+    return sorted(f for f in Path(data_folder).iterdir() if f.suffix == ".pdf")
+
+
+def engine_semaphore(engine: str, concurrency: int) -> asyncio.Semaphore:
+    """
+    The slots for documents in flight to an OCR service, created with `concurrency` slots when first used.
+
+    Every folder request and job worker in the process shares them, so together they send the service at most
+    `concurrency` documents at once.
+    """
+    return _semaphores.setdefault(engine, asyncio.Semaphore(concurrency))
+
+
+def _hash_path(file_path: Path) -> str:
+    with Path.open(file_path, "rb") as f:
+        return hash_file(f)
+
+
+async def post_document(  # noqa: PLR0913
+    pool: BackendPool,
+    path: str,
+    file_path: Path,
+    semaphore: asyncio.Semaphore,
+    engine: str,
+    fields: dict[str, str] | None = None,
+    cache: CacheMode = CacheMode.USE,
+) -> dict:
+    """
+    POST a single document to an OCR service once a concurrency slot is free.
+
+    Cached results are returned without contacting the OCR service, and a document already being OCR'd with the same
+    options waits for that request's result.
+    `status_code` is the OCR service's HTTP status; on errors, the result is the service's error response.
+    `text_layer_pages` and `ocr_pages` list the pages the service took from the PDF's text layer and OCR'd, if it
+    reported them (not for cached results).
+    The duration reported is the time spent on the request itself, not the time spent waiting for a slot.
+    """
+    with stage(engine, "hash"):
+        key = cache_key(await asyncio.to_thread(_hash_path, file_path), engine, fields)
+
+    s1 = time.perf_counter()
+    with stage(engine, "cache"):
+        ocr_result = await lookup(key, cache)
+    cached = ocr_result is not None
+    status_code = 200
+    pages: dict[str, str] = {}
+
+    if not cached:
+
+        async def send() -> tuple[int, str, float, dict[str, str]]:
+            async with semaphore:
+                logger.debug("post request - path: %s, file: %s", path, file_path)
+                start = time.perf_counter()
+
+                with Path.open(file_path, "rb") as pdf_file:
+                    data = aiohttp.FormData()
+                    data.add_field("file", pdf_file, filename=file_path.name, content_type="application/pdf")
+                    for name, value in (fields or {}).items():
+                        data.add_field(name, value)
+
+                    async with pool.post(path, data=data, headers={"accept": "application/json"}) as response:
+                        return response.status, await response.text(), start, page_headers(response.headers)
+
+        try:
+            with stage(engine, "ocr_service"):
+                # the same document already in flight (e.g. from another request) shares its request to the service
+                status_code, ocr_result, s1, pages = await coalesce(("folder", key), engine, send)
+        except aiohttp.ClientError:
+            logger.exception("Request Exception")
+            raise
+
+        # only cache successful OCR results
+        if status_code < 400:  # noqa: PLR2004
+            await store(key, cache, ocr_result)
+
+    s2 = time.perf_counter()
+
+    response_entry = {
+        "filename": file_path.name,
+        "duration_in_second": s2 - s1,
+        "cached": cached,
+        "status_code": status_code,
+        "ocr-result": ocr_result,
+    }
+    for name, header in PAGE_FIELDS.items():
+        if header in pages:
+            response_entry[name] = pages[header]
+    logger.info(
+        "OCR of %s: status %d in %.2f seconds",
+        file_path.name,
+        status_code,
+        s2 - s1,
+        extra={"engine": engine, "cached": cached, "ocr_characters": len(ocr_result)},
+    )
+    return response_entry
+
+
+async def inference_on_folder(  # noqa: PLR0913
+    pool: BackendPool,
+    path: str,
+    data_folder: str | Path,
+    concurrency: int,
+    engine: str,
+    fields: dict[str, str] | None = None,
+    cache: CacheMode = CacheMode.USE,
+) -> dict:
+    """
+    Run OCR inference on every PDF in data_folder with at most `concurrency` requests in flight to the engine.
+
+    All documents are sent to path on the given pool of OCR service backends, and results are returned in filename
+    order.
+    """
+    file_paths = list_pdfs(data_folder)
+    logger.info("OCR of %d PDFs in %s", len(file_paths), data_folder)
+
+    semaphore = engine_semaphore(engine, concurrency)
+
+    t1 = time.perf_counter()
+    ocr_result = await asyncio.gather(
+        *(post_document(pool, path, file_path, semaphore, engine, fields, cache) for file_path in file_paths)
+    )
+    t2 = time.perf_counter()
+
+    return {
+        "total_duration_in_second": t2 - t1,
+        "result": list(ocr_result),
+    }
+
+
+async def iter_folder(  # noqa: PLR0913
+    pool: BackendPool,
+    path: str,
+    data_folder: str | Path,
+    concurrency: int,
+    engine: str,
+    fields: dict[str, str] | None = None,
+    cache: CacheMode = CacheMode.USE,
+) -> AsyncGenerator[dict]:
+    """
+    Run OCR inference on every PDF in data_folder, yielding each document's result as soon as it finishes.
+
+    At most `concurrency` documents are in flight, and the next document is only sent once a result has been
+    taken, so memory use does not grow with the size of the folder, and slow consumers slow down the OCR.
+    """
+    file_paths = iter(list_pdfs(data_folder))
+    semaphore = engine_semaphore(engine, concurrency)
+    pending: set[asyncio.Task] = set()
+    try:
+        while True:
+            for file_path in file_paths:
+                pending.add(asyncio.create_task(post_document(pool, path, file_path, semaphore, engine, fields, cache)))
+                if len(pending) >= concurrency:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # the client went away, or a request failed: don't leave requests running
+        for task in pending:
+            task.cancel()
+
+
+async def _format_stream(results: AsyncGenerator[dict], stream: StreamFormat) -> AsyncGenerator[str]:
+    t1 = time.perf_counter()
+    async for result in results:
+        if stream == StreamFormat.SSE:
+            yield f"event: result\ndata: {json.dumps(result)}\n\n"
+        else:
+            yield json.dumps(result) + "\n"
+    t2 = time.perf_counter()
+    if stream == StreamFormat.SSE:
+        yield f"event: done\ndata: {json.dumps({'total_duration_in_second': t2 - t1})}\n\n"
+
+
+def streaming_response(results: AsyncGenerator[dict], stream: StreamFormat) -> StreamingResponse:
+    """Stream folder results as newline-delimited JSON or server-sent events."""
+    media_type = "text/event-stream" if stream == StreamFormat.SSE else "application/x-ndjson"
+    return StreamingResponse(_format_stream(results, stream), media_type=media_type)
@@ -0,0 +1,458 @@
+"""Asynchronous OCR jobs, persisted in SQLite so they survive restarts."""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from collections.abc import Generator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from enum import StrEnum
+from pathlib import Path
+
+import aiohttp
+
+from pyonb_api.cache import CacheMode
+from pyonb_api.folder import engine_semaphore, post_document
+from pyonb_api.metrics import JOB_QUEUE_DEPTH
+from pyonb_api.pools import get_pool
+
+logger = logging.getLogger()
+
+# SQLite database jobs are stored in
+OCR_JOBS_DB = os.getenv("OCR_JOBS_DB", default="ocr-jobs.sqlite3")
+# Seconds after which a job whose process has stopped sending heartbeats is resumed by another process
+OCR_JOBS_LEASE = float(os.getenv("OCR_JOBS_LEASE", default="30"))
+
+
+class JobStatus(StrEnum):
+    """Status of a job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+
+
+class DocumentStatus(StrEnum):
+    """Status of a single document in a job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+ACTIVE_JOB_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING)
+FINISHED_DOCUMENT_STATUSES = (DocumentStatus.DONE, DocumentStatus.FAILED, DocumentStatus.CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    engine TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    cache TEXT NOT NULL,
+    data_folder TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    heartbeat REAL NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS documents (
+    job_id TEXT NOT NULL REFERENCES jobs (id),
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL,
+    cached INTEGER,
+    duration_in_second REAL,
+    status_code INTEGER,
+    result TEXT,
+    error TEXT,
+    finished_at REAL,
+    -- orders a job's documents by when they finished; set in the same transaction as the status, so documents
+    -- that finish together (e.g. when the job is cancelled) share a number
+    finished_seq INTEGER,
+    PRIMARY KEY (job_id, filename)
+);
+"""
+
+
+@dataclass(frozen=True)
+class Engine:
+    """OCR service jobs can be run with."""
+
+    path: str  # of the OCR endpoint
+    concurrency: int
+
+
+class JobStore:
+    """
+    SQLite store of jobs, their documents and results.
+
+    Every uvicorn worker uses the same database, so jobs can be polled or cancelled through any worker.
+    Each job is owned by the process running it, which sends heartbeats while it does; jobs whose owner has
+    stopped sending heartbeats for `lease` seconds (e.g. after a restart) are adopted and resumed by another process.
+    """
+
+    def __init__(self, path: str | Path, lease: float) -> None:
+        """Set up the store; the database is only created when it is first used."""
+        self.path = Path(path)
+        self.lease = lease
+        self._created = False
+
+    def _create(self) -> None:
+        """Create the database, if it does not exist."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+            # databases created before documents were numbered as they finished
+            columns = {column["name"] for column in db.execute("PRAGMA table_info(documents)").fetchall()}
+            if "finished_seq" not in columns:
+                db.execute("ALTER TABLE documents ADD COLUMN finished_seq INTEGER")
+                db.execute("UPDATE documents SET finished_seq = 1 WHERE finished_at IS NOT NULL")
+        finally:
+            db.close()
+        self._created = True
+
+    @contextmanager
+    def _connect(self) -> Generator[sqlite3.Connection]:
+        """Open a connection, closing it afterwards; an unfinished transaction is rolled back on close."""
+        if not self._created:
+            self._create()
+        # autocommit mode, so transactions are only opened explicitly (with BEGIN IMMEDIATE)
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def create_job(  # noqa: PLR0913
+        self,
+        job_id: str,
+        engine: str,
+        fields: dict[str, str],
+        cache: CacheMode,
+        data_folder: str | Path,
+        filenames: list[str],
+        owner: str,
+    ) -> None:
+        """Add a job, with all its documents queued."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "INSERT INTO jobs (id, engine, fields, cache, data_folder, status, owner, heartbeat, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, engine, json.dumps(fields), cache, str(data_folder), JobStatus.QUEUED, owner, now, now),
+            )
+            db.executemany(
+                "INSERT INTO documents (job_id, position, filename, status) VALUES (?, ?, ?, ?)",
+                [(job_id, i, filename, DocumentStatus.QUEUED) for i, filename in enumerate(filenames)],
+            )
+            db.execute("COMMIT")
+
+    def get_job(self, job_id: str) -> dict | None:
+        """A job's status and the status of each of its documents, without their results."""
+        with self._connect() as db:
+            job = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            documents = db.execute(
+                "SELECT filename, status, cached, duration_in_second, status_code, error FROM documents "
+                "WHERE job_id = ? ORDER BY position",
+                (job_id,),
+            ).fetchall()
+        return {
+            **_job_summary(job),
+            "documents": [
+                {
+                    "filename": doc["filename"],
+                    "status": doc["status"],
+                    "cached": None if doc["cached"] is None else bool(doc["cached"]),
+                    "duration_in_second": doc["duration_in_second"],
+                    "status_code": doc["status_code"],
+                    "error": doc["error"],
+                }
+                for doc in documents
+            ],
+        }
+
+    def list_jobs(self) -> list[dict]:
+        """Every job's status, most recent first."""
+        with self._connect() as db:
+            jobs = db.execute("SELECT * FROM jobs ORDER BY created_at DESC").fetchall()
+        return [_job_summary(job) for job in jobs]
+
+    def results(self, job_id: str) -> list[dict]:
+        """Results of a job's finished documents, in the order they finished."""
+        return self.results_after(job_id, 0)[0]
+
+    def results_after(self, job_id: str, after: int) -> tuple[list[dict], int]:
+        """
+        Results of a job's documents that finished after `after`, in the order they finished.
+
+        `after` is 0, or the number returned by the previous call; only the new documents are read from the database.
+        Returns the results, and the number to pass as `after` next time.
+        """
+        with self._connect() as db:
+            documents = db.execute(
+                "SELECT * FROM documents WHERE job_id = ? AND finished_seq > ? AND status IN (?, ?, ?) "
+                "ORDER BY finished_seq, finished_at",
+                (job_id, after, *FINISHED_DOCUMENT_STATUSES),
+            ).fetchall()
+        results = [
+            {
+                "filename": doc["filename"],
+                "status": doc["status"],
+                "duration_in_second": doc["duration_in_second"],
+                "cached": None if doc["cached"] is None else bool(doc["cached"]),
+                "status_code": doc["status_code"],
+                "error": doc["error"],
+                "ocr-result": doc["result"],
+            }
+            for doc in documents
+        ]
+        return results, max((doc["finished_seq"] for doc in documents), default=after)
+
+    def claim_document(self, job_id: str, filename: str) -> bool:
+        """Mark a queued document as running; False if it is no longer queued (e.g. the job was cancelled)."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            claimed = db.execute(
+                "UPDATE documents SET status = ? WHERE job_id = ? AND filename = ? AND status = ?",
+                (DocumentStatus.RUNNING, job_id, filename, DocumentStatus.QUEUED),
+            ).rowcount
+            if claimed:
+                db.execute(
+                    "UPDATE jobs SET status = ? WHERE id = ? AND status = ?",
+                    (JobStatus.RUNNING, job_id, JobStatus.QUEUED),
+                )
+            db.execute("COMMIT")
+        return bool(claimed)
+
+    def finish_document(self, job_id: str, filename: str, status: DocumentStatus, entry: dict) -> None:
+        """Save a document's result, and complete the job if it was the last document."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute(
+                "UPDATE documents SET status = ?, cached = ?, duration_in_second = ?, status_code = ?, result = ?, "
+                "error = ?, finished_at = ?, "
+                "finished_seq = (SELECT COALESCE(MAX(finished_seq), 0) + 1 FROM documents WHERE job_id = ?) "
+                "WHERE job_id = ? AND filename = ?",
+                (
+                    status,
+                    entry.get("cached"),
+                    entry.get("duration_in_second"),
+                    entry.get("status_code"),
+                    entry.get("ocr-result"),
+                    entry.get("error"),
+                    now,
+                    job_id,
+                    job_id,
+                    filename,
+                ),
+            )
+            db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ? AND NOT EXISTS "
+                "(SELECT 1 FROM documents WHERE job_id = ? AND status IN (?, ?))",
+                (
+                    JobStatus.COMPLETED,
+                    now,
+                    job_id,
+                    JobStatus.RUNNING,
+                    job_id,
+                    DocumentStatus.QUEUED,
+                    DocumentStatus.RUNNING,
+                ),
+            )
+            db.execute("COMMIT")
+
+    def cancel_job(self, job_id: str) -> bool:
+        """Cancel a job's queued documents; documents already being OCR'd are left to finish."""
+        now = time.time()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            cancelled = db.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status IN (?, ?)",
+                (JobStatus.CANCELLED, now, job_id, *ACTIVE_JOB_STATUSES),
+            ).rowcount
+            db.execute(
+                "UPDATE documents SET status = ?, finished_at = ?, "
+                "finished_seq = (SELECT COALESCE(MAX(finished_seq), 0) + 1 FROM documents WHERE job_id = ?) "
+                "WHERE job_id = ? AND status = ?",
+                (DocumentStatus.CANCELLED, now, job_id, job_id, DocumentStatus.QUEUED),
+            )
+            db.execute("COMMIT")
+        return bool(cancelled)
+
+    def heartbeat(self, owner: str) -> None:
+        """Record that the jobs owned by `owner` are still being run."""
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status IN (?, ?)",
+                (time.time(), owner, *ACTIVE_JOB_STATUSES),
+            )
+
+    def adopt_jobs(self, owner: str) -> list[dict]:
+        """
+        Take over jobs whose owner has stopped sending heartbeats.
+
+        Documents that were being OCR'd when the previous owner stopped are queued again.
+        Returns the adopted jobs, with the filenames still to be OCR'd.
+        """
+        now = time.time()
+        adopted = []
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            jobs = db.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) AND owner != ? AND heartbeat < ? ORDER BY created_at",
+                (*ACTIVE_JOB_STATUSES, owner, now - self.lease),
+            ).fetchall()
+            for job in jobs:
+                db.execute("UPDATE jobs SET owner = ?, heartbeat = ? WHERE id = ?", (owner, now, job["id"]))
+                db.execute(
+                    "UPDATE documents SET status = ? WHERE job_id = ? AND status = ?",
+                    (DocumentStatus.QUEUED, job["id"], DocumentStatus.RUNNING),
+                )
+                filenames = [
+                    row["filename"]
+                    for row in db.execute(
+                        "SELECT filename FROM documents WHERE job_id = ? AND status = ? ORDER BY position",
+                        (job["id"], DocumentStatus.QUEUED),
+                    )
+                ]
+                adopted.append({**_job_summary(job), "filenames": filenames})
+            db.execute("COMMIT")
+        return adopted
+
+
+def _job_summary(job: sqlite3.Row) -> dict:
+    return {
+        "job_id": job["id"],
+        "engine": job["engine"],
+        "fields": json.loads(job["fields"]),
+        "cache": job["cache"],
+        "data_folder": job["data_folder"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+class JobRunner:
+    """
+    Runs the documents of each job through their OCR service.
+
+    Documents are put on a local queue per OCR service, and a fixed number of workers per service
+    (the service's concurrency) take documents off the queue. Submitting a job only queues its documents, so
+    the load on the OCR services does not depend on how many jobs are submitted or how many clients are waiting.
+    """
+
+    def __init__(self, store: JobStore) -> None:
+        """Create the runner; workers are started by start()."""
+        self.store = store
+        # identifies this process as the owner of the jobs it runs
+        self.owner = uuid.uuid4().hex
+        self.engines: dict[str, Engine] = {}
+        self._queues: dict[str, asyncio.Queue[tuple[dict, str]]] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self, engines: dict[str, Engine]) -> None:
+        """Start the workers for each OCR service, and resume any jobs left unfinished by a previous process."""
+        self.engines = engines
+        for name, engine in engines.items():
+            self._queues[name] = asyncio.Queue()
+            # shared with folder requests, so jobs and folders together stay within the service's concurrency
+            semaphore = engine_semaphore(name, engine.concurrency)
+            self._tasks.extend(
+                asyncio.create_task(self._work(name, semaphore), name=f"job-worker-{name}-{i}")
+                for i in range(engine.concurrency)
+            )
+        self._tasks.append(asyncio.create_task(self._keep_alive(), name="job-heartbeat"))
+
+    async def stop(self) -> None:
+        """Stop the workers. Unfinished jobs are resumed by the next process to start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def submit(
+        self, engine: str, filenames: list[str], data_folder: str | Path, fields: dict[str, str], cache: CacheMode
+    ) -> str:
+        """Save a job and queue its documents, returning the job id."""
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(
+            self.store.create_job, job_id, engine, fields, cache, data_folder, filenames, self.owner
+        )
+        job = {"job_id": job_id, "engine": engine, "fields": fields, "cache": cache, "data_folder": str(data_folder)}
+        self._enqueue(job, filenames)
+        logger.info("Submitted job %s: %d documents for %s", job_id, len(filenames), engine)
+        return job_id
+
+    def _enqueue(self, job: dict, filenames: list[str]) -> None:
+        for filename in filenames:
+            self._queues[job["engine"]].put_nowait((job, filename))
+        JOB_QUEUE_DEPTH.labels(job["engine"]).inc(len(filenames))
+
+    async def _keep_alive(self) -> None:
+        """Send heartbeats for this process's jobs, and adopt jobs abandoned by other processes."""
+        while True:
+            try:
+                await asyncio.to_thread(self.store.heartbeat, self.owner)
+                for job in await asyncio.to_thread(self.store.adopt_jobs, self.owner):
+                    if job["engine"] not in self._queues:
+                        logger.warning("Cannot resume job %s: unknown engine %s", job["job_id"], job["engine"])
+                        continue
+                    logger.info("Resuming job %s: %d documents left", job["job_id"], len(job["filenames"]))
+                    self._enqueue(job, job["filenames"])
+            except sqlite3.Error:
+                logger.exception("Failed to update job heartbeats")
+            await asyncio.sleep(self.store.lease / 3)
+
+    async def _work(self, engine: str, semaphore: asyncio.Semaphore) -> None:
+        queue = self._queues[engine]
+        while True:
+            job, filename = await queue.get()
+            JOB_QUEUE_DEPTH.labels(engine).dec()
+            try:
+                await self._run_document(engine, semaphore, job, filename)
+            except Exception:
+                logger.exception("Failed to run document %s of job %s", filename, job["job_id"])
+            finally:
+                queue.task_done()
+
+    async def _run_document(self, engine: str, semaphore: asyncio.Semaphore, job: dict, filename: str) -> None:
+        # skip documents cancelled, or taken over by another process, since they were queued
+        if not await asyncio.to_thread(self.store.claim_document, job["job_id"], filename):
+            return
+
+        try:
+            entry = await post_document(
+                get_pool(engine),
+                self.engines[engine].path,
+                Path(job["data_folder"]) / filename,
+                semaphore,
+                engine,
+                job["fields"],
+                CacheMode(job["cache"]),
+            )
+            status = DocumentStatus.DONE if entry["status_code"] < 400 else DocumentStatus.FAILED  # noqa: PLR2004
+        except (aiohttp.ClientError, TimeoutError, OSError) as e:
+            entry = {"error": f"{type(e).__name__}: {e}"}
+            status = DocumentStatus.FAILED
+
+        await asyncio.to_thread(self.store.finish_document, job["job_id"], filename, status, entry)
+
+
+job_runner = JobRunner(JobStore(OCR_JOBS_DB, lease=OCR_JOBS_LEASE))
@@ -0,0 +1,147 @@
+"""
+Logging: structured JSON records, written from a background thread so requests never wait on log I/O.
+
+Records are put on a bounded queue by the logging calls themselves, and formatted and written to stderr
+(or LOG_FILE) by a listener thread. Long messages and arguments are truncated to LOG_MAX_FIELD_LENGTH
+characters before they are queued, and only a LOG_SAMPLE_RATE fraction of DEBUG and INFO records are kept.
+If the queue is full, records are dropped rather than blocking the caller.
+"""
+
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+import reprlib
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", default="INFO").upper()
+# Write logs to this file rather than stderr
+LOG_FILE = os.getenv("LOG_FILE")
+# Maximum length of a log message or argument, e.g. OCR text
+LOG_MAX_FIELD_LENGTH = int(os.getenv("LOG_MAX_FIELD_LENGTH", default="1000"))
+# Fraction of DEBUG and INFO records to keep; warnings and errors are always kept
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", default="1.0"))
+# Number of records waiting to be written before further records are dropped
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", default="10000"))
+
+# attributes of every LogRecord, so anything else was passed as `extra`
+_RECORD_ATTRIBUTES = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+_repr = reprlib.Repr()
+_repr.maxstring = _repr.maxother = LOG_MAX_FIELD_LENGTH
+_repr.maxlist = _repr.maxtuple = _repr.maxdict = _repr.maxset = 20
+
+_listener: QueueListener | None = None
+
+
+def truncate(value: object, max_length: int = LOG_MAX_FIELD_LENGTH) -> object:
+    """Shorten strings, and other objects except numbers as strings, to about max_length characters."""
+    if isinstance(value, str):
+        if len(value) <= max_length:
+            return value
+        return f"{value[:max_length]}... [{len(value) - max_length} more characters]"
+    if value is None or isinstance(value, int | float):
+        return value
+    if isinstance(value, list | tuple | dict | set | frozenset):
+        # reprlib stops early, so the full repr of large collections is never built
+        return _repr.repr(value)
+    return truncate(str(value), max_length)
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as single-line JSON objects, including any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Format record as JSON."""
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, tz=datetime.UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in record.__dict__.items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records below WARNING."""
+
+    def __init__(self, rate: float) -> None:
+        """Keep rate (0-1) of DEBUG and INFO records."""
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Whether to keep record."""
+        return record.levelno >= logging.WARNING or random.random() < self.rate  # noqa: S311
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue records for the listener thread, truncating them first and dropping them if the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        """Queue records on log_queue."""
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Merge the (truncated) arguments into the message, so they can't change before the record is written."""
+        if isinstance(record.args, dict):
+            args: object = {key: truncate(value) for key, value in record.args.items()}
+        else:
+            args = tuple(truncate(arg) for arg in record.args or ())
+        # the arguments are already truncated, so only a long message on its own needs to be
+        message = str(record.msg) % args if record.args else truncate(str(record.msg))
+
+        prepared = logging.makeLogRecord(record.__dict__)
+        prepared.msg = message
+        prepared.args = None
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                setattr(prepared, key, truncate(value))
+        return prepared
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Queue record, or drop it if the queue is full."""
+        try:
+            if self.dropped:
+                warning = logging.makeLogRecord(
+                    {"name": "pyonb.logs", "levelno": logging.WARNING, "levelname": "WARNING"}
+                    | {"msg": f"Dropped {self.dropped} log records, the log queue was full"}
+                )
+                self.queue.put_nowait(warning)
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging() -> None:
+    """Send log records from this process to stderr (or LOG_FILE) as JSON, via a queue and a background thread."""
+    global _listener  # noqa: PLW0603
+    if _listener is not None:
+        return
+
+    handler: logging.Handler = logging.FileHandler(LOG_FILE) if LOG_FILE else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter())
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, handler)
+    _listener.start()
+    # write the records still queued when the process exits
+    atexit.register(_listener.stop)
@@ -1,29 +1,47 @@
 """OCR API Server."""
 
-import datetime
 import logging
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, status
 from fastapi.responses import JSONResponse, RedirectResponse
 
-from .routers import docling, kreuzberg, marker, paddleocr
+from .jobs import job_runner
+from .logs import setup_logging
+from .metrics import instrument
+from .pools import close_pools, open_pools
+from .routers import backends, cache, docling, jobs, kreuzberg, marker, ocr, paddleocr
+from .sessions import close_sessions, open_sessions
 
-_today = datetime.datetime.now(datetime.UTC).strftime("%Y_%m_%d")  # type: ignore[attr-defined] # mypy complains that 'Module has no attribute "UTC"'
-logging.basicConfig(
-    filename=f"pyonb-{_today}.log",
-    format="%(asctime)s %(message)s",
-    filemode="a",
-)
+setup_logging()
 
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
 
-app = FastAPI(swagger_ui_parameters={"tryItOutEnabled": True})
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncGenerator[None]:
+    """Open client sessions to the OCR services, probe their backends and start the job workers; stop on shutdown."""
+    await open_sessions()
+    await open_pools()
+    await job_runner.start(jobs.ENGINES)
+    yield
+    await job_runner.stop()
+    await close_pools()
+    await close_sessions()
+
+
+app = FastAPI(lifespan=lifespan, swagger_ui_parameters={"tryItOutEnabled": True})
+instrument(app)
 
 app.include_router(marker.router)
 app.include_router(paddleocr.router)
 app.include_router(docling.router)
 app.include_router(kreuzberg.router)
+app.include_router(cache.router)
+app.include_router(jobs.router)
+app.include_router(ocr.router)
+app.include_router(backends.router)
 
 
 @app.get("/", include_in_schema=False)
@@ -0,0 +1,255 @@
+"""
+Pools of OCR service replicas.
+
+Each OCR service can have several replicas (backends), e.g. from `docker compose --scale`. Requests go to the
+available backend with the fewest requests in flight. Backends are probed in the background at their /health
+endpoint; a backend that fails POOL_FAILURE_THRESHOLD requests or probes in a row is ejected from the pool, and
+re-admitted by the first successful probe once it has been out for POOL_EJECT_SECONDS.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections.abc import AsyncGenerator
+from contextlib import AbstractAsyncContextManager, asynccontextmanager, suppress
+from dataclasses import dataclass
+from typing import Any
+
+import aiohttp
+
+from pyonb_api.metrics import BACKEND_AVAILABLE, BACKEND_EJECTIONS, BACKEND_OUTSTANDING, remove_backend
+from pyonb_api.sessions import BACKENDS, get_session, health_timeout
+
+logger = logging.getLogger()
+
+# Seconds between health probes of every backend (and lookups of the backends' host names)
+POOL_PROBE_INTERVAL = float(os.getenv("POOL_PROBE_INTERVAL", default="5"))
+# Consecutive failed requests or probes after which a backend is ejected
+POOL_FAILURE_THRESHOLD = int(os.getenv("POOL_FAILURE_THRESHOLD", default="3"))
+# Seconds an ejected backend gets no requests before it can be re-admitted by a successful probe
+POOL_EJECT_SECONDS = float(os.getenv("POOL_EJECT_SECONDS", default="30"))
+
+
+class NoBackendError(aiohttp.ClientConnectionError):
+    """No backend of an OCR service is available."""
+
+
+@dataclass
+class Backend:
+    """One replica of an OCR service."""
+
+    url: str
+    outstanding: int = 0  # requests in flight
+    requests: int = 0  # requests sent, to spread requests between equally loaded backends
+    failures: int = 0  # consecutive failed requests or probes
+    ejected_until: float | None = None  # monotonic time; None if the backend is in the pool
+
+    @property
+    def available(self) -> bool:
+        """Whether the backend is in the pool."""
+        return self.ejected_until is None
+
+
+def pool_hosts(engine: str) -> list[tuple[str, int]]:
+    """
+    Host names (or addresses) and ports of an OCR service's replicas.
+
+    Configured with <SERVICE>_API_HOSTS, a comma-separated list of `host` or `host:port` (port defaults to
+    <SERVICE>_API_PORT); by default <SERVICE>_API_HOST, or the service's docker compose name. Every address a host
+    name resolves to is a backend, so each replica of a scaled docker compose service is used.
+    """
+    prefix = engine.upper()
+    port = int(os.getenv(f"{prefix}_API_PORT", default="0"))
+    hosts = os.getenv(f"{prefix}_API_HOSTS") or os.getenv(f"{prefix}_API_HOST") or engine
+    endpoints = []
+    for host in (host.strip() for host in hosts.split(",")):
+        if not host:
+            continue
+        name, _, host_port = host.rpartition(":") if host.count(":") == 1 else (host, "", "")
+        endpoints.append((name, int(host_port)) if host_port else (host, port))
+    return endpoints
+
+
+def _url(address: str, port: int) -> str:
+    return f"http://[{address}]:{port}" if ":" in address else f"http://{address}:{port}"
+
+
+class BackendPool:
+    """Replicas of an OCR service, with least-outstanding-requests balancing and circuit breaking."""
+
+    def __init__(self, engine: str, hosts: list[tuple[str, int]]) -> None:
+        """Create the pool; backends are found by resolve()."""
+        self.engine = engine
+        self.hosts = hosts
+        self.backends: dict[str, Backend] = {}
+        # backend URLs each host was last resolved to
+        self._resolved: dict[tuple[str, int], set[str]] = {}
+
+    async def resolve(self) -> None:
+        """Find the backends behind the pool's host names, adding new replicas and dropping ones that have gone."""
+        loop = asyncio.get_running_loop()
+        for host, port in self.hosts:
+            try:
+                addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            except OSError as e:
+                # e.g. the service isn't running: keep what we had, so its backends are ejected by failing probes
+                logger.debug("Could not resolve %s for %s: %s", host, self.engine, e)
+                continue
+            self._resolved[host, port] = {_url(str(address[4][0]), port) for address in addresses}
+        urls = set().union(*self._resolved.values())
+
+        for url in urls - self.backends.keys():
+            logger.info("Adding %s backend %s", self.engine, url)
+            self.backends[url] = Backend(url)
+            BACKEND_AVAILABLE.labels(self.engine, url).set(1)
+        for url in self.backends.keys() - urls:
+            logger.info("Removing %s backend %s", self.engine, url)
+            del self.backends[url]
+            remove_backend(self.engine, url)
+
+    def _tracked(self, backend: Backend) -> bool:
+        """Whether backend is still in the pool's backends, so its metrics can be updated (not re-created)."""
+        return self.backends.get(backend.url) is backend
+
+    def available(self) -> bool:
+        """Whether any backend is in the pool."""
+        return any(backend.available for backend in self.backends.values())
+
+    def choose(self) -> Backend:
+        """The available backend with the fewest requests in flight; raises NoBackendError if there are none."""
+        backends = [backend for backend in self.backends.values() if backend.available]
+        if not backends:
+            msg = f"No {self.engine} backend is available"
+            raise NoBackendError(msg)
+        return min(backends, key=lambda backend: (backend.outstanding, backend.requests))
+
+    def record_success(self, backend: Backend) -> None:
+        """Record that a request or probe to backend succeeded."""
+        backend.failures = 0
+
+    def record_failure(self, backend: Backend) -> None:
+        """Record that a request or probe to backend failed, ejecting it after POOL_FAILURE_THRESHOLD failures."""
+        backend.failures += 1
+        if backend.failures >= POOL_FAILURE_THRESHOLD and backend.available:
+            logger.warning("Ejecting %s backend %s after %d failures", self.engine, backend.url, backend.failures)
+            backend.ejected_until = time.monotonic() + POOL_EJECT_SECONDS
+            if self._tracked(backend):
+                BACKEND_AVAILABLE.labels(self.engine, backend.url).set(0)
+                BACKEND_EJECTIONS.labels(self.engine, backend.url).inc()
+
+    async def probe(self, backend: Backend) -> None:
+        """Check a backend's health, re-admitting it if it is healthy and has been ejected for long enough."""
+        try:
+            async with get_session(self.engine).get(
+                f"{backend.url}/health", timeout=health_timeout(self.engine)
+            ) as response:
+                healthy = response.ok
+        except (aiohttp.ClientError, TimeoutError):
+            healthy = False
+
+        if not healthy:
+            self.record_failure(backend)
+            return
+        self.record_success(backend)
+        if backend.ejected_until is not None and time.monotonic() >= backend.ejected_until:
+            logger.info("Re-admitting %s backend %s", self.engine, backend.url)
+            backend.ejected_until = None
+            if self._tracked(backend):
+                BACKEND_AVAILABLE.labels(self.engine, backend.url).set(1)
+
+    async def probe_all(self) -> None:
+        """Look up the backends, and probe each of them."""
+        await self.resolve()
+        await asyncio.gather(*(self.probe(backend) for backend in list(self.backends.values())))
+
+    @asynccontextmanager
+    async def request(self, method: str, path: str, **kwargs: Any) -> AsyncGenerator[aiohttp.ClientResponse]:  # noqa: ANN401
+        """
+        Send a request to the least busy backend, like aiohttp.ClientSession.request with a path rather than a URL.
+
+        Connection errors, timeouts and 5xx responses count as failures of the backend.
+        """
+        backend = self.choose()
+        backend.outstanding += 1
+        backend.requests += 1
+        BACKEND_OUTSTANDING.labels(self.engine, backend.url).inc()
+        try:
+            async with get_session(self.engine).request(method, f"{backend.url}{path}", **kwargs) as response:
+                if response.status >= 500:  # noqa: PLR2004
+                    self.record_failure(backend)
+                else:
+                    self.record_success(backend)
+                yield response
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, TimeoutError):
+            self.record_failure(backend)
+            raise
+        finally:
+            backend.outstanding -= 1
+            if self._tracked(backend):
+                BACKEND_OUTSTANDING.labels(self.engine, backend.url).dec()
+
+    def get(self, path: str, **kwargs: Any) -> AbstractAsyncContextManager[aiohttp.ClientResponse]:  # noqa: ANN401
+        """GET path from the least busy backend."""
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs: Any) -> AbstractAsyncContextManager[aiohttp.ClientResponse]:  # noqa: ANN401
+        """POST to path on the least busy backend."""
+        return self.request("POST", path, **kwargs)
+
+    def status(self) -> list[dict]:
+        """State of each backend."""
+        return [
+            {
+                "url": backend.url,
+                "available": backend.available,
+                "outstanding": backend.outstanding,
+                "failures": backend.failures,
+            }
+            for backend in sorted(self.backends.values(), key=lambda backend: backend.url)
+        ]
+
+
+_pools: dict[str, BackendPool] = {}
+_probe_task: asyncio.Task | None = None
+
+
+async def _probe_forever() -> None:
+    while True:
+        await asyncio.sleep(POOL_PROBE_INTERVAL)
+        try:
+            await asyncio.gather(*(pool.probe_all() for pool in _pools.values()))
+        except Exception:
+            logger.exception("Failed to probe the OCR service backends")
+
+
+async def open_pools() -> None:
+    """Create a pool for each OCR service, find its backends, and start probing them in the background."""
+    global _probe_task  # noqa: PLW0603
+    for engine in BACKENDS:
+        _pools[engine] = BackendPool(engine, pool_hosts(engine))
+    # only look the backends up, rather than probing them, so slow services don't delay startup
+    await asyncio.gather(*(pool.resolve() for pool in _pools.values()))
+    _probe_task = asyncio.create_task(_probe_forever())
+
+
+async def close_pools() -> None:
+    """Stop probing the backends."""
+    global _probe_task  # noqa: PLW0603
+    if _probe_task is not None:
+        _probe_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await _probe_task
+        _probe_task = None
+    _pools.clear()
+
+
+def get_pool(engine: str) -> BackendPool:
+    """Return the pool of an OCR service's backends."""
+    return _pools[engine]
+
+
+def pools_status() -> dict[str, list[dict]]:
+    """State of every backend of every OCR service."""
+    return {engine: pool.status() for engine, pool in _pools.items()}
@@ -0,0 +1,23 @@
+"""Routers for the pools of OCR service backends."""
+
+import logging
+
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from pyonb_api.pools import pools_status
+
+logger = logging.getLogger()
+
+router = APIRouter()
+
+
+@router.get("/backends")
+async def backends() -> JSONResponse:
+    """
+    The backends (replicas) of each OCR service, whether they are in the pool, and their requests in flight.
+
+    Note: each uvicorn worker balances requests and tracks backend health on its own.
+    """
+    logger.info("[GET] /backends")
+    return JSONResponse(status_code=status.HTTP_200_OK, content=pools_status())
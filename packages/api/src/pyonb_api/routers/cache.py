@@ -0,0 +1,33 @@
+"""Routers for the OCR result cache."""
+
+import asyncio
+import logging
+
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from pyonb_api.cache import result_cache
+
+logger = logging.getLogger()
+
+router = APIRouter()
+
+
+@router.get("/cache")
+async def cache_stats() -> JSONResponse:
+    """
+    OCR result cache statistics.
+
+    Note: hit/miss counters are per uvicorn worker.
+    """
+    logger.info("[GET] /cache")
+    stats = await asyncio.to_thread(result_cache.stats)
+    return JSONResponse(status_code=status.HTTP_200_OK, content=stats)
+
+
+@router.delete("/cache")
+async def clear_cache() -> JSONResponse:
+    """Delete every cached OCR result."""
+    logger.info("[DELETE] /cache")
+    await asyncio.to_thread(result_cache.clear)
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"status": "cleared"})
@@ -1,5 +1,7 @@
 """Routers for Docling OCR."""
 
+import asyncio
+import json
 import logging
 import os
 import time
@@ -7,10 +9,17 @@ from pathlib import Path
 from typing import Annotated, Any
 
 import aiohttp
-import requests
 from dotenv import load_dotenv
 from fastapi import APIRouter, File, HTTPException, UploadFile, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+
+from pyonb_api.cache import CacheMode, cache_key, hash_file, lookup, store
+from pyonb_api.coalesce import coalesce_upload
+from pyonb_api.folder import StreamFormat, inference_on_folder, iter_folder, streaming_response
+from pyonb_api.metrics import observe_upload_read, stage
+from pyonb_api.pools import get_pool
+from pyonb_api.sessions import health_timeout
+from pyonb_api.sharding import page_headers, plan_shards, post_shards
 
 load_dotenv()
 
@@ -20,8 +29,10 @@ else:
     e = "DOCLING_API_PORT environment variable not found."
     raise NameError(e)
 
+# Maximum number of documents sent to the docling service at once by inference_folder
+DOCLING_CONCURRENCY = int(os.getenv("DOCLING_CONCURRENCY", default="4"))
+
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
 
 router = APIRouter()
 
@@ -30,12 +41,9 @@ router = APIRouter()
 async def health() -> dict[str, Any]:
     """Test aliveness endpoint for Docling."""
     logger.info("[GET] /docling/health")
-    url = f"http://docling:{DOCLING_API_PORT}/health"
-
     try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60 * 60)) as session:  # noqa: SIM117
-            async with session.get(url) as response:
-                response.raise_for_status()
+        async with get_pool("docling").get("/health", timeout=health_timeout("docling")) as response:
+            response.raise_for_status()
     except aiohttp.ClientError:
         logger.exception("Failed to connect to docling service")
         raise
@@ -47,55 +55,93 @@ async def health() -> dict[str, Any]:
 
 
 @router.post("/docling/inference_single", status_code=status.HTTP_200_OK)
-async def inference_single_doc(file_upload: Annotated[UploadFile, File()] = None) -> JSONResponse:
+async def inference_single_doc(
+    file_upload: Annotated[UploadFile, File()] = None,
+    cache: CacheMode = CacheMode.USE,
+    shard_pages: int | None = None,
+) -> JSONResponse:
     """
     Runs Docling OCR inference on a single document.
 
-    UploadFile object forwarded onto inference API.
+    UploadFile object forwarded onto inference API, unless its result is already cached (see `cache`).
+    PDFs with more than `shard_pages` pages (OCR_SHARD_PAGES by default; 0 to not split documents) are split into
+    page ranges, which are OCR'd concurrently (up to DOCLING_CONCURRENCY at a time) and joined in page order.
     """
     logger.info("[POST] /docling/inference_single_doc")
-    url = f"http://docling:{DOCLING_API_PORT}/inference"
-
-    data = aiohttp.FormData()
-    data.add_field(
-        "file",
-        file_upload.file,
-        filename=file_upload.filename,
-        content_type=file_upload.content_type,
-    )
+    path = "/inference"
+
+    observe_upload_read("docling")
+
     headers = {"accept": "application/json"}
 
-    logger.info("post request - url: %s", url)
-    logger.info("post request - data: %s", data)
-    logger.info("post request - headers: %s", headers)
+    logger.debug("post request - path: %s", path)
+    logger.debug("post request - headers: %s", headers)
+
+    with stage("docling", "hash"):
+        key = cache_key(await asyncio.to_thread(hash_file, file_upload.file), "docling")
 
     t1 = time.perf_counter()
-    try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60 * 60)) as session:  # noqa: SIM117
-            async with session.post(url, data=data, headers=headers) as response:
-                response.raise_for_status()
-                ocr_result = await response.json()
-    except aiohttp.ClientError:
-        logger.exception("Request Exception")
-        raise
+    with stage("docling", "cache"):
+        ocr_text = await lookup(key, cache)
+    cached = ocr_text is not None
+    # pages taken from the text layer and OCR'd, as reported by the service (not kept for cached results)
+    pages: dict[str, str] = {}
+    if not cached:
+
+        async def send(document: Path) -> tuple[str, dict[str, str]]:
+            with document.open("rb") as file:
+                shards = await asyncio.to_thread(plan_shards, file, shard_pages)
+                if len(shards) > 1:
+                    return await post_shards(
+                        get_pool("docling"),
+                        path,
+                        document,
+                        str(file_upload.filename),
+                        file_upload.content_type,
+                        shards,
+                        concurrency=DOCLING_CONCURRENCY,
+                    )
+                data = aiohttp.FormData()
+                data.add_field("file", file, filename=file_upload.filename, content_type=file_upload.content_type)
+                logger.debug("post request - file: %s", data)
+                async with get_pool("docling").post(path, data=data, headers=headers) as response:
+                    response.raise_for_status()
+                    return await response.text(), page_headers(response.headers)
+
+        try:
+            with stage("docling", "ocr_service"):
+                # identical requests already in flight share one request to the service
+                ocr_text, pages = await coalesce_upload(("single", key), "docling", file_upload, send)
+        except aiohttp.ClientError:
+            logger.exception("Request Exception")
+            raise
+        await store(key, cache, ocr_text)
+    ocr_result = json.loads(ocr_text)
     t2 = time.perf_counter()
 
     response_json = {
         "filename": str(file_upload.filename),
         "duration_in_second": t2 - t1,
+        "cached": cached,
         "ocr-result": ocr_result,
     }
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=response_json)
+    with stage("docling", "serialisation"):
+        return JSONResponse(status_code=status.HTTP_200_OK, content=response_json, headers=pages)
 
 
 @router.post("/docling/inference_folder")
-async def inference_folder() -> JSONResponse:
-    """Runs Docling OCR inference on multiple documents in a folder."""
+async def inference_folder(cache: CacheMode = CacheMode.USE, stream: StreamFormat | None = None) -> Response:
+    """
+    Runs Docling OCR inference on multiple documents in a folder.
+
+    Documents with cached results (see `cache`) are not sent to the service again.
+    With `stream`, each document's result is streamed as soon as it finishes (see StreamFormat), rather than
+    returning every result at the end.
+    Up to DOCLING_CONCURRENCY documents are sent to the Docling service at the same time.
+    """
     logger.info("[POST] /docling/inference_folder")
-    url = f"http://docling:{DOCLING_API_PORT}/inference"
-    # URL of docling service
-    # TODO(tom): configure with env var (e.g. so can set 127.0.0.1 if running on host)
+    path = "/inference"
 
     DATA_FOLDER = os.environ.get("DATA_FOLDER")
     if DATA_FOLDER is None:
@@ -104,47 +150,24 @@ async def inference_folder() -> JSONResponse:
             detail="DATA_FOLDER environment variable not defined.",
         )
 
-    filenames = [str(f.name) for f in Path(DATA_FOLDER).iterdir() if f.suffix == ".pdf"]
-    logger.info("Filenames in %s: %s", DATA_FOLDER, filenames)
-
-    ocr_result = []
-    t1 = time.perf_counter()
-    for filename in filenames:
-        abs_file_path = Path(DATA_FOLDER) / Path(filename)
-        logger.info("abs_file_path: %s", abs_file_path)
-        if not abs_file_path.exists():
-            e = f"{abs_file_path!s} file not found or does not exist."
-            logger.exception(FileNotFoundError(e))
-            raise FileNotFoundError(e)
-
-        with Path.open(abs_file_path, "rb") as pdf_file:
-            # Send the file via POST request
-            s1 = time.perf_counter()
-
-            files = {"file": (str(filename), pdf_file, "application/pdf")}
-            headers = {"accept": "application/json"}
-
-            logger.info("post request - url: %s", url)
-            logger.info("post request - files: %s", files)
-            logger.info("post request - headers: %s", headers)
-
-            # nb: timeout currently arbitrarily one hour
-            response = requests.post(url, files=files, headers=headers, timeout=60 * 60)  # noqa: ASYNC210
-
-            s2 = time.perf_counter()
-            response_entry = {
-                "filename": filename,
-                "duration_in_second": s2 - s1,
-                "ocr-result": response.text,
-            }
-            logger.info("Filename: %s", filename)
-            logger.info("response_entry: %s", response_entry)
-            ocr_result.append(response_entry)
-
-    t2 = time.perf_counter()
-    response_json = {
-        "total_duration_in_second": t2 - t1,
-        "result": ocr_result,
-    }
+    if stream is not None:
+        results = iter_folder(
+            get_pool("docling"),
+            path,
+            DATA_FOLDER,
+            concurrency=DOCLING_CONCURRENCY,
+            engine="docling",
+            cache=cache,
+        )
+        return streaming_response(results, stream)
+
+    response_json = await inference_on_folder(
+        get_pool("docling"),
+        path,
+        DATA_FOLDER,
+        concurrency=DOCLING_CONCURRENCY,
+        engine="docling",
+        cache=cache,
+    )
 
     return JSONResponse(status_code=status.HTTP_200_OK, content=response_json)
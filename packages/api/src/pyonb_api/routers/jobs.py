@@ -0,0 +1,171 @@
+"""Routers for asynchronous OCR jobs."""
+
+import asyncio
+import json
+import logging
+import os
+from collections.abc import AsyncGenerator
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, field_validator
+
+from pyonb_api.cache import CacheMode
+from pyonb_api.folder import list_pdfs
+from pyonb_api.jobs import ACTIVE_JOB_STATUSES, Engine, job_runner
+from pyonb_api.routers import docling, marker, paddleocr
+
+logger = logging.getLogger()
+
+router = APIRouter()
+
+# OCR services jobs can be run with; documents are sent to each with the same concurrency as inference_folder
+ENGINES = {
+    "marker": Engine(path="/inference", concurrency=marker.MARKER_CONCURRENCY),
+    "docling": Engine(path="/inference", concurrency=docling.DOCLING_CONCURRENCY),
+    "paddleocr": Engine(path="/inference", concurrency=paddleocr.PADDLEOCR_CONCURRENCY),
+}
+
+# Seconds between checks for newly finished documents when streaming a job's results
+STREAM_POLL_INTERVAL = 1.0
+
+
+class JobRequest(BaseModel):
+    """
+    A batch of documents in DATA_FOLDER to OCR.
+
+    `files` are filenames in DATA_FOLDER, each listed once; if not given, every PDF in DATA_FOLDER is OCR'd.
+    `model_version` and `model_lang` are only used by paddleocr.
+    """
+
+    engine: Literal["marker", "docling", "paddleocr"]
+    files: list[str] | None = None
+    model_version: str | None = None
+    model_lang: str | None = None
+    cache: CacheMode = CacheMode.USE
+
+    @field_validator("files")
+    @classmethod
+    def files_unique(cls, files: list[str] | None) -> list[str] | None:
+        """Reject files listed more than once (a 422 response)."""
+        if files is None:
+            return None
+        duplicates = sorted({filename for filename in files if files.count(filename) > 1})
+        if duplicates:
+            msg = f"Files listed more than once: {duplicates}"
+            raise ValueError(msg)
+        return files
+
+
+def _get_job(job_id: str) -> dict:
+    job = job_runner.store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job
+
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(request: JobRequest) -> JSONResponse:
+    """
+    Submit a batch of documents to OCR, returning a job id straight away.
+
+    Use the job id to poll the job's status (`GET /jobs/{job_id}`), fetch (`GET /jobs/{job_id}/results`) or stream
+    (`GET /jobs/{job_id}/stream`) its results, or cancel it (`DELETE /jobs/{job_id}`).
+    """
+    logger.info("[POST] /jobs - engine: %s", request.engine)
+
+    DATA_FOLDER = os.environ.get("DATA_FOLDER")
+    if DATA_FOLDER is None:
+        raise HTTPException(
+            status_code=500,
+            detail="DATA_FOLDER environment variable not defined.",
+        )
+
+    available = {f.name for f in list_pdfs(DATA_FOLDER)}
+    filenames = sorted(available) if request.files is None else request.files
+    missing = [filename for filename in filenames if filename not in available]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"PDF files not found in DATA_FOLDER: {missing}")
+    if not filenames:
+        raise HTTPException(status_code=400, detail="No PDF files to OCR.")
+
+    # field names expected by the paddleocr /inference API
+    fields = {}
+    if request.engine == "paddleocr":
+        if request.model_version:
+            fields["ocr_version"] = request.model_version
+        if request.model_lang:
+            fields["lang"] = request.model_lang
+
+    job_id = await job_runner.submit(request.engine, filenames, DATA_FOLDER, fields, request.cache)
+
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"job_id": job_id, "status": "queued", "documents": len(filenames)},
+    )
+
+
+@router.get("/jobs")
+async def list_jobs() -> JSONResponse:
+    """Every job's status, most recent first."""
+    logger.info("[GET] /jobs")
+    jobs = await asyncio.to_thread(job_runner.store.list_jobs)
+    return JSONResponse(status_code=status.HTTP_200_OK, content=jobs)
+
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str) -> JSONResponse:
+    """A job's status, and the status of each of its documents."""
+    logger.info("[GET] /jobs/%s", job_id)
+    job = await asyncio.to_thread(_get_job, job_id)
+    return JSONResponse(status_code=status.HTTP_200_OK, content=job)
+
+
+@router.get("/jobs/{job_id}/results")
+async def job_results(job_id: str) -> JSONResponse:
+    """Results of the job's documents that have finished so far."""
+    logger.info("[GET] /jobs/%s/results", job_id)
+    job = await asyncio.to_thread(_get_job, job_id)
+    results = await asyncio.to_thread(job_runner.store.results, job_id)
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={"job_id": job_id, "status": job["status"], "result": results},
+    )
+
+
+async def _stream_results(job_id: str) -> AsyncGenerator[str]:
+    # results of documents that finished up to this point in the job have been sent
+    sent_until = 0
+    while True:
+        # read the status before the results, so no results are missed if the job finishes in between
+        job = await asyncio.to_thread(_get_job, job_id)
+        results, sent_until = await asyncio.to_thread(job_runner.store.results_after, job_id, sent_until)
+        for result in results:
+            yield json.dumps(result) + "\n"
+        if job["status"] not in ACTIVE_JOB_STATUSES:
+            return
+        await asyncio.sleep(STREAM_POLL_INTERVAL)
+
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_job_results(job_id: str) -> StreamingResponse:
+    """
+    Stream the job's results as newline-delimited JSON, one line per document as it finishes.
+
+    Results of documents that have already finished are sent first; the stream ends when the job ends.
+    """
+    logger.info("[GET] /jobs/%s/stream", job_id)
+    await asyncio.to_thread(_get_job, job_id)
+    return StreamingResponse(_stream_results(job_id), media_type="application/x-ndjson")
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str) -> JSONResponse:
+    """Cancel a job. Documents already being OCR'd are finished; the rest are cancelled."""
+    logger.info("[DELETE] /jobs/%s", job_id)
+    await asyncio.to_thread(_get_job, job_id)
+    cancelled = await asyncio.to_thread(job_runner.store.cancel_job, job_id)
+    if not cancelled:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} has already finished.")
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"job_id": job_id, "status": "cancelled"})
@@ -1,14 +1,23 @@
 """Routers for Kreuzberg OCR."""
 
+import asyncio
+import json
 import logging
 import os
 import time
+from pathlib import Path
 from typing import Annotated, Any
 
 import aiohttp
 from fastapi import APIRouter, File, UploadFile, status
 from fastapi.responses import JSONResponse
 
+from pyonb_api.cache import CacheMode, cache_key, hash_file, lookup, store
+from pyonb_api.coalesce import coalesce_upload
+from pyonb_api.metrics import observe_upload_read, stage
+from pyonb_api.pools import get_pool
+from pyonb_api.sessions import health_timeout
+
 # Creating an object
 logger = logging.getLogger()
 
@@ -21,12 +30,9 @@ KREUZBERG_API_PORT = os.getenv("KREUZBERG_API_PORT")
 async def healthcheck() -> dict[str, Any]:
     """Test aliveness endpoint for Kreuzberg."""
     logger.info("[GET] /kreuzberg/health")
-    url = f"http://kreuzberg:{KREUZBERG_API_PORT}/health"
-
     try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60 * 60)) as session:  # noqa: SIM117
-            async with session.get(url) as response:
-                response.raise_for_status()
+        async with get_pool("kreuzberg").get("/health", timeout=health_timeout("kreuzberg")) as response:
+            response.raise_for_status()
     except aiohttp.ClientError:
         logger.exception("Failed to connect to kreuzberg service")
         raise
@@ -38,37 +44,53 @@ async def healthcheck() -> dict[str, Any]:
 
 
 @router.post("/kreuzberg-ocr/inference_single", status_code=status.HTTP_200_OK)
-async def inference_single_doc(file_upload: Annotated[UploadFile, File()] = None) -> JSONResponse:
+async def inference_single_doc(
+    file_upload: Annotated[UploadFile, File()] = None,
+    cache: CacheMode = CacheMode.USE,
+) -> JSONResponse:
     """
     Runs Kreuzberg OCR inference on a single document.
 
-    UploadFile object forwarded onto inference API.
+    UploadFile object forwarded onto inference API, unless its result is already cached (see `cache`).
     """
     logger.info("[POST] /kreuzberg-ocr/extract")
-    url = f"http://kreuzberg:{KREUZBERG_API_PORT}/extract"  # fwd request to kreuzberg service
-
-    data = aiohttp.FormData()
-    data.add_field(
-        "data",  # field name expected by Kreuzberg's /extract API
-        file_upload.file,
-        filename=file_upload.filename,
-        content_type=file_upload.content_type,
-    )
+    path = "/extract"
+
+    observe_upload_read("kreuzberg")
+
     headers = {"accept": "application/json"}
 
-    logger.info("post request - url: %s", url)
-    logger.info("post request - data: %s", data)
-    logger.info("post request - headers: %s", headers)
+    logger.debug("post request - path: %s", path)
+    logger.debug("post request - headers: %s", headers)
+
+    with stage("kreuzberg", "hash"):
+        key = cache_key(await asyncio.to_thread(hash_file, file_upload.file), "kreuzberg")
 
     t1 = time.perf_counter()
-    try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60 * 60)) as session:  # noqa: SIM117
-            async with session.post(url, data=data, headers=headers) as response:
-                response.raise_for_status()
-                ocr_results = await response.json()
-    except aiohttp.ClientError:
-        logger.exception("Request Exception")
-        raise
+    with stage("kreuzberg", "cache"):
+        ocr_text = await lookup(key, cache)
+    cached = ocr_text is not None
+    if not cached:
+
+        async def send(document: Path) -> str:
+            with document.open("rb") as file:
+                data = aiohttp.FormData()
+                # field name expected by Kreuzberg's /extract API
+                data.add_field("data", file, filename=file_upload.filename, content_type=file_upload.content_type)
+                logger.debug("post request - data: %s", data)
+                async with get_pool("kreuzberg").post(path, data=data, headers=headers) as response:
+                    response.raise_for_status()
+                    return await response.text()
+
+        try:
+            with stage("kreuzberg", "ocr_service"):
+                # identical requests already in flight share one request to the service
+                ocr_text = await coalesce_upload(("single", key), "kreuzberg", file_upload, send)
+        except aiohttp.ClientError:
+            logger.exception("Request Exception")
+            raise
+        await store(key, cache, ocr_text)
+    ocr_results = json.loads(ocr_text)
     t2 = time.perf_counter()
 
     # Kreuzberg's /extract API expects a list of documents and always returns a list of extracted text
@@ -78,7 +100,9 @@ async def inference_single_doc(file_upload: Annotated[UploadFile, File()] = None
     response_json = {
         "filename": str(file_upload.filename),
         "duration_in_second": t2 - t1,
+        "cached": cached,
         "ocr-result": ocr_result,
     }
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=response_json)
+    with stage("kreuzberg", "serialisation"):
+        return JSONResponse(status_code=status.HTTP_200_OK, content=response_json)
@@ -0,0 +1,214 @@
+"""Router for OCR with the engine chosen per document."""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Annotated, Any
+
+import aiohttp
+from fastapi import APIRouter, File, HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+
+from pyonb_api.cache import CacheMode, cache_key, hash_file, lookup, store
+from pyonb_api.coalesce import coalesce_upload
+from pyonb_api.metrics import ROUTE_FAILURES, ROUTED_DOCUMENTS, observe_upload_read, stage
+from pyonb_api.pools import get_pool
+from pyonb_api.routers import docling, marker, paddleocr
+from pyonb_api.routing import Inspection, choose_engines, inspect_pdf
+from pyonb_api.sharding import OCR_SHARD_PAGES, page_headers, page_ranges, post_shards
+
+logger = logging.getLogger()
+
+router = APIRouter()
+
+# Path of each service's OCR endpoint, and the form field it expects the document in
+ENGINE_ENDPOINTS = {
+    "marker": ("/inference", "file"),
+    "docling": ("/inference", "file"),
+    "paddleocr": ("/inference", "file"),
+    "kreuzberg": ("/extract", "data"),
+}
+# Documents sent to each engine at once, and engines whose OCR endpoint accepts first_page and last_page
+ENGINE_CONCURRENCY = {
+    "marker": marker.MARKER_CONCURRENCY,
+    "docling": docling.DOCLING_CONCURRENCY,
+    "paddleocr": paddleocr.PADDLEOCR_CONCURRENCY,
+}
+
+# Seconds allowed for each engine before falling back to the next one
+OCR_ROUTE_TIMEOUT = float(os.getenv("OCR_ROUTE_TIMEOUT", default="600"))
+
+
+class EngineError(Exception):
+    """An OCR engine failed to OCR a document."""
+
+
+def _ocr_text(payload: Any) -> str:  # noqa: ANN401
+    """The text in an OCR service's response: a string, or Kreuzberg's list of extracted documents."""
+    if isinstance(payload, list):
+        return "\n".join(item["content"] for item in payload)
+    return str(payload)
+
+
+async def _post(
+    engine: str, document: Path, filename: str, content_type: str | None, pages: int
+) -> tuple[str, dict[str, str]]:
+    """
+    POST a document to an engine, in shards of OCR_SHARD_PAGES pages if the engine supports page ranges.
+
+    The document is streamed from its file, which each request (or shard) opens itself.
+    Returns the engine's response, and its page headers (see sharding.page_headers).
+    """
+    timeout = aiohttp.ClientTimeout(total=OCR_ROUTE_TIMEOUT)
+    path, field = ENGINE_ENDPOINTS[engine]
+    shards = page_ranges(pages, OCR_SHARD_PAGES) if engine in ENGINE_CONCURRENCY else []
+    if len(shards) > 1:
+        return await post_shards(
+            get_pool(engine),
+            path,
+            document,
+            filename,
+            content_type,
+            shards,
+            concurrency=ENGINE_CONCURRENCY[engine],
+            request_timeout=timeout,
+        )
+
+    with document.open("rb") as file:
+        data = aiohttp.FormData()
+        data.add_field(field, file, filename=filename, content_type=content_type)
+        async with get_pool(engine).post(
+            path, data=data, headers={"accept": "application/json"}, timeout=timeout
+        ) as response:
+            response.raise_for_status()
+            return await response.text(), page_headers(response.headers)
+
+
+async def _run_engine(  # noqa: PLR0913
+    engine: str,
+    document: Path,
+    filename: str,
+    content_type: str | None,
+    pages: int,
+    content_hash: str,
+    cache: CacheMode,
+) -> tuple[str, bool, dict[str, str]]:
+    """
+    OCR a document with an engine, returning the text, whether it was cached, and the engine's page headers.
+
+    Raises EngineError on failure.
+    """
+    key = cache_key(content_hash, engine)
+    with stage(engine, "cache"):
+        ocr_text = await lookup(key, cache)
+    if ocr_text is not None:
+        return _ocr_text(json.loads(ocr_text)), True, {}
+
+    try:
+        with stage(engine, "ocr_service"):
+            ocr_text, headers = await _post(engine, document, filename, content_type, pages)
+    except aiohttp.ClientResponseError as e:
+        msg = f"HTTP {e.status}"
+        raise EngineError(msg) from e
+    except (aiohttp.ClientError, TimeoutError) as e:
+        msg = f"{type(e).__name__}: {e}"
+        raise EngineError(msg) from e
+
+    await store(key, cache, ocr_text)
+    return _ocr_text(json.loads(ocr_text)), False, headers
+
+
+def _inspect(document: Path) -> Inspection:
+    """Inspect a PDF file (see routing.inspect_pdf)."""
+    with document.open("rb") as file:
+        return inspect_pdf(file)
+
+
+async def _route(
+    document: Path, filename: str, content_type: str | None, content_hash: str, cache: CacheMode
+) -> tuple[dict[str, Any], str, str, bool, dict[str, str]]:
+    """
+    Inspect a document, then OCR it with each healthy candidate engine in turn until one succeeds.
+
+    Returns the routing decision (see inference), the engine used, its text, whether it was cached, and the engine's
+    page headers. Raises HTTPException if no engine could OCR the document.
+    """
+    with stage("auto", "inspect"):
+        inspection = await asyncio.to_thread(_inspect, document)
+    candidates = choose_engines(inspection)
+    # engines with a backend that is passing its health checks
+    healthy = {engine: get_pool(engine).available() for engine in candidates}
+    routing: dict[str, Any] = {
+        "route": inspection.route,
+        "pages": inspection.pages,
+        "size_bytes": inspection.size_bytes,
+        "text_layer": inspection.text_layer,
+        "engines": candidates,
+        "unhealthy": [engine for engine in candidates if not healthy[engine]],
+        "failed": [],
+    }
+    logger.info("Routing %s as %s to %s", filename, inspection.route, candidates, extra=routing)
+
+    for engine in (engine for engine in candidates if healthy[engine]):
+        try:
+            ocr_result, cached, pages = await _run_engine(
+                engine, document, filename, content_type, inspection.pages, content_hash, cache
+            )
+        except EngineError as e:
+            logger.warning("%s failed to OCR %s (%s), falling back", engine, filename, e)
+            ROUTE_FAILURES.labels(engine).inc()
+            routing["failed"].append({"engine": engine, "error": str(e)})
+            continue
+
+        ROUTED_DOCUMENTS.labels(inspection.route, engine).inc()
+        return routing, engine, ocr_result, cached, pages
+
+    ROUTED_DOCUMENTS.labels(inspection.route, "none").inc()
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE if not routing["failed"] else status.HTTP_502_BAD_GATEWAY,
+        detail={"message": "No OCR engine could OCR the document.", "routing": routing},
+    )
+
+
+@router.post("/ocr/inference", status_code=status.HTTP_200_OK)
+async def inference(
+    file_upload: Annotated[UploadFile, File()],
+    cache: CacheMode = CacheMode.USE,
+) -> JSONResponse:
+    """
+    OCR a PDF with the engine best suited to it.
+
+    PDFs with a text layer (born-digital documents) go to the text extraction engine, and scans to a raster OCR
+    engine. If an engine fails or times out, the document is sent to the next healthy engine.
+    PDFs with more than OCR_SHARD_PAGES pages are OCR'd in shards by engines that accept page ranges.
+    """
+    logger.info("[POST] /ocr/inference")
+    observe_upload_read("auto")
+
+    with stage("auto", "hash"):
+        content_hash = await asyncio.to_thread(hash_file, file_upload.file)
+
+    t1 = time.perf_counter()
+    filename = str(file_upload.filename)
+    # identical requests already in flight share one routed request, which copies the upload to a temporary file
+    # once, inspects it, and streams it from there to each engine it tries
+    routing, engine, ocr_result, cached, pages = await coalesce_upload(
+        ("ocr", content_hash, cache),
+        "auto",
+        file_upload,
+        lambda document: _route(document, filename, file_upload.content_type, content_hash, cache),
+    )
+
+    response_json = {
+        "filename": filename,
+        "duration_in_second": time.perf_counter() - t1,
+        "cached": cached,
+        "engine": engine,
+        "routing": routing,
+        "ocr-result": ocr_result,
+    }
+    with stage(engine, "serialisation"):
+        return JSONResponse(status_code=status.HTTP_200_OK, content=response_json, headers=pages)
@@ -1,5 +1,7 @@
 """Routers for Paddle OCR."""
 
+import asyncio
+import json
 import logging
 import os
 import time
@@ -7,11 +9,18 @@ from pathlib import Path
 from typing import Annotated, Any
 
 import aiohttp
-import requests
 from dotenv import load_dotenv
 from fastapi import APIRouter, File, Form, HTTPException, UploadFile, status
 from fastapi.responses import JSONResponse
 
+from pyonb_api.cache import CacheMode, cache_key, hash_file, lookup, store
+from pyonb_api.coalesce import coalesce_upload
+from pyonb_api.folder import StreamFormat, inference_on_folder, iter_folder, streaming_response
+from pyonb_api.metrics import observe_upload_read, stage
+from pyonb_api.pools import get_pool
+from pyonb_api.sessions import health_timeout
+from pyonb_api.sharding import page_headers, plan_shards, post_shards
+
 load_dotenv()
 
 if os.getenv("PADDLEOCR_API_PORT"):
@@ -20,6 +29,9 @@ else:
     e = "PADDLEOCR_API_PORT environment variable not found."
     raise NameError(e)
 
+# Maximum number of documents sent to the paddleocr service at once by inference_folder
+PADDLEOCR_CONCURRENCY = int(os.getenv("PADDLEOCR_CONCURRENCY", default="4"))
+
 # Creating an object
 logger = logging.getLogger()
 
@@ -30,12 +42,9 @@ router = APIRouter()
 async def health_check() -> dict[str, Any]:
     """Test aliveness endpoint for Docling."""
     logger.info("[GET] /paddleocr/health")
-    url = f"http://paddleocr:{PADDLEOCR_API_PORT}/health"
-
     try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60 * 60)) as session:  # noqa: SIM117
-            async with session.get(url) as response:
-                response.raise_for_status()
+        async with get_pool("paddleocr").get("/health", timeout=health_timeout("paddleocr")) as response:
+            response.raise_for_status()
     except aiohttp.ClientError:
         logger.exception("Failed to connect to paddleocr service")
         raise
@@ -51,59 +60,110 @@ async def inference_single_doc(
     file_upload: Annotated[UploadFile, File()] = None,
     ocr_model_version: Annotated[str | None, Form()] = None,
     ocr_model_lang: Annotated[str | None, Form()] = None,
+    cache: CacheMode = CacheMode.USE,
+    shard_pages: int | None = None,
 ) -> JSONResponse:
     """
-    Runs Paddle OCR inference on a single document.
+    Runs Paddle OCR inference on a single document: a PDF, or a TIFF, PNG or JPEG image.
 
-    UploadFile object forwarded onto inference API.
+    UploadFile object forwarded onto inference API, unless its result is already cached (see `cache`).
+    PDFs with more than `shard_pages` pages (OCR_SHARD_PAGES by default; 0 to not split documents) are split into
+    page ranges, which are OCR'd concurrently (up to PADDLEOCR_CONCURRENCY at a time) and joined in page order.
     """
     logger.info("[POST] /paddleocr/inference_single_doc")
-    url = f"http://paddleocr:{PADDLEOCR_API_PORT}/inference"
-
-    data = aiohttp.FormData()
-    data.add_field(
-        "file",
-        file_upload.file,
-        filename=file_upload.filename,
-        content_type=file_upload.content_type,
-    )
+    path = "/inference"
+
+    observe_upload_read("paddleocr")
+
+    # field names expected by the paddleocr /inference API
+    options = {}
     if ocr_model_version:
-        data.add_field("ocr_version", ocr_model_version)
+        options["ocr_version"] = ocr_model_version
     if ocr_model_lang:
-        data.add_field("lang", ocr_model_lang)
+        options["lang"] = ocr_model_lang
     headers = {"accept": "application/json"}
 
-    logger.info("post request - url: %s", url)
-    logger.info("post request - file: %s", data)
-    logger.info("post request - headers: %s", headers)
+    logger.debug("post request - path: %s", path)
+    logger.debug("post request - headers: %s", headers)
+
+    with stage("paddleocr", "hash"):
+        key = cache_key(await asyncio.to_thread(hash_file, file_upload.file), "paddleocr", options)
 
     t1 = time.perf_counter()
-    try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=60 * 60)) as session:  # noqa: SIM117
-            async with session.post(url, data=data, headers=headers) as response:
-                response.raise_for_status()
-                ocr_result = await response.json()
-    except aiohttp.ClientError:
-        logger.exception("Request Exception")
-        raise
+    with stage("paddleocr", "cache"):
+        ocr_text = await lookup(key, cache)
+    cached = ocr_text is not None
+    # pages taken from the text layer and OCR'd, as reported by the service (not kept for cached results)
+    pages: dict[str, str] = {}
+    if not cached:
+
+        async def send(document: Path) -> tuple[str, dict[str, str]]:
+            with document.open("rb") as file:
+                # images are OCR'd frame by frame by the service, and are not split
+                shards = []
+                if file_upload.content_type == "application/pdf":
+                    shards = await asyncio.to_thread(plan_shards, file, shard_pages)
+                if len(shards) > 1:
+                    return await post_shards(
+                        get_pool("paddleocr"),
+                        path,
+                        document,
+                        str(file_upload.filename),
+                        file_upload.content_type,
+                        shards,
+                        concurrency=PADDLEOCR_CONCURRENCY,
+                        fields=options,
+                    )
+                data = aiohttp.FormData()
+                data.add_field("file", file, filename=file_upload.filename, content_type=file_upload.content_type)
+                for name, value in options.items():
+                    data.add_field(name, value)
+                logger.debug("post request - file: %s", data)
+                async with get_pool("paddleocr").post(path, data=data, headers=headers) as response:
+                    response.raise_for_status()
+                    return await response.text(), page_headers(response.headers)
+
+        try:
+            with stage("paddleocr", "ocr_service"):
+                # identical requests already in flight share one request to the service
+                ocr_text, pages = await coalesce_upload(("single", key), "paddleocr", file_upload, send)
+        except aiohttp.ClientError:
+            logger.exception("Request Exception")
+            raise
+        await store(key, cache, ocr_text)
+    ocr_result = json.loads(ocr_text)
     t2 = time.perf_counter()
 
     response_json = {
         "filename": str(file_upload.filename),
         "duration_in_second": t2 - t1,
+        "cached": cached,
         "ocr-result": ocr_result,
     }
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=response_json)
+    with stage("paddleocr", "serialisation"):
+        return JSONResponse(status_code=status.HTTP_200_OK, content=response_json, headers=pages)
 
 
 @router.post("/paddleocr/inference_folder")
-async def inference_folder(model_version: str | None = None, model_lang: str | None = None) -> dict[str, Any]:
-    """Runs PaddleOCR inference on multiple documents in a folder."""
+async def inference_folder(
+    model_version: str | None = None,
+    model_lang: str | None = None,
+    cache: CacheMode = CacheMode.USE,
+    stream: StreamFormat | None = None,
+) -> dict[str, Any]:
+    """
+    Runs PaddleOCR inference on multiple documents in a folder.
+
+    Documents with cached results (see `cache`) are not sent to the service again.
+    With `stream`, each document's result is streamed as soon as it finishes (see StreamFormat), rather than
+    returning every result at the end.
+    Up to PADDLEOCR_CONCURRENCY documents are sent to the PaddleOCR service at the same time.
+    """
     logger.info("[POST] /paddleocr/inference_folder")
     logger.debug("model_version : %s", str(model_version))
     logger.debug("model_lang : %s", str(model_lang))
-    url = f"http://paddleocr:{PADDLEOCR_API_PORT}/inference"
+    path = "/inference"
 
     DATA_FOLDER = os.environ.get("DATA_FOLDER")
     if DATA_FOLDER is None:
@@ -112,48 +172,33 @@ async def inference_folder(model_version: str | None = None, model_lang: str | N
             detail="DATA_FOLDER environment variable not defined.",
         )
 
-    filenames = [str(f.name) for f in Path(DATA_FOLDER).iterdir() if f.suffix == ".pdf"]
-    logger.info("Filenames in %s: %s", DATA_FOLDER, filenames)
-
-    ocr_result = []
-    t1 = time.perf_counter()
-    for filename in filenames:
-        abs_file_path = Path(DATA_FOLDER) / Path(filename)
-        logger.info("abs_file_path: %s", abs_file_path)
-        if not abs_file_path.exists():
-            e = f"{abs_file_path!s} file not found or does not exist."
-            logger.exception(FileNotFoundError(e))
-            raise FileNotFoundError(e)
-
-        with Path.open(abs_file_path, "rb") as pdf_file:
-            # Send the file via POST request
-            s1 = time.perf_counter()
-
-            files = {"file": (str(filename), pdf_file, "application/pdf")}
-            data = {"model_version": model_version, "model_lang": model_lang}
-            headers = {"accept": "application/json"}
-
-            logger.info("post request - url: %s", url)
-            logger.info("post request - files: %s", files)
-            logger.info("post request - headers: %s", headers)
-
-            # nb: timeout currently arbitrarily one hour
-            response = requests.post(url, files=files, data=data, headers=headers, timeout=60 * 60)  # noqa: ASYNC210
-
-            s2 = time.perf_counter()
-            response_entry = {
-                "filename": filename,
-                "duration_in_second": s2 - s1,
-                "ocr-result": response.text,
-            }
-            logger.info("Filename: %s", filename)
-            logger.info("response_entry: %s", response_entry)
-            ocr_result.append(response_entry)
-
-    t2 = time.perf_counter()
-    response_json = {
-        "total_duration_in_second": t2 - t1,
-        "result": ocr_result,
-    }
+    # field names expected by the paddleocr /inference API
+    fields = {}
+    if model_version:
+        fields["ocr_version"] = model_version
+    if model_lang:
+        fields["lang"] = model_lang
+
+    if stream is not None:
+        results = iter_folder(
+            get_pool("paddleocr"),
+            path,
+            DATA_FOLDER,
+            concurrency=PADDLEOCR_CONCURRENCY,
+            engine="paddleocr",
+            fields=fields,
+            cache=cache,
+        )
+        return streaming_response(results, stream)
+
+    response_json = await inference_on_folder(
+        get_pool("paddleocr"),
+        path,
+        DATA_FOLDER,
+        concurrency=PADDLEOCR_CONCURRENCY,
+        engine="paddleocr",
+        fields=fields,
+        cache=cache,
+    )
 
     return JSONResponse(status_code=status.HTTP_200_OK, content=response_json)
@@ -0,0 +1,92 @@
+"""Choose OCR engines for a document from a cheap inspection of the PDF."""
+
+import logging
+import os
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+logger = logging.getLogger()
+
+
+def _engines(value: str) -> list[str]:
+    return [engine.strip() for engine in value.split(",") if engine.strip()]
+
+
+# Engine for PDFs with a text layer, i.e. born-digital documents
+OCR_ROUTE_TEXT_ENGINE = os.getenv("OCR_ROUTE_TEXT_ENGINE", default="kreuzberg")
+# Engines for scanned PDFs, in order of preference; later engines are fallbacks
+OCR_ROUTE_SCAN_ENGINES = _engines(os.getenv("OCR_ROUTE_SCAN_ENGINES", default="docling,paddleocr,marker"))
+# Engines for scanned PDFs with at least OCR_ROUTE_LARGE_PAGES pages or OCR_ROUTE_LARGE_MB megabytes
+OCR_ROUTE_LARGE_SCAN_ENGINES = _engines(os.getenv("OCR_ROUTE_LARGE_SCAN_ENGINES", default="paddleocr,docling,marker"))
+OCR_ROUTE_LARGE_PAGES = int(os.getenv("OCR_ROUTE_LARGE_PAGES", default="20"))
+OCR_ROUTE_LARGE_MB = float(os.getenv("OCR_ROUTE_LARGE_MB", default="20"))
+# Number of pages, spread through the document, whose text layer is checked
+OCR_ROUTE_SAMPLE_PAGES = int(os.getenv("OCR_ROUTE_SAMPLE_PAGES", default="3"))
+# Minimum characters of embedded text on each sampled page for a PDF to count as having a text layer
+OCR_ROUTE_MIN_CHARS_PER_PAGE = int(os.getenv("OCR_ROUTE_MIN_CHARS_PER_PAGE", default="50"))
+
+
+@dataclass(frozen=True)
+class Inspection:
+    """What a quick look at a PDF found."""
+
+    pages: int
+    size_bytes: int
+    text_layer: bool  # every sampled page has embedded text
+    readable: bool = True  # False if the PDF could not be parsed
+
+    @property
+    def large(self) -> bool:
+        """Whether the document is large enough to be sent to the engines for large documents."""
+        return self.pages >= OCR_ROUTE_LARGE_PAGES or self.size_bytes >= OCR_ROUTE_LARGE_MB * 1024 * 1024
+
+    @property
+    def route(self) -> str:
+        """Which kind of document this is: "text", "large_scan" or "scan"."""
+        if self.text_layer:
+            return "text"
+        return "large_scan" if self.large else "scan"
+
+
+def _sample_pages(page_count: int, samples: int) -> list[int]:
+    """Up to `samples` page indices spread evenly through the document, including the first page."""
+    if page_count <= samples:
+        return list(range(page_count))
+    return sorted({round(i * (page_count - 1) / (samples - 1)) for i in range(samples)}) if samples > 1 else [0]
+
+
+def inspect_pdf(file: BinaryIO) -> Inspection:
+    """
+    Count the pages of a PDF, and check whether it has a text layer by extracting the text of a few pages.
+
+    Only the sampled pages are parsed, so this takes milliseconds even for long documents.
+    """
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    try:
+        reader = PdfReader(file)
+        if reader.is_encrypted:
+            reader.decrypt("")
+        page_count = len(reader.pages)
+        sampled = _sample_pages(page_count, OCR_ROUTE_SAMPLE_PAGES)
+        text_layer = bool(sampled) and all(
+            len((reader.pages[i].extract_text() or "").strip()) >= OCR_ROUTE_MIN_CHARS_PER_PAGE for i in sampled
+        )
+    except (PyPdfError, ValueError, KeyError, TypeError):
+        logger.warning("Could not inspect PDF; routing it as a scan", exc_info=True)
+        return Inspection(pages=0, size_bytes=size, text_layer=False, readable=False)
+    finally:
+        file.seek(0)
+    return Inspection(pages=page_count, size_bytes=size, text_layer=text_layer)
+
+
+def choose_engines(inspection: Inspection) -> list[str]:
+    """Engines to try for a document, in order: the best engine for it, then fallbacks."""
+    scan_engines = OCR_ROUTE_LARGE_SCAN_ENGINES if inspection.large else OCR_ROUTE_SCAN_ENGINES
+    engines = [OCR_ROUTE_TEXT_ENGINE, *scan_engines] if inspection.text_layer else scan_engines
+    # without duplicates, keeping the order
+    return list(dict.fromkeys(engines))
@@ -0,0 +1,59 @@
+"""Application-scoped HTTP client sessions for the OCR services."""
+
+import logging
+import os
+
+import aiohttp
+
+logger = logging.getLogger()
+
+BACKENDS = ("marker", "docling", "paddleocr", "kreuzberg")
+
+_sessions: dict[str, aiohttp.ClientSession] = {}
+
+
+def backend_timeout(backend: str) -> aiohttp.ClientTimeout:
+    """
+    Timeouts for requests to an OCR service.
+
+    Configured per service with <SERVICE>_TIMEOUT (total seconds per request, default one hour)
+    and <SERVICE>_CONNECT_TIMEOUT (seconds to wait for a connection, default 10).
+    """
+    prefix = backend.upper()
+    return aiohttp.ClientTimeout(
+        total=float(os.getenv(f"{prefix}_TIMEOUT", default=str(60 * 60))),
+        connect=float(os.getenv(f"{prefix}_CONNECT_TIMEOUT", default="10")),
+    )
+
+
+def health_timeout(backend: str) -> aiohttp.ClientTimeout:
+    """Timeout for health checks, configured per service with <SERVICE>_HEALTH_TIMEOUT (default 5 seconds)."""
+    return aiohttp.ClientTimeout(total=float(os.getenv(f"{backend.upper()}_HEALTH_TIMEOUT", default="5")))
+
+
+async def open_sessions() -> None:
+    """
+    Create one keep-alive client session per OCR service.
+
+    The number of open connections to each service is limited by <SERVICE>_CONNECTION_LIMIT (default 100).
+    """
+    for backend in BACKENDS:
+        limit = int(os.getenv(f"{backend.upper()}_CONNECTION_LIMIT", default="100"))
+        logger.info("Opening client session for %s (connection limit %d)", backend, limit)
+        _sessions[backend] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=limit, ttl_dns_cache=300),
+            timeout=backend_timeout(backend),
+        )
+
+
+async def close_sessions() -> None:
+    """Close all client sessions."""
+    for backend, session in _sessions.items():
+        logger.info("Closing client session for %s", backend)
+        await session.close()
+    _sessions.clear()
+
+
+def get_session(backend: str) -> aiohttp.ClientSession:
+    """Return the client session for an OCR service."""
+    return _sessions[backend]
@@ -0,0 +1,153 @@
+"""Split long PDFs into page ranges, OCR the ranges concurrently, and join the results in page order."""
+
+import asyncio
+import json
+import logging
+import os
+from collections.abc import Mapping
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO
+
+import aiohttp
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+from pyonb_api.pools import BackendPool
+
+logger = logging.getLogger()
+
+# Pages per shard: documents with more pages are split and their shards OCR'd concurrently. 0 turns sharding off.
+OCR_SHARD_PAGES = int(os.getenv("OCR_SHARD_PAGES", default="0"))
+
+# Text placed between the results of consecutive shards; PaddleOCR's results already end each page with a newline
+SHARD_SEPARATORS = {"paddleocr": ""}
+DEFAULT_SHARD_SEPARATOR = "\n\n"
+
+# Response headers in which the OCR services list the pages taken from the text layer, and the pages that were OCR'd
+PAGE_HEADERS = ("X-Text-Layer-Pages", "X-OCR-Pages")
+
+
+def count_pages(file: BinaryIO) -> int:
+    """Number of pages in a PDF, or 0 if it can't be read."""
+    try:
+        return len(PdfReader(file).pages)
+    except (PyPdfError, ValueError, KeyError, TypeError):
+        logger.warning("Could not count the pages of a PDF; not sharding it", exc_info=True)
+        return 0
+    finally:
+        file.seek(0)
+
+
+def page_ranges(page_count: int, shard_pages: int = OCR_SHARD_PAGES) -> list[tuple[int, int]]:
+    """
+    First and last pages (1-based, inclusive) of each shard of a document.
+
+    A document is a single shard if sharding is off (shard_pages is 0), or it has at most shard_pages pages.
+    """
+    if shard_pages <= 0 or page_count <= shard_pages:
+        return [(1, page_count)] if page_count else []
+    return [(first, min(first + shard_pages - 1, page_count)) for first in range(1, page_count + 1, shard_pages)]
+
+
+def plan_shards(file: BinaryIO, shard_pages: int | None = None) -> list[tuple[int, int]]:
+    """
+    Page ranges to OCR a PDF in, with shard_pages pages per shard (OCR_SHARD_PAGES by default).
+
+    The PDF is only parsed if sharding is on; otherwise, or if it can't be read, no ranges are returned.
+    """
+    shard_pages = OCR_SHARD_PAGES if shard_pages is None else shard_pages
+    if shard_pages <= 0:
+        return []
+    return page_ranges(count_pages(file), shard_pages)
+
+
+def page_headers(headers: Mapping[str, str]) -> dict[str, str]:
+    """The PAGE_HEADERS of an OCR service's response, to pass on to the client."""
+    return {name: headers[name] for name in PAGE_HEADERS if name in headers}
+
+
+def _parse_pages(pages: str) -> list[int]:
+    """Pages in a compact list of ranges, e.g. 1-3,5."""
+    parsed: list[int] = []
+    for part in filter(None, pages.split(",")):
+        first, _, last = part.partition("-")
+        parsed.extend(range(int(first), int(last or first) + 1))
+    return parsed
+
+
+def _format_pages(pages: list[int]) -> str:
+    """Pages as a compact list of ranges, e.g. 1-3,5."""
+    ranges: list[list[int]] = []
+    for page in pages:
+        if ranges and ranges[-1][1] == page - 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def merge_page_headers(shard_headers: list[dict[str, str]]) -> dict[str, str]:
+    """
+    Page headers of a sharded document, listing the pages of all its shards.
+
+    If any shard's response didn't have them (e.g. its text layer couldn't be read), none are returned.
+    """
+    if not shard_headers or any(headers.keys() != set(PAGE_HEADERS) for headers in shard_headers):
+        return {}
+    return {
+        name: _format_pages(sorted(page for headers in shard_headers for page in _parse_pages(headers[name])))
+        for name in PAGE_HEADERS
+    }
+
+
+async def post_shards(  # noqa: PLR0913
+    pool: BackendPool,
+    path: str,
+    document: Path | bytes,
+    filename: str,
+    content_type: str | None,
+    shards: list[tuple[int, int]],
+    concurrency: int,
+    fields: dict[str, str] | None = None,
+    request_timeout: aiohttp.ClientTimeout | None = None,
+) -> tuple[str, dict[str, str]]:
+    """
+    OCR each shard of a document with an OCR service, up to `concurrency` shards at a time.
+
+    Every shard is sent the whole document, with its `first_page` and `last_page`, so the service only renders the
+    shard's pages, and goes to the least busy of the service's backends, so shards are spread over its replicas.
+    The document is a file, which each shard streams from its own handle, or a document already in memory.
+    Returns the service's results for the shards joined in page order, as a JSON string (like a single response from
+    the service), and the shards' page headers merged (see merge_page_headers). Raises aiohttp.ClientError if any
+    shard fails.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def post_shard(first_page: int, last_page: int) -> tuple[str, dict[str, str]]:
+        async with semaphore:
+            with BytesIO(document) if isinstance(document, bytes) else document.open("rb") as file:
+                data = aiohttp.FormData()
+                data.add_field("file", file, filename=filename, content_type=content_type)
+                for name, value in (fields or {}).items():
+                    data.add_field(name, value)
+                data.add_field("first_page", str(first_page))
+                data.add_field("last_page", str(last_page))
+                async with pool.post(
+                    path, data=data, headers={"accept": "application/json"}, timeout=request_timeout
+                ) as response:
+                    response.raise_for_status()
+                    logger.debug("Shard %d-%d of %s done", first_page, last_page, filename)
+                    return json.loads(await response.text()), page_headers(response.headers)
+
+    logger.info("OCR of %s in %d shards", filename, len(shards), extra={"engine": pool.engine, "shards": shards})
+    tasks = [asyncio.ensure_future(post_shard(first_page, last_page)) for first_page, last_page in shards]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        # the document failed, so don't OCR the remaining shards
+        for task in tasks:
+            task.cancel()
+        raise
+    separator = SHARD_SEPARATORS.get(pool.engine, DEFAULT_SHARD_SEPARATOR)
+    return json.dumps(separator.join(text for text, _ in results)), merge_page_headers([pages for _, pages in results])
@@ -0,0 +1,41 @@
+"""Spool uploaded documents to disk, so they can be sent to OCR services more than once."""
+
+import asyncio
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from fastapi import UploadFile
+
+from pyonb_api.metrics import stage
+
+# Size of the chunks uploads are copied in
+CHUNK_SIZE = 1024 * 1024
+
+
+def _copy_to(src: UploadFile, fd: int) -> None:
+    """Copy an upload to an open file descriptor, one chunk at a time."""
+    with os.fdopen(fd, "wb") as dst:
+        src.file.seek(0)
+        shutil.copyfileobj(src.file, dst, CHUNK_SIZE)
+    src.file.seek(0)
+
+
+async def spool_upload(file: UploadFile, engine: str) -> Path:
+    """
+    Copy an uploaded file to a unique temporary file, which the caller deletes once it is done with it.
+
+    Each request to an OCR service opens the copy itself, so a document can be sent as several shards at once
+    without holding it in memory, and outlives the upload, which is closed once its request is finished. The copy
+    runs in a worker thread, in chunks.
+    """
+    fd, name = tempfile.mkstemp(prefix="pyonb_", suffix=Path(file.filename or "").suffix)
+    path = Path(name)
+    try:
+        with stage(engine, "spool"):
+            await asyncio.to_thread(_copy_to, file, fd)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return path
@@ -0,0 +1 @@
+"""Initialise OCR services common package."""
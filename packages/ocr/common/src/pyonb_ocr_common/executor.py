@@ -0,0 +1,101 @@
+"""Run blocking OCR work off the event loop, with admission control."""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any
+
+from fastapi import HTTPException, status
+
+from pyonb_ocr_common.logs import setup_logging
+from pyonb_ocr_common.metrics import QUEUE_DEPTH
+
+logger = logging.getLogger()
+
+# "thread" or "process"
+OCR_EXECUTOR = os.getenv("OCR_EXECUTOR", default="thread")
+# Number of OCR jobs run at once (per uvicorn worker)
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", default="1"))
+# Number of OCR jobs allowed to wait for a free worker before requests are rejected
+OCR_MAX_QUEUE = int(os.getenv("OCR_MAX_QUEUE", default="4"))
+# Seconds clients are asked to wait before retrying a rejected request
+OCR_RETRY_AFTER = int(os.getenv("OCR_RETRY_AFTER", default="10"))
+
+
+def _initialize_process(initializer: Callable[[], object] | None) -> None:
+    """Set up an OCR executor process: logging, then the service's own initializer, if any."""
+    setup_logging()
+    if initializer is not None:
+        initializer()
+
+
+class OCRExecutor:
+    """
+    Thread or process pool for OCR jobs, with a bounded queue.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more wait for a worker.
+    Further jobs are rejected with 429 Too Many Requests and a Retry-After header.
+
+    Functions run in a process pool are pickled, so they must be module-level functions (not bound methods of
+    objects holding locks, for example), as must `initializer`, which is run in each process as it starts.
+    """
+
+    def __init__(
+        self,
+        kind: str = OCR_EXECUTOR,
+        max_workers: int = OCR_MAX_WORKERS,
+        max_queue: int = OCR_MAX_QUEUE,
+        retry_after: int = OCR_RETRY_AFTER,
+        initializer: Callable[[], object] | None = None,
+    ) -> None:
+        """Create the executor; worker threads or processes are started on first use."""
+        self.executor: Executor
+        if kind == "process":
+            # spawn rather than fork: the parent process already runs uvicorn's threads
+            self.executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_initialize_process,
+                initargs=(initializer,),
+            )
+        elif kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr")
+        else:
+            e = f"Unknown OCR_EXECUTOR '{kind}', expected 'thread' or 'process'."
+            raise ValueError(e)
+
+        self.max_workers = max_workers
+        self.max_in_flight = max_workers + max_queue
+        self.retry_after = retry_after
+        self.in_flight = 0
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:  # noqa: ANN401
+        """Run fn(*args, **kwargs) in the pool, or raise 429 if the queue is full."""
+        if self.in_flight >= self.max_in_flight:
+            logger.warning("OCR queue full (%d jobs in flight), rejecting request", self.in_flight)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="OCR service is busy, try again later.",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+
+        self.in_flight += 1
+        self._update_queue_depth()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+        finally:
+            self.in_flight -= 1
+            self._update_queue_depth()
+
+    def _update_queue_depth(self) -> None:
+        # every worker is busy before any job has to wait
+        QUEUE_DEPTH.set(max(0, self.in_flight - self.max_workers))
+
+    def shutdown(self) -> None:
+        """Stop the pool, cancelling jobs that have not started."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
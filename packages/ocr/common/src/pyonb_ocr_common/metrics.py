@@ -0,0 +1,133 @@
+"""Prometheus metrics: request latency, in-flight requests, bytes in/out, OCR queue depth, stage timings and pages."""
+
+import os
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi import FastAPI, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# from health checks (milliseconds) to long documents (up to an hour)
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+REQUEST_DURATION = Histogram(
+    "pyonb_request_duration_seconds",
+    "Time taken to handle requests.",
+    ["method", "endpoint", "status"],
+    buckets=BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge("pyonb_requests_in_flight", "Requests being handled.", multiprocess_mode="livesum")
+REQUEST_BYTES = Counter("pyonb_request_bytes", "Bytes received in request bodies.", ["endpoint"])
+RESPONSE_BYTES = Counter("pyonb_response_bytes", "Bytes sent in response bodies.", ["endpoint"])
+QUEUE_DEPTH = Gauge(
+    "pyonb_ocr_queue_depth", "OCR jobs waiting for a free OCR executor worker.", multiprocess_mode="livesum"
+)
+STAGE_DURATION = Histogram(
+    "pyonb_stage_duration_seconds",
+    "Time taken by each stage of OCR requests: upload_read, temp_file_write, text_layer, rasterisation, decoding, "
+    "model_load, inference and serialisation.",
+    ["stage"],
+    buckets=BUCKETS,
+)
+PAGES = Counter(
+    "pyonb_pages", "Pages converted, by whether their text was taken from the text layer or OCR'd.", ["path"]
+)
+
+# when the current request started, for timing how long the upload took to receive
+_request_start: ContextVar[float | None] = ContextVar("request_start", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Generator[None]:
+    """Record how long the block takes as the named stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.labels(name).observe(time.perf_counter() - start)
+
+
+def observe_upload_read() -> None:
+    """Record the time from the start of the request until now, i.e. receiving and parsing the upload."""
+    start = _request_start.get()
+    if start is not None:
+        STAGE_DURATION.labels("upload_read").observe(time.perf_counter() - start)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency, size and number in flight of HTTP requests."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Wrap app."""
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle a request, recording its metrics."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        token = _request_start.set(start)
+        status = 500
+        bytes_in = 0
+        bytes_out = 0
+
+        async def receive_counted() -> Message:
+            nonlocal bytes_in
+            message = await receive()
+            if message["type"] == "http.request":
+                bytes_in += len(message.get("body", b""))
+            return message
+
+        async def send_counted(message: Message) -> None:
+            nonlocal status, bytes_out
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                bytes_out += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive_counted, send_counted)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _request_start.reset(token)
+            # label by route template rather than the raw path, to keep the number of series bounded
+            endpoint = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_DURATION.labels(scope["method"], endpoint, str(status)).observe(time.perf_counter() - start)
+            REQUEST_BYTES.labels(endpoint).inc(bytes_in)
+            RESPONSE_BYTES.labels(endpoint).inc(bytes_out)
+
+
+def metrics_response() -> Response:
+    """
+    Metrics in the Prometheus text format.
+
+    If PROMETHEUS_MULTIPROC_DIR is set, metrics are collected from every process (uvicorn workers and OCR executor
+    processes); otherwise only from this process.
+    """
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def instrument(app: FastAPI) -> None:
+    """Record request metrics for app, and serve all metrics at GET /metrics."""
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route("/metrics", metrics_response, methods=["GET"], include_in_schema=False)
@@ -0,0 +1,158 @@
+"""
+Text-layer fast path: take the text of born-digital pages from the PDF itself, and only OCR the other pages.
+
+A page's embedded text is used if it is long enough and readable (see trustworthy). Image-only pages (scans), and
+pages whose text layer is too short or garbled, are OCR'd as usual, in runs of consecutive pages.
+"""
+
+import logging
+import os
+import unicodedata
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO
+
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+from pyonb_ocr_common.metrics import PAGES, stage
+
+logger = logging.getLogger()
+
+# Whether requests use text layers by default; each request can override it with the `text_layer` form field
+OCR_TEXT_LAYER = os.getenv("OCR_TEXT_LAYER", default="true").lower() == "true"
+# Characters (other than whitespace) a page's text layer needs to be used instead of OCR
+OCR_TEXT_LAYER_MIN_CHARS = int(os.getenv("OCR_TEXT_LAYER_MIN_CHARS", default="50"))
+# Fraction of a page's characters that may be unreadable, e.g. from fonts with no Unicode mapping
+OCR_TEXT_LAYER_MAX_INVALID = float(os.getenv("OCR_TEXT_LAYER_MAX_INVALID", default="0.02"))
+
+# Unicode categories that aren't text: control, private use, surrogate and unassigned characters
+INVALID_CATEGORIES = {"Cc", "Co", "Cs", "Cn"}
+
+
+def trustworthy(text: str) -> bool:
+    """Whether a page's embedded text can be used instead of OCR: enough characters, and few unreadable ones."""
+    chars = [char for char in text if not char.isspace()]
+    if len(chars) < OCR_TEXT_LAYER_MIN_CHARS:
+        return False
+    invalid = sum(char == "\ufffd" or unicodedata.category(char) in INVALID_CATEGORIES for char in chars)
+    return invalid <= OCR_TEXT_LAYER_MAX_INVALID * len(chars)
+
+
+@dataclass
+class TextLayer:
+    """Pages first to last (1-based, inclusive) of a PDF, and the embedded text of those that don't need OCR."""
+
+    first: int
+    last: int
+    texts: dict[int, str] = field(default_factory=dict)
+
+    def runs(self) -> list[tuple[bool, int, int]]:
+        """Runs of consecutive pages that take the same path: (whether from the text layer, first page, last page)."""
+        runs: list[tuple[bool, int, int]] = []
+        for page in range(self.first, self.last + 1):
+            from_text_layer = page in self.texts
+            if runs and runs[-1][0] == from_text_layer:
+                runs[-1] = (from_text_layer, runs[-1][1], page)
+            else:
+                runs.append((from_text_layer, page, page))
+        return runs
+
+    def report(self) -> dict[str, list[int]]:
+        """The pages whose text was taken from the text layer, and the pages that were OCR'd."""
+        return {
+            "text_layer": sorted(self.texts),
+            "ocr": [page for page in range(self.first, self.last + 1) if page not in self.texts],
+        }
+
+
+def read_text_layer(
+    source: str | Path | BinaryIO, first_page: int | None = None, last_page: int | None = None
+) -> TextLayer | None:
+    """
+    Check pages first_page to last_page (1-based, inclusive) of a PDF for a text layer that can be used.
+
+    Returns None if the PDF can't be read, or the pages are outside it, so it is OCR'd as usual.
+    """
+    try:
+        with stage("text_layer"):
+            reader = PdfReader(source)
+            if reader.is_encrypted:
+                reader.decrypt("")
+            page_count = len(reader.pages)
+            first = max(first_page or 1, 1)
+            last = min(last_page or page_count, page_count)
+            if first > last:
+                return None
+            layer = TextLayer(first, last)
+            for page in range(first, last + 1):
+                text = reader.pages[page - 1].extract_text() or ""
+                if trustworthy(text):
+                    layer.texts[page] = text.strip()
+    except (PyPdfError, ValueError, KeyError, TypeError):
+        logger.warning("Could not read the text layer of a PDF; OCR'ing every page", exc_info=True)
+        return None
+    finally:
+        if not isinstance(source, (str, Path)):
+            source.seek(0)
+    return layer
+
+
+def with_text_layer(  # noqa: PLR0913
+    convert: Callable[..., str | None],
+    source: str | Path | BinaryIO,
+    first_page: int | None = None,
+    last_page: int | None = None,
+    separator: str = "\n\n",
+    end: str = "",
+) -> tuple[str | None, dict[str, list[int]] | None]:
+    """
+    Convert pages first_page to last_page of a PDF, OCR'ing only the pages without a usable text layer.
+
+    Pages are OCR'd by convert(first_page=..., last_page=...), in runs of consecutive pages. The text of each run
+    and of each text-layer page is joined in page order with `separator`, followed by `end`.
+    Returns the text, and which pages took which path (see TextLayer.report), or None if the PDF couldn't be checked.
+    Raises RuntimeError if convert returns None (fails) for a run of pages.
+    """
+    layer = read_text_layer(source, first_page, last_page)
+    if layer is None:
+        return convert(first_page=first_page, last_page=last_page), None
+
+    report = layer.report()
+    PAGES.labels("text_layer").inc(len(report["text_layer"]))
+    PAGES.labels("ocr").inc(len(report["ocr"]))
+    logger.info("%d pages from the text layer, %d pages to OCR", len(report["text_layer"]), len(report["ocr"]))
+    if not layer.texts:
+        return convert(first_page=first_page, last_page=last_page), report
+
+    parts: list[str] = []
+    for from_text_layer, first, last in layer.runs():
+        if from_text_layer:
+            parts.extend(layer.texts[page] for page in range(first, last + 1))
+            continue
+        text = convert(first_page=first, last_page=last)
+        if text is None:
+            # the engine failed, so fail the document rather than return it with pages missing
+            msg = f"OCR of pages {first}-{last} failed"
+            raise RuntimeError(msg)
+        parts.append(text.strip("\n"))
+    return separator.join(part for part in parts if part) + end, report
+
+
+def _pages(pages: list[int]) -> str:
+    """Pages as a compact list of ranges, e.g. 1-3,5."""
+    ranges: list[list[int]] = []
+    for page in pages:
+        if ranges and ranges[-1][1] == page - 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ",".join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+
+def page_headers(report: dict[str, list[int]] | None) -> dict[str, str]:
+    """Response headers listing the pages taken from the text layer and the pages that were OCR'd."""
+    if report is None:
+        return {}
+    return {"X-Text-Layer-Pages": _pages(report["text_layer"]), "X-OCR-Pages": _pages(report["ocr"])}
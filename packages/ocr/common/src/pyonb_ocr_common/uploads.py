@@ -0,0 +1,43 @@
+"""Spool uploaded documents to disk without holding them in memory."""
+
+import asyncio
+import os
+import shutil
+import tempfile
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from fastapi import UploadFile
+
+from pyonb_ocr_common.metrics import observe_upload_read, stage
+
+# Size of the chunks uploads are copied in
+CHUNK_SIZE = 1024 * 1024
+# Directory for temporary copies of uploads, ideally a tmpfs (default: the system temporary directory)
+OCR_SCRATCH_DIR = os.getenv("OCR_SCRATCH_DIR") or None
+
+
+def _copy_to(src: UploadFile, fd: int) -> None:
+    """Copy an upload to an open file descriptor, one chunk at a time."""
+    with os.fdopen(fd, "wb") as dst:
+        src.file.seek(0)
+        shutil.copyfileobj(src.file, dst, CHUNK_SIZE)
+
+
+@asynccontextmanager
+async def spool_upload(file: UploadFile) -> AsyncGenerator[Path]:
+    """
+    Copy an uploaded file to a unique temporary file in OCR_SCRATCH_DIR, and delete it afterwards.
+
+    The copy runs in a worker thread, in chunks, so neither the event loop nor memory is tied up by large documents.
+    """
+    observe_upload_read()
+    fd, name = tempfile.mkstemp(prefix="pyonb_", suffix=Path(file.filename or "").suffix, dir=OCR_SCRATCH_DIR)
+    path = Path(name)
+    try:
+        with stage("temp_file_write"):
+            await asyncio.to_thread(_copy_to, file, fd)
+        yield path
+    finally:
+        path.unlink(missing_ok=True)
@@ -1,26 +1,59 @@
 """Docling API."""
 
-import datetime
+import asyncio
 import logging
-from pathlib import Path
+import os
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Annotated
 
-from fastapi import FastAPI, File, HTTPException, UploadFile, status
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile, status
 from fastapi.responses import JSONResponse, RedirectResponse
+from pyonb_ocr_common.executor import OCRExecutor
+from pyonb_ocr_common.logs import setup_logging
+from pyonb_ocr_common.metrics import instrument, stage
+from pyonb_ocr_common.textlayer import OCR_TEXT_LAYER, page_headers, with_text_layer
+from pyonb_ocr_common.uploads import spool_upload
 
-from pyonb_docling.main import convert_pdf_to_markdown
+from pyonb_docling.main import convert_pdf_to_markdown, warm_up
 
-logging.basicConfig(
-    filename="docling." + datetime.datetime.now(tz=datetime.UTC).strftime("%Y%m%d") + ".log",
-    format="%(asctime)s %(message)s",
-    filemode="a",
-)
+setup_logging()
 
 # Creating an object
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
 
-app = FastAPI(swagger_ui_parameters={"tryItOutEnabled": True})
+ocr_executor = OCRExecutor()
+
+# Convert the bundled sample PDF at start up, rather than only loading the models
+DOCLING_WARMUP = os.getenv("DOCLING_WARMUP", default="true").lower() == "true"
+
+
+async def _warm_up(app: FastAPI) -> None:
+    """Load Docling's models in the OCR executor, so the API can answer health checks in the meantime."""
+    try:
+        await ocr_executor.run(warm_up, convert_sample=DOCLING_WARMUP)
+    except Exception:
+        logger.exception("Docling warm-up failed.")
+        app.state.warmup_failed = True
+    else:
+        logger.info("Docling warm-up complete")
+        app.state.warm = True
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None]:
+    """Create the Docling converter and warm it up in the background when the service starts."""
+    app.state.warm = False
+    app.state.warmup_failed = False
+    warmup_task = asyncio.create_task(_warm_up(app))
+    yield
+    warmup_task.cancel()
+    ocr_executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, swagger_ui_parameters={"tryItOutEnabled": True})
+instrument(app)
 
 
 @app.get("/", include_in_schema=False)
@@ -34,34 +67,65 @@ async def health_check() -> JSONResponse:
     """
     Health check endpoint to verify API is accessible.
 
-    Returns 200 OK status if API is running properly.
+    Returns 200 OK status once Docling's models are loaded and warmed up,
+    and 503 Service Unavailable while they are still loading (or failed to load).
     """
     logger.info("[POST] /health")
+    if not app.state.warm:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "service": "docling",
+                "status": "unhealthy" if app.state.warmup_failed else "starting",
+                "warm": False,
+            },
+        )
     return JSONResponse(
         status_code=status.HTTP_200_OK,
-        content={"service": "docling", "status": "healthy"},
+        content={"service": "docling", "status": "healthy", "warm": True},
     )
 
 
 @app.post("/inference", status_code=status.HTTP_200_OK)
-async def inference(file: Annotated[UploadFile, File()] = None) -> JSONResponse:
+async def inference(
+    file: Annotated[UploadFile, File()] = None,
+    first_page: Annotated[int | None, Form(ge=1)] = None,
+    last_page: Annotated[int | None, Form(ge=1)] = None,
+    text_layer: Annotated[bool, Form()] = OCR_TEXT_LAYER,
+) -> JSONResponse:
     """
     Endpoint to execute Docling on PDF file.
 
+    If `first_page` or `last_page` (1-based, inclusive) are given, only those pages are converted.
+    With `text_layer` (OCR_TEXT_LAYER by default), the text of pages with a usable text layer is taken from the PDF,
+    and only the other pages are converted; the X-Text-Layer-Pages and X-OCR-Pages headers list which are which.
+
     Returns 200 OK JSON formatted text result from Docling.
     """
     logger.info("[POST] /inference")
     logger.info("[POST] /inference - Received file: %s", file.filename)
 
     result = None
+    report = None
     if file:
         if file.content_type == "application/pdf":
             try:
-                content = await file.read()
-                # Docling requires path to file rather than UploadFile object, so create temp copy of file
-                with Path(f"temp_api_file_{file.filename}").open("wb") as f:  # noqa: ASYNC230
-                    f.write(content)
-                result = convert_pdf_to_markdown(f"temp_api_file_{file.filename}")
+                # Docling requires path to file rather than UploadFile object, so spool the upload to a temp file
+                async with spool_upload(file) as file_path:
+                    if text_layer:
+                        result, report = await ocr_executor.run(
+                            with_text_layer,
+                            partial(convert_pdf_to_markdown, file_path),
+                            file_path,
+                            first_page=first_page,
+                            last_page=last_page,
+                        )
+                    else:
+                        result = await ocr_executor.run(
+                            convert_pdf_to_markdown, file_path, first_page=first_page, last_page=last_page
+                        )
+            except HTTPException:
+                raise
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"Failed to run Docling. Error: {e}") from e
         else:
@@ -70,4 +134,5 @@ async def inference(file: Annotated[UploadFile, File()] = None) -> JSONResponse:
     if result is None:
         raise HTTPException(status_code=400, detail="Failed to process the input.")
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+    with stage("serialisation"):
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result, headers=page_headers(report))
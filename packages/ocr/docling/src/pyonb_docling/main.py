@@ -2,21 +2,59 @@
 
 import logging
 import sys
+from functools import lru_cache
 from pathlib import Path
 
+from docling.datamodel.base_models import InputFormat
 from docling.document_converter import DocumentConverter
+from pyonb_ocr_common.metrics import stage
 
 logger = logging.getLogger()
 
+# One-page PDF bundled with the package, converted at service start to warm up Docling's models
+WARMUP_PDF_PATH = Path(__file__).parent / "data" / "warmup.pdf"
 
-def convert_pdf_to_markdown(file_path: str | Path):  # noqa: ANN201
-    """Convert the PDF to Markdown using Docling."""
-    try:
+
+@lru_cache(maxsize=1)
+def load_converter() -> DocumentConverter:
+    """
+    Create the Docling document converter and initialise its PDF pipeline.
+
+    The converter is created once per process and reused for every document.
+    """
+    logger.info("Initialising Docling PDF pipeline")
+    with stage("model_load"):
         converter = DocumentConverter()
-        result = converter.convert(str(file_path))
+        converter.initialize_pipeline(InputFormat.PDF)
+    return converter
+
+
+def warm_up(convert_sample: bool = True) -> None:
+    """Load Docling's models and, optionally, convert the bundled sample PDF so the first request is not slow."""
+    converter = load_converter()
+    if convert_sample:
+        logger.info("Docling warm-up conversion of %s", WARMUP_PDF_PATH)
+        converter.convert(str(WARMUP_PDF_PATH))
+
+
+def convert_pdf_to_markdown(  # noqa: ANN201
+    file_path: str | Path,
+    first_page: int | None = None,
+    last_page: int | None = None,
+):
+    """
+    Convert the PDF to Markdown using Docling.
+
+    Only pages first_page to last_page (1-based, inclusive) are converted, if given.
+    """
+    try:
+        converter = load_converter()
+        page_range = (first_page or 1, last_page or sys.maxsize)
+        # nb: Docling rasterises pages as part of the conversion, so rasterisation is included in inference
+        with stage("inference"):
+            result = converter.convert(str(file_path), page_range=page_range)
 
-        logger.info("Docling output:")
-        logger.info(result.document.export_to_markdown())  # nb: markdown for terminal display
+        logger.info("Docling converted %s: %d pages", Path(file_path).name, len(result.document.pages))
 
         return result.document.export_to_text()
 
@@ -15,11 +15,16 @@ from kreuzberg._api.main import (
     handle_files_upload,
     health_check,
 )
+from litestar.plugins.prometheus import PrometheusConfig, PrometheusController
 
 KREUZBERG_API_PORT = int(os.getenv("KREUZBERG_API_PORT", default="8116"))
 
+# Request latency and in-flight request metrics, served at GET /metrics
+prometheus_config = PrometheusConfig(app_name="kreuzberg", prefix="pyonb", group_path=True)
+
 app = Litestar(
-    route_handlers=[handle_files_upload, health_check, get_configuration],
+    route_handlers=[handle_files_upload, health_check, get_configuration, PrometheusController],
+    middleware=[prometheus_config.middleware],
     request_max_body_size=100_000_000,
     plugins=[OpenTelemetryPlugin(OpenTelemetryConfig())],
     logging_config=StructLoggingConfig(),
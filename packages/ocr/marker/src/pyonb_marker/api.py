@@ -1,27 +1,39 @@
 """Marker API."""
 
-import datetime
 import logging
-from pathlib import Path
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Annotated
 
-from fastapi import FastAPI, File, HTTPException, UploadFile, status
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile, status
 from fastapi.responses import JSONResponse, RedirectResponse
+from pyonb_ocr_common.executor import OCRExecutor
+from pyonb_ocr_common.logs import setup_logging
+from pyonb_ocr_common.metrics import instrument, stage
+from pyonb_ocr_common.textlayer import OCR_TEXT_LAYER, page_headers, with_text_layer
+from pyonb_ocr_common.uploads import spool_upload
 
-from pyonb_marker.main import convert_pdf_to_markdown
+from pyonb_marker.main import convert_pdf_to_markdown, warm_up
 
-_today = datetime.datetime.now(datetime.UTC).strftime("%Y_%m_%d")  # type: ignore[attr-defined] # mypy complains that 'Module has no attribute "UTC"'
-logging.basicConfig(
-    filename=f"marker-{_today}.log",
-    format="%(asctime)s %(message)s",
-    filemode="a",
-)
+setup_logging()
 
 # Creating an object
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
 
-app = FastAPI(swagger_ui_parameters={"tryItOutEnabled": True})
+ocr_executor = OCRExecutor()
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncGenerator[None]:
+    """Load Marker models with the default converter configuration when the service starts."""
+    await ocr_executor.run(warm_up)
+    yield
+    ocr_executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, swagger_ui_parameters={"tryItOutEnabled": True})
+instrument(app)
 
 
 @app.get("/", include_in_schema=False)
@@ -45,24 +57,45 @@ async def health_check() -> JSONResponse:
 
 
 @app.post("/inference", status_code=status.HTTP_200_OK)
-async def inference(file: Annotated[UploadFile, File()] = None) -> JSONResponse:
+async def inference(
+    file: Annotated[UploadFile, File()] = None,
+    first_page: Annotated[int | None, Form(ge=1)] = None,
+    last_page: Annotated[int | None, Form(ge=1)] = None,
+    text_layer: Annotated[bool, Form()] = OCR_TEXT_LAYER,
+) -> JSONResponse:
     """
     Endpoint to execute marker on PDF file.
 
+    If `first_page` or `last_page` (1-based, inclusive) are given, only those pages are converted.
+    With `text_layer` (OCR_TEXT_LAYER by default), the text of pages with a usable text layer is taken from the PDF,
+    and only the other pages are converted; the X-Text-Layer-Pages and X-OCR-Pages headers list which are which.
+
     Returns 200 OK JSON formatted text result from marker.
     """
     logger.info("[POST] /inference")
     logger.info("[POST] /inference - Received file: %s", file.filename)
 
     result = None
+    report = None
     if file:
         if file.content_type == "application/pdf":
             try:
-                content = await file.read()
-                # marker requires path to file rather than UploadFile object, so create temp copy of file
-                with Path(f"temp_api_file_{file.filename}").open("wb") as f:  # noqa: ASYNC230
-                    f.write(content)
-                result = convert_pdf_to_markdown(f"temp_api_file_{file.filename}")
+                # marker requires path to file rather than UploadFile object, so spool the upload to a temp file
+                async with spool_upload(file) as file_path:
+                    if text_layer:
+                        result, report = await ocr_executor.run(
+                            with_text_layer,
+                            partial(convert_pdf_to_markdown, file_path),
+                            file_path,
+                            first_page=first_page,
+                            last_page=last_page,
+                        )
+                    else:
+                        result = await ocr_executor.run(
+                            convert_pdf_to_markdown, file_path, first_page=first_page, last_page=last_page
+                        )
+            except HTTPException:
+                raise
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"Failed to run marker. Error: {e}") from e
         else:
@@ -71,4 +104,5 @@ async def inference(file: Annotated[UploadFile, File()] = None) -> JSONResponse:
     if result is None:
         raise HTTPException(status_code=400, detail="Failed to process the input.")
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+    with stage("serialisation"):
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result, headers=page_headers(report))
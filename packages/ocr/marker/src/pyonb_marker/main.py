@@ -1,20 +1,36 @@
 """Marker OCR runner."""
 
+import copy
 import logging
 import sys
+from functools import lru_cache
 from pathlib import Path
 
+import pypdfium2
 from marker.config.parser import ConfigParser
 from marker.converters.pdf import PdfConverter
 from marker.models import create_model_dict
 from marker.output import text_from_rendered
+from pyonb_ocr_common.metrics import stage
 
 logger = logging.getLogger()
 
 
+@lru_cache(maxsize=1)
+def load_models() -> dict:
+    """
+    Load Marker's layout, recognition and detection models.
+
+    Models are loaded once per process and shared by every converter.
+    """
+    logger.info("Loading Marker models")
+    return create_model_dict()
+
+
 def setup_converter(config, config_parser) -> PdfConverter:  # noqa: ANN001
     """Initialize PDF converter object."""
-    artifact_dict = create_model_dict()
+    # PdfConverter stores its LLM service in artifact_dict, so give each converter its own copy of the (shared) models
+    artifact_dict = dict(load_models())
     return PdfConverter(
         artifact_dict=artifact_dict,
         config=config,
@@ -22,25 +38,94 @@ def setup_converter(config, config_parser) -> PdfConverter:  # noqa: ANN001
     )
 
 
-def convert_pdf_to_markdown(  # noqa: ANN201
-    file_path: str | Path,
-    output_format: str | Path = "markdown",
+@lru_cache(maxsize=8)
+def load_converter(
+    output_format: str = "markdown",
     use_llm: bool = True,
-):
-    """Convert the PDF to markdown using Marker and optionally use LLM for improved accuracy."""
+    llm_service: str = "marker.services.ollama.OllamaService",
+    ollama_model: str = "llama3.2",
+    ollama_base_url: str = "http://localhost:11434",
+) -> PdfConverter:
+    """
+    Return the PDF converter for the given configuration.
+
+    Converters are cached per process, keyed by their configuration, so models are not reloaded per document.
+    Page ranges are applied per document (see with_page_range), so they don't need converters of their own.
+    """
     config = {
         "output_format": output_format,
         "use_llm": use_llm,
-        "llm_service": "marker.services.ollama.OllamaService",
-        "ollama_model": "llama3.2",
-        "ollama_base_url": "http://localhost:11434",
+        "llm_service": llm_service,
+        "ollama_model": ollama_model,
+        "ollama_base_url": ollama_base_url,
         "disable_images": True,
     }
-    config_parser = ConfigParser(config)
-    converter = setup_converter(config_parser.generate_config_dict(), config_parser)
+    with stage("model_load"):
+        config_parser = ConfigParser(config)
+        return setup_converter(config_parser.generate_config_dict(), config_parser)
+
+
+def warm_up() -> None:
+    """Load Marker's models and build the converter used by default, so the first request is not slow."""
+    # nb: same arguments as convert_pdf_to_markdown passes, so the first request hits the cache
+    load_converter(output_format="markdown", use_llm=True)
+
+
+def page_range(file_path: str | Path, first_page: int | None = None, last_page: int | None = None) -> list[int] | None:
+    """
+    Marker's (0-based) page numbers for pages first_page to last_page (1-based, inclusive) of a PDF.
+
+    The range is clipped to the pages the PDF has; None means every page.
+    """
+    if first_page is None and last_page is None:
+        return None
+    pdf = pypdfium2.PdfDocument(str(file_path))
+    try:
+        page_count = len(pdf)
+    finally:
+        pdf.close()
+    first = max(first_page or 1, 1)
+    last = min(last_page or page_count, page_count)
+    if first > last:
+        msg = f"Page range {first_page}-{last_page} is outside the document's {page_count} pages."
+        raise ValueError(msg)
+    return list(range(first - 1, last))
+
+
+def with_page_range(converter: PdfConverter, pages: list[int] | None) -> PdfConverter:
+    """
+    The converter, limited to the given (0-based) pages.
+
+    Marker reads the page range from the converter's config as it builds each document, so a shallow copy with its
+    own config converts only those pages, and shares the cached converter's models and processors.
+    """
+    if pages is None:
+        return converter
+    limited = copy.copy(converter)
+    limited.config = {**converter.config, "page_range": pages}
+    return limited
+
+
+def convert_pdf_to_markdown(  # noqa: ANN201
+    file_path: str | Path,
+    output_format: str | Path = "markdown",
+    use_llm: bool = True,
+    first_page: int | None = None,
+    last_page: int | None = None,
+):
+    """
+    Convert the PDF to markdown using Marker and optionally use LLM for improved accuracy.
+
+    Only pages first_page to last_page (1-based, inclusive) are converted, if given.
+    """
+    converter = with_page_range(
+        load_converter(output_format=str(output_format), use_llm=use_llm),
+        page_range(file_path, first_page, last_page),
+    )
     try:
-        rendered = converter(str(file_path))
-        text, _, _ = text_from_rendered(rendered)
+        with stage("inference"):
+            rendered = converter(str(file_path))
+            text, _, _ = text_from_rendered(rendered)
     except Exception:
         logger.exception("Error processing PDF.")
 
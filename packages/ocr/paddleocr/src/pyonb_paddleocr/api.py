@@ -1,33 +1,55 @@
 """PaddleOCR API."""
 
-import datetime
 import logging
 import os
-from functools import lru_cache
+from collections import deque
+from collections.abc import AsyncGenerator, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
 from typing import Annotated
 
 import numpy as np
 import uvicorn
 from fastapi import FastAPI, File, Form, HTTPException, UploadFile, status
 from fastapi.responses import JSONResponse, RedirectResponse
-from paddleocr import PaddleOCR
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
+from pyonb_ocr_common.executor import OCRExecutor
+from pyonb_ocr_common.logs import setup_logging
+from pyonb_ocr_common.metrics import instrument, stage
+from pyonb_ocr_common.textlayer import OCR_TEXT_LAYER, page_headers, with_text_layer
+from pyonb_ocr_common.uploads import spool_upload
+
+from pyonb_paddleocr.models import PADDLEOCR_PAGE_WORKERS, ModelPool, load_ocr_model, model_registry, preload_models
 
 PADDLEOCR_API_PORT = int(os.getenv("PADDLE_API_PORT", default="8114"))
+# Number of pages rasterised at a time
+PADDLEOCR_RENDER_WINDOW = int(os.getenv("PADDLEOCR_RENDER_WINDOW", default="4"))
+# Image formats OCR'd directly, as well as PDF; each frame of a multi-page TIFF is a page
+IMAGE_CONTENT_TYPES = {"image/tiff", "image/png", "image/jpeg"}
 
-_today = datetime.datetime.now(datetime.UTC).strftime("%Y_%m_%d")  # type: ignore[attr-defined] # mypy complains that 'Module has no attribute "UTC"'
-logging.basicConfig(
-    filename=f"paddleocr-{_today}.log",
-    format="%(asctime)s %(message)s",
-    filemode="a",
-)
+setup_logging()
 
 # Creating an object
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
 
-app = FastAPI(swagger_ui_parameters={"tryItOutEnabled": True})
+# with OCR_EXECUTOR=process, each executor process loads the models as it starts
+ocr_executor = OCRExecutor(initializer=preload_models)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncGenerator[None]:
+    """Load the models in PADDLEOCR_PRELOAD_MODELS, and shut down the OCR executor when the service stops."""
+    # load in the OCR executor, so models end up in the process that runs the OCR
+    await ocr_executor.run(preload_models)
+    yield
+    ocr_executor.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, swagger_ui_parameters={"tryItOutEnabled": True})
+instrument(app)
 
 
 @app.get("/", include_in_schema=False)
@@ -50,61 +72,204 @@ async def health_check() -> JSONResponse:
     )
 
 
-@lru_cache(maxsize=1)
-def load_ocr_model(
+@app.get("/models", status_code=status.HTTP_200_OK)
+async def models() -> JSONResponse:
+    """
+    Loaded PaddleOCR models, and how often models have been loaded, reused and unloaded.
+
+    With OCR_EXECUTOR=process the models are loaded in the executor's processes, and are not reported here.
+    """
+    return JSONResponse(status_code=status.HTTP_200_OK, content=model_registry.stats())
+
+
+def ocr_page(page: Image.Image, models: ModelPool) -> str | None:
+    """OCR a single page, returning one line per detected text box, or None if no text is found."""
+    with models.model() as model, stage("inference"):
+        results = model.ocr(np.array(page), cls=True)
+    if results and results[0]:
+        return "\n".join([line[1][0] for line in results[0]])
+    return None
+
+
+def page_range(page_count: int, first_page: int | None, last_page: int | None) -> tuple[int, int]:
+    """First and last pages (1-based, inclusive) of first_page to last_page that are in the document."""
+    first = max(first_page or 1, 1)
+    last = min(last_page or page_count, page_count)
+    if first > last:
+        msg = f"Page range {first_page}-{last_page} is outside the document's {page_count} pages."
+        raise ValueError(msg)
+    return first, last
+
+
+def render_pages(  # noqa: PLR0913
+    file_path: str | Path,
+    dpi: int,
+    window: int,
+    thread_count: int = 1,
+    first_page: int | None = None,
+    last_page: int | None = None,
+) -> Iterator[Image.Image]:
+    """
+    Rasterise a PDF lazily, `window` pages at a time.
+
+    Only the current window of pages is held in memory, rather than every page of the document.
+    If first_page or last_page (1-based, inclusive) are given, only those pages are rasterised.
+    """
+    page_count = pdfinfo_from_path(str(file_path))["Pages"]
+    first, last = page_range(page_count, first_page, last_page)
+    for window_first in range(first, last + 1, window):
+        window_last = min(window_first + window - 1, last)
+        logger.debug("Rasterising pages %d-%d of %d", window_first, window_last, page_count)
+        with stage("rasterisation"):
+            pages = convert_from_path(
+                file_path,
+                dpi,
+                first_page=window_first,
+                last_page=window_last,
+                thread_count=min(thread_count, window_last - window_first + 1),
+            )
+        yield from pages
+
+
+def image_pages(
+    file_path: str | Path, first_page: int | None = None, last_page: int | None = None
+) -> Iterator[Image.Image]:
+    """
+    Decode an image's frames (e.g. the pages of a multi-page TIFF) one at a time, at the image's own resolution.
+
+    Only the current frame is held in memory. If first_page or last_page (1-based, inclusive) are given, only those
+    frames are decoded.
+    """
+    with Image.open(file_path) as image:
+        frame_count = getattr(image, "n_frames", 1)
+        first, last = page_range(frame_count, first_page, last_page)
+        for frame in range(first - 1, last):
+            logger.debug("Decoding frame %d of %d", frame + 1, frame_count)
+            with stage("decoding"):
+                image.seek(frame)
+                # e.g. bilevel fax or greyscale scans; the model expects three channels
+                page = image.convert("RGB")
+            yield page
+
+
+def extract_text(pages: Iterable[Image.Image], models: ModelPool, workers: int = 1) -> str:
+    """
+    Perform OCR to extract text from PDF pages using PaddleOCR.
+
+    Up to `workers` pages are OCR'd at once, while the next pages are taken from `pages`;
+    page order is preserved.
+    """
+    page_texts = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="page") as pool:
+        in_flight: deque[Future] = deque()
+        for page in pages:
+            in_flight.append(pool.submit(ocr_page, page, models))
+            # wait for the oldest page before taking more, so pages are not rasterised faster than they are OCR'd
+            if len(in_flight) >= workers:
+                page_texts.append(in_flight.popleft().result())
+        page_texts.extend(future.result() for future in in_flight)
+
+    return "".join(f"{page_text}\n" for page_text in page_texts if page_text is not None)
+
+
+def run_ocr(  # noqa: PLR0913
+    file_path: str | Path,
     ocr_version: str,
     lang: str,
-) -> PaddleOCR:
-    """Load PaddleOCR official model with model version and Model Language."""
-    return PaddleOCR(
+    page_workers: int = PADDLEOCR_PAGE_WORKERS,
+    dpi: int = 300,
+    first_page: int | None = None,
+    last_page: int | None = None,
+    content_type: str = "application/pdf",
+) -> str:
+    """
+    Rasterise a PDF, or decode an image, and extract its text with PaddleOCR, using up to `page_workers` workers.
+
+    Only pages first_page to last_page (1-based, inclusive) are rasterised, if given.
+    Images (IMAGE_CONTENT_TYPES) are OCR'd frame by frame, without rasterisation, so `dpi` does not apply to them.
+    """
+    models = load_ocr_model(
         ocr_version=ocr_version,
-        use_angle_cls=True,
         lang=lang,
-        enable_mkldnn=True,
     )
-
-
-def extract_text(pages: list[Image.Image], model: PaddleOCR) -> str:
-    """Perform OCR to extract text from PDF pages using PaddleOCR."""
-    all_text = ""
-    for page in pages:
-        results = model.ocr(np.array(page), cls=True)
-        if results and results[0]:
-            page_text = "\n".join([line[1][0] for line in results[0]])
-            all_text += page_text + "\n"
-
-    return all_text
+    # can't OCR more pages at once than there are copies of the model
+    workers = max(1, min(page_workers, models.size))
+    if content_type in IMAGE_CONTENT_TYPES:
+        pages = image_pages(file_path, first_page=first_page, last_page=last_page)
+    else:
+        pages = render_pages(
+            file_path,
+            dpi,
+            window=max(PADDLEOCR_RENDER_WINDOW, workers),
+            thread_count=workers,
+            first_page=first_page,
+            last_page=last_page,
+        )
+    return extract_text(
+        pages=pages,
+        models=models,
+        workers=workers,
+    )
 
 
 @app.post("/inference", status_code=status.HTTP_200_OK)
-async def inference(
+async def inference(  # noqa: PLR0913
     file: Annotated[UploadFile, File()] = None,
     ocr_version: Annotated[str, Form()] = "PP-OCRv4",
     lang: Annotated[str, Form()] = "en",
+    page_workers: Annotated[int, Form()] = PADDLEOCR_PAGE_WORKERS,
+    dpi: Annotated[int, Form(ge=72, le=600)] = 300,
+    first_page: Annotated[int | None, Form(ge=1)] = None,
+    last_page: Annotated[int | None, Form(ge=1)] = None,
+    text_layer: Annotated[bool, Form()] = OCR_TEXT_LAYER,
 ) -> JSONResponse:
     """
-    Endpoint to execute paddleocr on PDF file.
+    Endpoint to execute paddleocr on a PDF, or a TIFF, PNG or JPEG image.
+
+    Pages are rasterised at `dpi` (72 to 600), a few at a time, and OCR'd as they are rasterised.
+    Images are OCR'd at their own resolution, one frame (page) at a time, without converting them to PDF.
+    Up to `page_workers` pages are rasterised and OCR'd in parallel (at most PADDLEOCR_PAGE_WORKERS).
+    If `first_page` or `last_page` (1-based, inclusive) are given, only those pages are rasterised and OCR'd.
+    With `text_layer` (OCR_TEXT_LAYER by default), the text of PDF pages with a usable text layer is taken from the
+    PDF, and only the other pages are OCR'd; the X-Text-Layer-Pages and X-OCR-Pages headers list which are which.
 
     Returns 200 OK JSON formatted text result from paddleocr.
     """
     logger.info("[POST] /inference")
     logger.info("[POST] /inference - Received file: %s", file.filename)
 
-    if file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="Invalid file type. Only PDF are allowed.")
+    if file.content_type != "application/pdf" and file.content_type not in IMAGE_CONTENT_TYPES:
+        raise HTTPException(status_code=400, detail="Invalid file type. Only PDF, TIFF, PNG and JPEG are allowed.")
 
-    model = load_ocr_model(
-        ocr_version=ocr_version,
-        lang=lang,
-    )
     try:
-        content = await file.read()
-        pages = convert_from_bytes(content, 300)
-        result = extract_text(
-            pages=pages,
-            model=model,
-        )
-        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+        async with spool_upload(file) as file_path:
+            ocr = partial(
+                run_ocr,
+                file_path,
+                ocr_version=ocr_version,
+                lang=lang,
+                page_workers=page_workers,
+                dpi=dpi,
+                content_type=file.content_type,
+            )
+            report = None
+            if text_layer and file.content_type == "application/pdf":
+                # each OCR'd page ends with a newline
+                result, report = await ocr_executor.run(
+                    with_text_layer,
+                    ocr,
+                    file_path,
+                    first_page=first_page,
+                    last_page=last_page,
+                    separator="\n",
+                    end="\n",
+                )
+            else:
+                result = await ocr_executor.run(ocr, first_page=first_page, last_page=last_page)
+        with stage("serialisation"):
+            return JSONResponse(status_code=status.HTTP_200_OK, content=result, headers=page_headers(report))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to run paddleocr. Error: {e}") from e
 
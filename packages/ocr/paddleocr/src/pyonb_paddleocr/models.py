@@ -0,0 +1,210 @@
+"""PaddleOCR model loading."""
+
+import gc
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Generator
+from contextlib import contextmanager
+from pathlib import Path
+
+from paddleocr import PaddleOCR
+from pyonb_ocr_common.metrics import stage
+
+logger = logging.getLogger()
+
+# Number of pages OCR'd at once; each page worker gets its own copy of the model
+PADDLEOCR_PAGE_WORKERS = int(os.getenv("PADDLEOCR_PAGE_WORKERS", default="1"))
+# Number of detected text boxes passed through the recognition model in one batch
+PADDLEOCR_REC_BATCH_NUM = int(os.getenv("PADDLEOCR_REC_BATCH_NUM", default="6"))
+# CPU threads used for inference, shared between the page workers
+PADDLEOCR_CPU_THREADS = int(os.getenv("PADDLEOCR_CPU_THREADS", default="10"))
+# Number of (version, language) models kept loaded at once
+PADDLEOCR_MAX_MODELS = int(os.getenv("PADDLEOCR_MAX_MODELS", default="2"))
+# Models loaded at startup, as a comma-separated list of <version>/<lang>, e.g. "PP-OCRv4/en,PP-OCRv3/ch"
+PADDLEOCR_PRELOAD_MODELS = os.getenv("PADDLEOCR_PRELOAD_MODELS", default="PP-OCRv4/en")
+# Memory, in MB, to keep free when loading a model; least recently used models are unloaded to make room
+PADDLEOCR_MIN_FREE_MEMORY_MB = int(os.getenv("PADDLEOCR_MIN_FREE_MEMORY_MB", default="1024"))
+
+
+class ModelPool:
+    """
+    Copies of a PaddleOCR model, for OCR'ing pages in parallel.
+
+    PaddleOCR models cannot run more than one image at a time, so each page worker borrows a copy for each page.
+    """
+
+    def __init__(self, ocr_version: str, lang: str, size: int) -> None:
+        """Load `size` copies of the model."""
+        self.ocr_version = ocr_version
+        self.lang = lang
+        self.size = size
+        self._models: queue.Queue[PaddleOCR] = queue.Queue()
+        for _ in range(size):
+            self._models.put(
+                PaddleOCR(
+                    ocr_version=ocr_version,
+                    use_angle_cls=True,
+                    lang=lang,
+                    enable_mkldnn=True,
+                    rec_batch_num=PADDLEOCR_REC_BATCH_NUM,
+                    cpu_threads=max(1, PADDLEOCR_CPU_THREADS // size),
+                )
+            )
+
+    @contextmanager
+    def model(self) -> Generator[PaddleOCR]:
+        """Borrow a copy of the model, waiting for one to be free."""
+        model = self._models.get()
+        try:
+            yield model
+        finally:
+            self._models.put(model)
+
+
+def available_memory() -> int | None:
+    """
+    Bytes of memory available to this process, or None if it cannot be determined.
+
+    Uses the container's cgroup memory limit if there is one, otherwise the memory available on the host.
+    """
+    try:
+        limit = Path("/sys/fs/cgroup/memory.max").read_text().strip()
+        if limit != "max":
+            return int(limit) - int(Path("/sys/fs/cgroup/memory.current").read_text())
+    except (OSError, ValueError):
+        pass
+    try:
+        with Path("/proc/meminfo").open() as meminfo:
+            for line in meminfo:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+class ModelRegistry:
+    """
+    Loaded PaddleOCR models, keyed by (version, language), with least-recently-used eviction.
+
+    At most `max_models` models are kept loaded. Before a model is loaded, least recently used models are
+    unloaded until there are fewer than `max_models` and at least `min_free_bytes` of memory is available.
+    Models still in use by a request are freed once the request finishes.
+
+    Loads, evictions and hits are counted per process (i.e. per uvicorn worker, or per OCR executor process).
+    """
+
+    def __init__(self, max_models: int, min_free_bytes: int, pool_size: int) -> None:
+        """Create an empty registry; models are loaded on first use, or by preload()."""
+        self.max_models = max(1, max_models)
+        self.min_free_bytes = min_free_bytes
+        self.pool_size = pool_size
+        self._models: OrderedDict[tuple[str, str], ModelPool] = OrderedDict()
+        self._lock = threading.Lock()
+        # one lock per model being loaded, so a model is only loaded once and other models can still be used
+        self._loading: dict[tuple[str, str], threading.Lock] = {}
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    def _hit(self, key: tuple[str, str]) -> ModelPool | None:
+        """Return the model for key if it is loaded, marking it most recently used. Call with the lock held."""
+        models = self._models.get(key)
+        if models is not None:
+            self._models.move_to_end(key)
+            self.hits += 1
+        return models
+
+    def _low_memory(self) -> bool:
+        available = available_memory()
+        return available is not None and available < self.min_free_bytes
+
+    def _make_room(self) -> None:
+        """Unload least recently used models before loading another. Call with the lock held."""
+        while self._models and (len(self._models) >= self.max_models or self._low_memory()):
+            (ocr_version, lang), _ = self._models.popitem(last=False)
+            self.evictions += 1
+            logger.info("Unloaded PaddleOCR model %s/%s", ocr_version, lang)
+            # the model's memory is only given back once it has been garbage collected
+            gc.collect()
+
+    def get(self, ocr_version: str, lang: str) -> ModelPool:
+        """Return the model for a version and language, loading it if needed."""
+        key = (ocr_version, lang)
+        with self._lock:
+            models = self._hit(key)
+            if models is not None:
+                return models
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # another request may have loaded it while this one waited
+                models = self._hit(key)
+                if models is not None:
+                    return models
+                self._make_room()
+
+            logger.info("Loading PaddleOCR model %s/%s (%d copies)", ocr_version, lang, self.pool_size)
+            start = time.perf_counter()
+            with stage("model_load"):
+                models = ModelPool(ocr_version=ocr_version, lang=lang, size=self.pool_size)
+            duration = time.perf_counter() - start
+            logger.info("Loaded PaddleOCR model %s/%s in %.1f seconds", ocr_version, lang, duration)
+
+            with self._lock:
+                self._models[key] = models
+                self._loading.pop(key, None)
+                self.loads += 1
+                self.load_seconds += duration
+        return models
+
+    def preload(self, models: str = PADDLEOCR_PRELOAD_MODELS) -> None:
+        """Load models given as a comma-separated list of <version>/<lang>."""
+        for model in filter(None, (m.strip() for m in models.split(","))):
+            ocr_version, _, lang = model.partition("/")
+            if not lang:
+                logger.warning("Ignoring PaddleOCR model '%s' to preload, expected <version>/<lang>", model)
+                continue
+            self.get(ocr_version, lang)
+
+    def stats(self) -> dict:
+        """Loaded models and load/evict counters."""
+        with self._lock:
+            return {
+                "loaded": [f"{ocr_version}/{lang}" for ocr_version, lang in self._models],
+                "max_models": self.max_models,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "load_duration_in_second": self.load_seconds,
+            }
+
+
+model_registry = ModelRegistry(
+    max_models=PADDLEOCR_MAX_MODELS,
+    min_free_bytes=PADDLEOCR_MIN_FREE_MEMORY_MB * 1024 * 1024,
+    pool_size=PADDLEOCR_PAGE_WORKERS,
+)
+
+
+def preload_models(models: str = PADDLEOCR_PRELOAD_MODELS) -> None:
+    """
+    Load models given as a comma-separated list of <version>/<lang> into this process's registry.
+
+    A module-level function, rather than model_registry.preload, so it can be sent to OCR executor processes.
+    """
+    model_registry.preload(models)
+
+
+def load_ocr_model(
+    ocr_version: str,
+    lang: str,
+) -> ModelPool:
+    """Load PaddleOCR official model with model version and Model Language, one copy per page worker."""
+    return model_registry.get(ocr_version=ocr_version, lang=lang)
@@ -0,0 +1,445 @@
+"""
+Benchmark an OCR engine through the forwarding API: latency, throughput, memory use and accuracy.
+
+Requests are sent to `inference_single` (one document per request, cycling through the corpus) or
+`inference_folder` (the whole of the API's DATA_FOLDER per request) by `concurrency` clients for `duration`
+seconds. With `--fake`, the forwarding API is started locally in front of fake OCR services (see fake_ocr),
+so the API itself can be benchmarked without any OCR models installed.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from enum import StrEnum
+from io import BytesIO
+from pathlib import Path
+
+import httpx
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+from pyonb.analysis.eval_corpus import evaluate_document, load_ground_truth, percentile, summarise
+from pyonb.analysis.ocr_results import decode_payload, entry_document
+
+logger = logging.getLogger()
+
+ENGINES = ("marker", "docling", "paddleocr", "kreuzberg")
+SINGLE_PATHS = {
+    "marker": "/marker/inference_single",
+    "docling": "/docling/inference_single",
+    "paddleocr": "/paddleocr/inference_single",
+    "kreuzberg": "/kreuzberg-ocr/inference_single",
+}
+FOLDER_PATHS = {
+    "marker": "/marker/inference_folder",
+    "docling": "/docling/inference_folder",
+    "paddleocr": "/paddleocr/inference_folder",
+}
+# docker compose services whose memory use is reported
+SERVICES = (*ENGINES, "ocr-forwarding-api")
+
+
+class Endpoint(StrEnum):
+    """Forwarding API endpoint to benchmark."""
+
+    SINGLE = "single"
+    FOLDER = "folder"
+
+
+@dataclass
+class RequestResult:
+    """Outcome of a single request to the forwarding API."""
+
+    latency: float
+    status_code: int | None  # None if no response was received
+    documents: int = 0  # documents OCR'd successfully
+    failed_documents: int = 0
+    pages: int = 0
+    texts: dict[str, str] = field(default_factory=dict)  # OCR text, keyed by document name
+
+
+@dataclass
+class Corpus:
+    """PDFs to benchmark with, and their page counts."""
+
+    files: dict[str, bytes]
+    pages: dict[str, int]
+
+    @classmethod
+    def load(cls, corpus_dir: Path) -> "Corpus":
+        """Read every PDF in corpus_dir, and count its pages."""
+        files = {path.name: path.read_bytes() for path in sorted(corpus_dir.glob("*.pdf"))}
+        if not files:
+            msg = f"No PDFs found in {corpus_dir}"
+            raise ValueError(msg)
+        pages = {}
+        for name, pdf in files.items():
+            try:
+                pages[name] = len(PdfReader(BytesIO(pdf)).pages)
+            except (PyPdfError, ValueError) as e:
+                msg = f"Could not read {corpus_dir / name}: {e}"
+                raise ValueError(msg) from e
+        return cls(files=files, pages=pages)
+
+
+async def post_single(client: httpx.AsyncClient, url: str, corpus: Corpus, filename: str, cache: str) -> RequestResult:
+    """OCR a single document with inference_single."""
+    start = time.perf_counter()
+    try:
+        response = await client.post(
+            url, params={"cache": cache}, files={"file_upload": (filename, corpus.files[filename], "application/pdf")}
+        )
+    except httpx.HTTPError:
+        logger.exception("Request for %s failed", filename)
+        return RequestResult(latency=time.perf_counter() - start, status_code=None, failed_documents=1)
+    latency = time.perf_counter() - start
+
+    if response.is_error:
+        return RequestResult(latency=latency, status_code=response.status_code, failed_documents=1)
+    return RequestResult(
+        latency=latency,
+        status_code=response.status_code,
+        documents=1,
+        pages=corpus.pages[filename],
+        texts={Path(filename).stem: decode_payload(response.json()["ocr-result"])},
+    )
+
+
+async def post_folder(client: httpx.AsyncClient, url: str, corpus: Corpus, cache: str) -> RequestResult:
+    """OCR the forwarding API's DATA_FOLDER with inference_folder."""
+    start = time.perf_counter()
+    try:
+        response = await client.post(url, params={"cache": cache})
+    except httpx.HTTPError:
+        logger.exception("Folder request failed")
+        return RequestResult(latency=time.perf_counter() - start, status_code=None)
+    result = RequestResult(latency=time.perf_counter() - start, status_code=response.status_code)
+    if response.is_error:
+        return result
+
+    for entry in response.json()["result"]:
+        document = entry_document(entry)
+        if document is None:
+            result.failed_documents += 1
+            continue
+        result.documents += 1
+        # pages are only known for documents that are also in the local corpus
+        result.pages += corpus.pages.get(entry["filename"], 0)
+        result.texts[Path(entry["filename"]).stem] = document.text
+    return result
+
+
+async def run_load(  # noqa: PLR0913
+    url: str,
+    engine: str,
+    endpoint: Endpoint,
+    corpus: Corpus,
+    concurrency: int,
+    duration: float,
+    cache: str = "bypass",
+) -> tuple[list[RequestResult], float]:
+    """
+    Send requests from `concurrency` clients until `duration` seconds have passed.
+
+    Requests in flight at the deadline are waited for. Returns the result of every request, and the time taken.
+    """
+    if endpoint == Endpoint.FOLDER and engine not in FOLDER_PATHS:
+        msg = f"{engine} has no inference_folder endpoint"
+        raise ValueError(msg)
+    filenames = itertools.cycle(corpus.files)
+    results: list[RequestResult] = []
+
+    # OCR of long documents can take many minutes
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=60 * 60, limits=limits) as client:
+
+        async def worker() -> None:
+            while time.perf_counter() < deadline:
+                if endpoint == Endpoint.SINGLE:
+                    result = await post_single(client, SINGLE_PATHS[engine], corpus, next(filenames), cache)
+                else:
+                    result = await post_folder(client, FOLDER_PATHS[engine], corpus, cache)
+                results.append(result)
+
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def load_report(results: list[RequestResult], elapsed: float) -> dict:
+    """Latency percentiles, throughput and error rates of a benchmark run."""
+    requests = len(results)
+    errors = sum(result.status_code is None or result.status_code >= 400 for result in results)  # noqa: PLR2004
+    documents = sum(result.documents for result in results)
+    failed_documents = sum(result.failed_documents for result in results)
+    pages = sum(result.pages for result in results)
+
+    report: dict = {
+        "duration_in_second": round(elapsed, 3),
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(errors / max(1, requests), 3),
+        "status_codes": dict(Counter(str(result.status_code or "no_response") for result in results)),
+        "documents": documents,
+        "document_errors": failed_documents,
+        "document_error_rate": round(failed_documents / max(1, documents + failed_documents), 3),
+        "pages": pages,
+        "documents_per_second": round(documents / elapsed, 3) if elapsed else 0.0,
+        "pages_per_second": round(pages / elapsed, 3) if elapsed else 0.0,
+    }
+    latencies = [result.latency for result in results]
+    if latencies:
+        report["latency_in_second"] = {
+            "mean": round(sum(latencies) / len(latencies), 3),
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3),
+        }
+    return report
+
+
+def accuracy_report(results: list[RequestResult], gt_dir: Path) -> dict:
+    """CER/WER/NED summary (see eval_corpus.summarise) of the first OCR text returned for each document."""
+    ground_truth = load_ground_truth(gt_dir)
+    texts: dict[str, str] = {}
+    for result in results:
+        for name, text in result.texts.items():
+            texts.setdefault(name, text)
+    documents = [evaluate_document(ground_truth[name], text) for name, text in texts.items() if name in ground_truth]
+    return {**summarise(documents), "missing": sorted(set(ground_truth) - set(texts))}
+
+
+MEMORY_UNITS = {"B": 1, "KIB": 2**10, "MIB": 2**20, "GIB": 2**30, "KB": 10**3, "MB": 10**6, "GB": 10**9}
+
+
+def _process_rss(pid: int) -> int:
+    """Resident memory in bytes of a process and its descendants (e.g. uvicorn workers), or 0 if it has exited."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+        children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+    except OSError:
+        return 0
+    match = re.search(r"^VmRSS:\s+(\d+) kB", status, re.MULTILINE)
+    rss = int(match.group(1)) * 1024 if match else 0
+    return rss + sum(_process_rss(int(child)) for child in children)
+
+
+def _docker_rss() -> dict[str, int]:
+    """Memory use in bytes of the running pyonb docker compose services, keyed by container name."""
+    output = subprocess.run(
+        ["docker", "stats", "--no-stream", "--format", "{{.Name}}\t{{.MemUsage}}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    usage = {}
+    for line in output.splitlines():
+        name, _, mem_usage = line.partition("\t")
+        match = re.match(r"([\d.]+)\s*([a-zA-Z]+)", mem_usage)
+        if match and any(service in name for service in SERVICES):
+            usage[name] = int(float(match.group(1)) * MEMORY_UNITS.get(match.group(2).upper(), 1))
+    return usage
+
+
+class MemorySampler:
+    """Sample the memory use of the OCR services in a background thread, keeping the peak of each."""
+
+    def __init__(self, pids: dict[str, int] | None = None, interval: float = 0.5) -> None:
+        """Sample the processes in pids (keyed by name), or if None, the pyonb docker compose services."""
+        self.pids = pids
+        self.interval = interval
+        self.peak: dict[str, int] = {}
+        self._stop = threading.Event()
+
+    def sample(self) -> None:
+        """Sample the current memory use of each service."""
+        usage = _docker_rss() if self.pids is None else {name: _process_rss(pid) for name, pid in self.pids.items()}
+        for name, rss in usage.items():
+            self.peak[name] = max(rss, self.peak.get(name, 0))
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sample()
+            except (OSError, subprocess.CalledProcessError):
+                logger.exception("Failed to sample memory use; peak RSS will not be reported")
+                return
+            self._stop.wait(self.interval)
+
+    @contextmanager
+    def sampling(self) -> Iterator["MemorySampler"]:
+        """Sample memory use in the background while in the block."""
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            self._stop.set()
+            thread.join()
+
+    def report(self) -> dict[str, float]:
+        """Peak resident memory of each service, in MB."""
+        return {name: round(rss / 2**20, 1) for name, rss in sorted(self.peak.items())}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_ready(url: str, processes: dict[str, subprocess.Popen], timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for name, process in processes.items():
+            if process.poll() is not None:
+                msg = f"{name} exited with code {process.returncode}"
+                raise RuntimeError(msg)
+        try:
+            if httpx.get(url).is_success:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    msg = f"{url} was not ready after {timeout} seconds"
+    raise TimeoutError(msg)
+
+
+@contextmanager
+def fake_services(corpus_dir: Path, latency: float, text_dir: Path | None = None) -> Iterator[tuple[str, dict]]:
+    """
+    Run the forwarding API locally in front of fake OCR services.
+
+    The API OCRs corpus_dir for inference_folder, and has its cache and job database in a temporary directory.
+    Yields the API's URL, and the process id of the API and of the fake OCR services.
+    """
+    ports = {engine: _free_port() for engine in ENGINES}
+    api_port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            **{f"{engine.upper()}_API_PORT": str(port) for engine, port in ports.items()},
+            **{f"{engine.upper()}_API_HOST": "127.0.0.1" for engine in ENGINES},
+            "OCR_FORWARDING_API_PORT": str(api_port),
+            "DATA_FOLDER": str(corpus_dir),
+            "OCR_CACHE_DIR": str(Path(tmp) / "ocr-cache"),
+            "OCR_JOBS_DB": str(Path(tmp) / "ocr-jobs.sqlite3"),
+        }
+        # metrics of a single local process don't need a multiprocess directory
+        env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        fake_command = [sys.executable, "-m", "pyonb.analysis.fake_ocr", "-p", *map(str, ports.values())]
+        fake_command += ["-l", str(latency), *(["-t", str(text_dir)] if text_dir else [])]
+        api_command = [sys.executable, "-m", "uvicorn", "pyonb_api.main:app", "--port", str(api_port)]
+        api_command += ["--log-level", "warning"]
+
+        processes = {
+            "fake-ocr": subprocess.Popen(fake_command, env=env),
+            "ocr-forwarding-api": subprocess.Popen(api_command, env=env),
+        }
+        try:
+            url = f"http://127.0.0.1:{api_port}"
+            _wait_until_ready(f"{url}/marker/health", processes)
+            yield url, {name: process.pid for name, process in processes.items()}
+        finally:
+            for process in processes.values():
+                process.terminate()
+                process.wait(timeout=10)
+
+
+def run_benchmark(  # noqa: PLR0913
+    url: str,
+    engine: str,
+    endpoint: Endpoint,
+    corpus_dir: Path,
+    *,
+    concurrency: int = 4,
+    duration: float = 60,
+    warmup: float = 0,
+    cache: str = "bypass",
+    gt_dir: Path | None = None,
+    memory: MemorySampler | None = None,
+) -> dict:
+    """Benchmark an engine through the forwarding API at url, returning a report of the run."""
+    corpus = Corpus.load(corpus_dir)
+    if warmup:
+        asyncio.run(run_load(url, engine, endpoint, corpus, concurrency, warmup, cache))
+
+    memory = memory or MemorySampler()
+    with memory.sampling():
+        results, elapsed = asyncio.run(run_load(url, engine, endpoint, corpus, concurrency, duration, cache))
+
+    report = {
+        "config": {
+            "url": url,
+            "engine": engine,
+            "endpoint": endpoint,
+            "concurrency": concurrency,
+            "duration_in_second": duration,
+            "warmup_in_second": warmup,
+            "cache": cache,
+            "corpus_documents": len(corpus.files),
+            "corpus_pages": sum(corpus.pages.values()),
+            "started": datetime.now(tz=UTC).isoformat(timespec="seconds"),
+        },
+        **load_report(results, elapsed),
+        "peak_rss_mb": memory.report(),
+    }
+    if gt_dir is not None:
+        report["accuracy"] = accuracy_report(results, gt_dir)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark an OCR engine through the pyonb forwarding API.")
+    parser.add_argument("-e", "--engine", choices=ENGINES, required=True, help="OCR engine to benchmark.")
+    parser.add_argument("-c", "--corpus_dir", type=str, required=True, help="Directory of [.pdf] documents.")
+    parser.add_argument(
+        "--endpoint", type=Endpoint, choices=list(Endpoint), default=Endpoint.SINGLE, help="Endpoint to benchmark."
+    )
+    parser.add_argument("-n", "--concurrency", type=int, default=4, help="Number of concurrent requests.")
+    parser.add_argument("-d", "--duration", type=float, default=60, help="Seconds to send requests for.")
+    parser.add_argument("--warmup", type=float, default=0, help="Seconds of requests to send before measuring.")
+    parser.add_argument("--cache", type=str, default="bypass", help="Forwarding API cache mode (default: bypass).")
+    parser.add_argument("-gt", "--ground_truth_dir", type=str, default=None, help="Directory of [.txt] ground truth.")
+    parser.add_argument("-u", "--url", type=str, default="http://127.0.0.1:8110", help="Forwarding API URL.")
+    parser.add_argument("--fake", action="store_true", help="Run the forwarding API with fake OCR services.")
+    parser.add_argument("--fake_latency", type=float, default=0.1, help="Seconds per page taken by fake OCR.")
+    parser.add_argument("-o", "--output", type=str, default=None, help="File to write the JSON report to.")
+    args = parser.parse_args()
+
+    corpus_dir = Path(args.corpus_dir).resolve()
+    gt_dir = Path(args.ground_truth_dir).resolve() if args.ground_truth_dir else None
+    options = {
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "cache": args.cache,
+        "gt_dir": gt_dir,
+    }
+    if args.fake:
+        # fake OCR returns the ground truth, so accuracy metrics measure only how results are passed through
+        with fake_services(corpus_dir, args.fake_latency, gt_dir) as (url, pids):
+            report = run_benchmark(url, args.engine, args.endpoint, corpus_dir, memory=MemorySampler(pids), **options)
+    else:
+        report = run_benchmark(args.url, args.engine, args.endpoint, corpus_dir, **options)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))  # noqa: T201
@@ -0,0 +1,171 @@
+"""Script to evaluate OCR performance metrics over a corpus of documents, for one or more OCR tools."""
+
+import argparse
+import csv
+import json
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import Levenshtein
+
+from pyonb.analysis.eval_ocr import evaluate_metrics, read_file
+from pyonb.analysis.metrics import word_distance
+from pyonb.analysis.ocr_results import iter_ocr_documents
+
+METRICS = ("cer", "wer", "ned")
+OCR_FILE_TYPES = (".txt", ".text", ".json", ".ndjson", ".jsonl", ".sse")
+DOCUMENT_FIELDS = ("ocr", "document", *METRICS, "char_edits", "gt_chars", "word_edits", "gt_words")
+
+
+def load_ground_truth(gt_dir: Path) -> dict[str, Path]:
+    """Ground truth .txt files in gt_dir, keyed by document name (the file name without its extension)."""
+    return {path.stem: path for path in sorted(gt_dir.glob("*.txt"))}
+
+
+def _load_ocr_file(path: Path, outputs: dict[str, str]) -> None:
+    for document in iter_ocr_documents(path):
+        # pyonb responses name the document they came from, e.g. "note.pdf"
+        outputs[Path(document.filename).stem if document.filename else path.stem] = document.text
+
+
+def load_ocr_outputs(ocr_path: Path) -> dict[str, str]:
+    """
+    OCR text for each document, keyed by document name.
+
+    ocr_path is either a directory of OCR outputs (.txt files, or pyonb JSON responses for single documents),
+    or a file of pyonb `inference_folder` or job results (see iter_ocr_documents).
+    """
+    outputs: dict[str, str] = {}
+    if not ocr_path.is_dir():
+        _load_ocr_file(ocr_path, outputs)
+        return outputs
+
+    for path in sorted(ocr_path.iterdir()):
+        if path.suffix.lower() in OCR_FILE_TYPES:
+            _load_ocr_file(path, outputs)
+    return outputs
+
+
+def evaluate_document(gt_path: Path, ocr_text: str) -> dict:
+    """OCR metrics for a single document, with the edit counts needed for micro-averaged rates."""
+    gt_text = str(read_file(gt_path))
+    return {
+        **evaluate_metrics(gt_text, ocr_text),
+        "char_edits": Levenshtein.distance(gt_text, ocr_text),
+        "gt_chars": len(gt_text),
+        "word_edits": word_distance(gt_text, ocr_text),
+        "gt_words": len(gt_text.split()),
+    }
+
+
+def percentile(values: list[float], percent: int) -> float:
+    """The given percentile of values, interpolating between the closest values."""
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1]
+
+
+def summarise(documents: list[dict]) -> dict:
+    """
+    Aggregate statistics of per-document metrics.
+
+    Mean, median and 95th percentile of each metric over documents, and micro-averaged CER and WER
+    (total edits / total ground truth characters or words), which weight each document by its length.
+    """
+    summary: dict = {"documents": len(documents)}
+    if not documents:
+        return summary
+    for metric in METRICS:
+        values = [document[metric] for document in documents]
+        summary[metric] = {
+            "mean": round(statistics.fmean(values), 3),
+            "median": round(statistics.median(values), 3),
+            "p95": round(percentile(values, 95), 3),
+        }
+    summary["micro_cer"] = round(
+        sum(d["char_edits"] for d in documents) / max(1, sum(d["gt_chars"] for d in documents)), 3
+    )
+    summary["micro_wer"] = round(
+        sum(d["word_edits"] for d in documents) / max(1, sum(d["gt_words"] for d in documents)), 3
+    )
+    return summary
+
+
+def run_corpus(gt_dir: Path, ocr_paths: dict[str, Path], max_workers: int | None = None) -> tuple[list[dict], dict]:
+    """
+    Evaluate OCR outputs against a directory of ground truth files.
+
+    ocr_paths maps a name for each OCR tool (or run) to its outputs (see load_ocr_outputs). Documents are paired
+    by name, and evaluated in a pool of `max_workers` processes.
+
+    Returns the metrics of every document, and summary statistics per OCR tool, including the
+    ground truth documents it has no output for.
+    """
+    ground_truth = load_ground_truth(gt_dir)
+
+    pairs: list[tuple[str, str, str]] = []
+    missing = {}
+    for name, ocr_path in ocr_paths.items():
+        ocr_outputs = load_ocr_outputs(ocr_path)
+        pairs.extend((name, document, ocr_outputs[document]) for document in ground_truth if document in ocr_outputs)
+        missing[name] = sorted(set(ground_truth) - set(ocr_outputs))
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(
+            evaluate_document,
+            [ground_truth[document] for _, document, _ in pairs],
+            [ocr_text for _, _, ocr_text in pairs],
+            # a few chunks per process, so documents are not sent to the processes one at a time
+            chunksize=max(1, len(pairs) // (4 * max_workers)),
+        )
+        documents = [
+            {"ocr": name, "document": document, **result}
+            for (name, document, _), result in zip(pairs, results, strict=True)
+        ]
+
+    summary = {
+        name: {**summarise([d for d in documents if d["ocr"] == name]), "missing": missing[name]} for name in ocr_paths
+    }
+    return documents, summary
+
+
+def write_results(documents: list[dict], summary: dict, output_dir: Path) -> None:
+    """Write per-document metrics to documents.csv, and summary statistics to summary.json, in output_dir."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with Path.open(output_dir / "documents.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=DOCUMENT_FIELDS)
+        writer.writeheader()
+        writer.writerows(documents)
+    with Path.open(output_dir / "summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+
+
+def _ocr_path_arg(value: str) -> tuple[str, Path]:
+    """Parse [<name>=]<path>; the name defaults to the file or directory name."""
+    name, _, path = value.rpartition("=")
+    return name or Path(path).stem, Path(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate OCR performance metrics over a corpus of documents.")
+    parser.add_argument(
+        "-gt", "--ground_truth_dir", type=str, required=True, help="Directory of [.txt] ground truth files."
+    )
+    parser.add_argument(
+        "-ocr",
+        "--ocr",
+        type=_ocr_path_arg,
+        nargs="+",
+        required=True,
+        help="[<name>=]<path> to a directory of [.json/.txt] OCR outputs, or inference_folder or job results.",
+    )
+    parser.add_argument("-o", "--output_dir", type=str, default="ocr-eval", help="Directory to write results to.")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Number of processes (default: CPU count).")
+    args = parser.parse_args()
+
+    documents, summary = run_corpus(Path(args.ground_truth_dir), dict(args.ocr), max_workers=args.workers)
+    write_results(documents, summary, Path(args.output_dir))
+    print(f"OCR Evaluation results:\n{json.dumps(summary, indent=2)}")  # noqa: T201
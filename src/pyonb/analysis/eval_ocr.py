@@ -2,10 +2,10 @@
 
 import argparse
 import json
-from ast import literal_eval
 from pathlib import Path
 
 from pyonb.analysis.metrics import cer, ned, wer
+from pyonb.analysis.ocr_results import iter_ocr_documents
 
 
 def read_file(file_path: Path, file_encoding: str | None = None) -> str | dict:
@@ -34,24 +34,20 @@ def evaluate_metrics(gt_text: str, ocr_text: str) -> dict:
 def run(gt_path: Path, ocr_path: Path) -> dict:
     """Run OCR evaluation given ground truth and OCR file paths."""
     gt_file_output = read_file(gt_path)
-    ocr_file_output = read_file(ocr_path)
+    ocr_document = next(iter_ocr_documents(ocr_path), None)
+    if ocr_document is None:
+        msg = f"No OCR result found in {ocr_path}."
+        raise ValueError(msg)
 
-    if isinstance(ocr_file_output, str):
-        result = evaluate_metrics(str(gt_file_output), str(ocr_file_output))
-    elif isinstance(ocr_file_output, dict):
-        ocr_text = literal_eval(ocr_file_output["ocr-result"])
-        result = evaluate_metrics(str(gt_file_output), ocr_text)
-    else:
-        msg = "OCR file is not .txt or .json."
-        raise TypeError(msg)
-
-    return result
+    return evaluate_metrics(str(gt_file_output), ocr_document.text)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run and evaluate OCR performance metrics.")
     parser.add_argument("-gt", "--ground_truth_file", type=str, required=True, help="[.txt] Path to ground truth file.")
-    parser.add_argument("-ocr", "--ocr_file", type=str, required=True, help="[.json/.txt] Path to OCR processed file.")
+    parser.add_argument(
+        "-ocr", "--ocr_file", type=str, required=True, help="[.json/.txt/.ndjson] Path to OCR processed file."
+    )
     args = parser.parse_args()
 
     results = run(Path(args.ground_truth_file), Path(args.ocr_file))
@@ -0,0 +1,75 @@
+"""
+Fake OCR services, for benchmarking the forwarding API without any OCR models installed.
+
+Serves the marker, docling and paddleocr `/inference` API and kreuzberg's `/extract` API. Each request takes
+`latency` seconds per page of the uploaded PDF, and returns the text of the matching ground truth file if there
+is one, so accuracy metrics can still be computed.
+"""
+
+import argparse
+import asyncio
+from io import BytesIO
+from pathlib import Path
+from typing import Annotated
+
+import uvicorn
+from fastapi import FastAPI, File, UploadFile
+from pypdf import PdfReader
+from pypdf.errors import PyPdfError
+
+
+def count_pages(pdf: bytes) -> int:
+    """Number of pages in a PDF (1 if it can't be read)."""
+    try:
+        return max(1, len(PdfReader(BytesIO(pdf)).pages))
+    except (PyPdfError, ValueError):
+        return 1
+
+
+def create_app(latency: float = 0.0, text_dir: Path | None = None) -> FastAPI:
+    """
+    A fake OCR service.
+
+    latency is the time taken per page; text_dir is a directory of .txt files, returned as the OCR text of the
+    PDFs with the same name.
+    """
+    app = FastAPI()
+
+    async def ocr(file: UploadFile) -> str:
+        pdf = await file.read()
+        await asyncio.sleep(latency * count_pages(pdf))
+        stem = Path(file.filename or "").stem
+        if text_dir is not None and (text_dir / f"{stem}.txt").is_file():
+            return (text_dir / f"{stem}.txt").read_text()
+        return f"Fake OCR text of {file.filename}"
+
+    @app.get("/health")
+    async def health() -> dict[str, str]:
+        return {"status": "healthy"}
+
+    @app.post("/inference")
+    async def inference(file: Annotated[UploadFile, File()]) -> str:
+        return await ocr(file)
+
+    @app.post("/extract")
+    async def extract(data: Annotated[UploadFile, File()]) -> list[dict]:
+        return [{"content": await ocr(data), "mime_type": "text/plain", "metadata": {}}]
+
+    return app
+
+
+async def serve(ports: list[int], latency: float = 0.0, text_dir: Path | None = None) -> None:
+    """Serve a fake OCR service on each port, until cancelled."""
+    app = create_app(latency, text_dir)
+    servers = [uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning")) for port in ports]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake OCR services.")
+    parser.add_argument("-p", "--ports", type=int, nargs="+", required=True, help="Ports to serve on.")
+    parser.add_argument("-l", "--latency", type=float, default=0.0, help="Seconds taken per page.")
+    parser.add_argument("-t", "--text_dir", type=str, default=None, help="Directory of [.txt] texts to return.")
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.ports, args.latency, Path(args.text_dir) if args.text_dir else None))
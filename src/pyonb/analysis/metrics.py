@@ -15,34 +15,25 @@ def cer(gt: str, pred: str) -> float:
     return round(Levenshtein.distance(gt, pred) / len(gt), 3)
 
 
+def word_distance(gt: str, pred: str) -> int:
+    """Word-level edit distance: number of word insertions, deletions and substitutions to turn gt into pred."""
+    # Map each distinct word to an integer id, so the edit distance compares ints rather than strings
+    vocab: dict[str, int] = {}
+    gt_ids = [vocab.setdefault(word, len(vocab)) for word in gt.split()]
+    pred_ids = [vocab.setdefault(word, len(vocab)) for word in pred.split()]
+    return Levenshtein.distance(gt_ids, pred_ids)
+
+
 def wer(gt: str, pred: str) -> float:
     """
     Word Error Rate (WER): edit distance over tokenized words.
 
     WER = 0 - Perfect word match
     WER > 0 - ratio of word edits needed; values > 1.0 indicate more edits than original words'
-    """
-    gt_words = gt.split()
-    pred_words = pred.split()
-
-    # Initialise dynamic programming matrix for edit distance calculation
-    dp = [[0] * (len(pred_words) + 1) for _ in range(len(gt_words) + 1)]
 
-    for i in range(len(gt_words) + 1):
-        dp[i][0] = i
-    for j in range(len(pred_words) + 1):
-        dp[0][j] = j
-
-    for i in range(1, len(gt_words) + 1):
-        for j in range(1, len(pred_words) + 1):
-            cost = 0 if gt_words[i - 1] == pred_words[j - 1] else 1
-            dp[i][j] = min(
-                dp[i - 1][j] + 1,  # deletion
-                dp[i][j - 1] + 1,  # insertion
-                dp[i - 1][j - 1] + cost,  # substitution
-            )
-
-    return round(dp[len(gt_words)][len(pred_words)] / max(1, len(gt_words)), 3)
+    The word-level edit distance is computed by Levenshtein's C implementation, in O(min(n, m)) memory.
+    """
+    return round(word_distance(gt, pred) / max(1, len(gt.split())), 3)
 
 
 def emr(gt_list: list[str], pred_list: list[str]) -> float:
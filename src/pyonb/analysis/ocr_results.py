@@ -0,0 +1,224 @@
+"""Read OCR results saved from the pyonb forwarding API."""
+
+import json
+import logging
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any
+
+logger = logging.getLogger()
+
+# Characters read from a file at a time when streaming results
+CHUNK_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+@dataclass(frozen=True)
+class OCRDocument:
+    """OCR text of a single document, and the name of the file it came from (if known)."""
+
+    filename: str | None
+    text: str
+
+
+PayloadReader = Callable[[Any], str | None]
+
+_payload_readers: list[PayloadReader] = []
+
+
+def register_payload_reader(reader: PayloadReader) -> PayloadReader:
+    """
+    Register a function that extracts OCR text from an "ocr-result" payload, returning None if it can't.
+
+    Readers registered later are tried first, so they can override the built-in ones.
+    """
+    _payload_readers.insert(0, reader)
+    return reader
+
+
+@register_payload_reader
+def _read_text(payload: Any) -> str | None:  # noqa: ANN401
+    """Plain text, as returned by marker, docling and paddleocr (and kreuzberg's inference_single)."""
+    if not isinstance(payload, str):
+        return None
+    # the text may itself be JSON-encoded, e.g. raw OCR service responses in inference_folder results
+    if payload.startswith('"'):
+        try:
+            decoded = json.loads(payload)
+        except json.JSONDecodeError:
+            return payload
+        return decode_payload(decoded)
+    return payload
+
+
+@register_payload_reader
+def _read_kreuzberg(payload: Any) -> str | None:  # noqa: ANN401
+    """Kreuzberg's /extract response: a list of extracted documents."""
+    if isinstance(payload, list) and all(isinstance(item, dict) and "content" in item for item in payload):
+        return "\n".join(item["content"] for item in payload)
+    return None
+
+
+@register_payload_reader
+def _read_text_field(payload: Any) -> str | None:  # noqa: ANN401
+    """An object with the text in a "content", "text" or "markdown" field."""
+    if isinstance(payload, dict):
+        for field in ("content", "text", "markdown"):
+            if isinstance(payload.get(field), str):
+                return payload[field]
+    return None
+
+
+def decode_payload(payload: Any) -> str:  # noqa: ANN401
+    """Extract the OCR text from an "ocr-result" payload, using the first payload reader that understands it."""
+    for reader in _payload_readers:
+        text = reader(payload)
+        if text is not None:
+            return text
+    msg = f"Unrecognised OCR result of type {type(payload).__name__}."
+    raise TypeError(msg)
+
+
+def entry_document(entry: dict) -> OCRDocument | None:
+    """The document in a response entry, or None if OCR failed for it."""
+    failed = entry.get("status_code", 200) >= 400 or entry.get("status", "done") != "done"  # noqa: PLR2004
+    if failed or entry.get("ocr-result") is None:
+        logger.warning("Skipping failed OCR result for %s", entry.get("filename"))
+        return None
+    return OCRDocument(filename=entry.get("filename"), text=decode_payload(entry["ocr-result"]))
+
+
+class _JSONStream:
+    """Decode a JSON document from a text file one value at a time, without reading the whole file."""
+
+    def __init__(self, f: IO[str]) -> None:
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self, size: int = CHUNK_SIZE) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        # drop what has already been decoded, so memory is bounded by the largest single value
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, or "" at the end of the file."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._read():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def expect(self, char: str) -> None:
+        """Consume the next non-whitespace character, which must be char."""
+        if self.peek() != char:
+            msg = f"Expected '{char}' at position {self.pos}"
+            raise json.JSONDecodeError(msg, self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self) -> Any:  # noqa: ANN401
+        """Decode the next JSON value."""
+        self.peek()
+        size = CHUNK_SIZE
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # the value may continue past the end of the buffer
+                if not self._read(size):
+                    raise
+                size *= 2
+                continue
+            # a number at the end of the buffer may have more digits still to read
+            if end < len(self.buffer) or self.eof or not self._read(size):
+                self.pos = end
+                return value
+
+
+def _iter_json(f: IO[str]) -> Iterator[OCRDocument]:
+    """
+    Documents in a JSON response: a single document, or inference_folder or job results.
+
+    The "result" list of folder and job results is decoded one entry at a time.
+    """
+    stream = _JSONStream(f)
+    if stream.peek() != "{":
+        yield OCRDocument(filename=None, text=decode_payload(stream.value()))
+        return
+
+    stream.expect("{")
+    response: dict[str, Any] = {}
+    has_results = False
+    while stream.peek() != "}":
+        if response or has_results:
+            stream.expect(",")
+        key = stream.value()
+        stream.expect(":")
+        if key == "result" and stream.peek() == "[":
+            has_results = True
+            stream.expect("[")
+            while stream.peek() != "]":
+                if stream.peek() == ",":
+                    stream.expect(",")
+                document = entry_document(stream.value())
+                if document is not None:
+                    yield document
+            stream.expect("]")
+        else:
+            response[key] = stream.value()
+
+    if not has_results:
+        document = entry_document(response)
+        if document is not None:
+            yield document
+
+
+def _iter_lines(f: IO[str]) -> Iterator[OCRDocument]:
+    """Documents in streamed folder or job results: newline-delimited JSON, or server-sent events."""
+    for line in f:
+        record = line.strip()
+        if record.startswith("data:"):
+            record = record.removeprefix("data:").strip()
+        elif not record.startswith("{"):
+            # blank lines and SSE event names
+            continue
+        entry = json.loads(record)
+        # skip SSE "done" events, which summarise the stream rather than describe a document
+        if "filename" not in entry:
+            continue
+        document = entry_document(entry)
+        if document is not None:
+            yield document
+
+
+def iter_ocr_documents(file_path: Path, file_encoding: str | None = None) -> Iterator[OCRDocument]:
+    """
+    OCR documents saved in a file, in any of the shapes the forwarding API returns them.
+
+    - .txt/.text: the OCR text of a single document
+    - .json: an inference_single response, inference_folder or job results, or an OCR service's own response
+    - .ndjson/.jsonl/.sse: folder or job results streamed as newline-delimited JSON or server-sent events
+
+    Documents for which OCR failed are skipped.
+    """
+    file_type = file_path.suffix.lower()
+    with Path.open(file_path, "r", encoding=file_encoding) as f:
+        if file_type in (".txt", ".text"):
+            yield OCRDocument(filename=None, text=f.read())
+        elif file_type == ".json":
+            yield from _iter_json(f)
+        elif file_type in (".ndjson", ".jsonl", ".sse"):
+            yield from _iter_lines(f)
+        else:
+            e = f"Unsupported file type: {file_type}"
+            raise ValueError(e)
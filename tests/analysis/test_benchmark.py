@@ -0,0 +1,72 @@
+"""Test the benchmark harness."""
+
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from pyonb.analysis.benchmark import Corpus, RequestResult, accuracy_report, load_report
+from pyonb.analysis.fake_ocr import count_pages, create_app
+
+
+def test_count_pages() -> None:
+    """Test pages are counted from the PDF's page tree, including PDFs with compressed object streams."""
+    pdf = Path("tests/data/multiple_synthetic_docs/uk-hospital-note.pdf").read_bytes()
+    assert count_pages(pdf) == 5  # noqa: PLR2004
+    assert count_pages(b"not a pdf") == 1
+
+
+def test_corpus_load(tmp_path: Path) -> None:
+    """Test the corpus page counts, and that a PDF that can't be read is rejected."""
+    corpus = Corpus.load(Path("tests/data/single_synthetic_doc"))
+    assert corpus.pages == {"ms-note-one-page.pdf": 2}
+
+    (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+    with pytest.raises(ValueError, match=r"broken\.pdf"):
+        Corpus.load(tmp_path)
+
+
+def test_fake_ocr(tmp_path: Path) -> None:
+    """Test the fake OCR services return the ground truth for known documents."""
+    (tmp_path / "note.txt").write_text("the patient is well")
+    client = TestClient(create_app(text_dir=tmp_path))
+
+    response = client.post("/inference", files={"file": ("note.pdf", b"%PDF", "application/pdf")})
+    assert response.json() == "the patient is well"
+
+    response = client.post("/extract", files={"data": ("other.pdf", b"%PDF", "application/pdf")})
+    assert response.json()[0]["content"] == "Fake OCR text of other.pdf"
+
+
+def test_load_report() -> None:
+    """Test throughput, latency percentiles and error rates."""
+    results = [
+        RequestResult(latency=float(latency), status_code=200, documents=1, pages=2) for latency in range(1, 100)
+    ]
+    results.append(RequestResult(latency=100.0, status_code=500, failed_documents=1))
+
+    report = load_report(results, elapsed=10.0)
+
+    assert report["requests"] == 100  # noqa: PLR2004
+    assert report["error_rate"] == 0.01  # noqa: PLR2004
+    assert report["status_codes"] == {"200": 99, "500": 1}
+    assert report["documents_per_second"] == 9.9  # noqa: PLR2004
+    assert report["pages_per_second"] == 19.8  # noqa: PLR2004
+    assert report["latency_in_second"]["p50"] == 50.5  # noqa: PLR2004
+    assert report["latency_in_second"]["max"] == 100.0  # noqa: PLR2004
+
+
+def test_accuracy_report(tmp_path: Path) -> None:
+    """Test the first OCR text of each document is scored against the ground truth."""
+    (tmp_path / "exact.txt").write_text("the patient is well")
+    (tmp_path / "missing.txt").write_text("never OCR'd")
+    results = [
+        RequestResult(latency=1.0, status_code=200, documents=1, texts={"exact": "the patient is well"}),
+        RequestResult(latency=1.0, status_code=200, documents=1, texts={"exact": "something else"}),
+    ]
+
+    report = accuracy_report(results, tmp_path)
+
+    assert report["documents"] == 1
+    assert report["micro_wer"] == 0.0
+    assert report["missing"] == ["missing"]
@@ -0,0 +1,75 @@
+"""Test corpus OCR evaluation code."""
+
+import csv
+import json
+from pathlib import Path
+
+from pyonb.analysis.eval_corpus import load_ocr_outputs, run_corpus, summarise, write_results
+from pyonb.analysis.eval_ocr import run
+
+
+def _write_corpus(tmp_path: Path, ground_truth_txt_filepath: Path, marker_ocr_json_filepath: Path) -> dict[str, Path]:
+    """Two ground truth documents, and OCR outputs as a directory and as an inference_folder response."""
+    gt_text = ground_truth_txt_filepath.read_text()
+    marker_output = json.loads(marker_ocr_json_filepath.read_text())
+
+    gt_dir = tmp_path / "gt"
+    gt_dir.mkdir()
+    (gt_dir / "ms-note-one-page.txt").write_text(gt_text)
+    (gt_dir / "exact.txt").write_text("the patient is well")
+
+    ocr_dir = tmp_path / "txt"
+    ocr_dir.mkdir()
+    (ocr_dir / "exact.txt").write_text("the patient is well")
+
+    folder_response = tmp_path / "marker.json"
+    folder_response.write_text(
+        json.dumps({"total_duration_in_second": 1.0, "result": [marker_output]}),
+    )
+    return {"gt": gt_dir, "txt": ocr_dir, "marker": folder_response}
+
+
+def test_load_ocr_outputs(tmp_path: Path, ground_truth_txt_filepath: Path, marker_ocr_json_filepath: Path) -> None:
+    """Test OCR outputs are keyed by document name, from directories and inference_folder responses."""
+    paths = _write_corpus(tmp_path, ground_truth_txt_filepath, marker_ocr_json_filepath)
+
+    assert load_ocr_outputs(paths["txt"]) == {"exact": "the patient is well"}
+    assert list(load_ocr_outputs(paths["marker"])) == ["ms-note-one-page"]
+    assert list(load_ocr_outputs(marker_ocr_json_filepath)) == ["ms-note-one-page"]
+
+
+def test_run_corpus(tmp_path: Path, ground_truth_txt_filepath: Path, marker_ocr_json_filepath: Path) -> None:
+    """Test corpus evaluation matches evaluating each document on its own, and writes the results."""
+    paths = _write_corpus(tmp_path, ground_truth_txt_filepath, marker_ocr_json_filepath)
+
+    documents, summary = run_corpus(paths["gt"], {"txt": paths["txt"], "marker": paths["marker"]}, max_workers=2)
+
+    assert {(d["ocr"], d["document"]) for d in documents} == {("txt", "exact"), ("marker", "ms-note-one-page")}
+    marker_document = next(d for d in documents if d["ocr"] == "marker")
+    expected = run(ground_truth_txt_filepath, marker_ocr_json_filepath)
+    assert {metric: marker_document[metric] for metric in expected} == expected
+
+    assert summary["txt"]["documents"] == 1
+    assert summary["txt"]["cer"] == {"mean": 0.0, "median": 0.0, "p95": 0.0}
+    assert summary["txt"]["missing"] == ["ms-note-one-page"]
+    assert summary["marker"]["missing"] == ["exact"]
+
+    write_results(documents, summary, tmp_path / "results")
+    with Path.open(tmp_path / "results" / "documents.csv") as f:
+        assert len(list(csv.DictReader(f))) == len(documents)
+    assert json.loads((tmp_path / "results" / "summary.json").read_text()) == summary
+
+
+def test_summarise() -> None:
+    """Test micro-averaged rates weight documents by length, unlike the mean."""
+    documents = [
+        {"cer": 0.5, "wer": 1.0, "ned": 0.5, "char_edits": 1, "gt_chars": 2, "word_edits": 1, "gt_words": 1},
+        {"cer": 0.0, "wer": 0.0, "ned": 0.0, "char_edits": 0, "gt_chars": 98, "word_edits": 0, "gt_words": 9},
+    ]
+
+    summary = summarise(documents)
+
+    assert summary["documents"] == len(documents)
+    assert summary["cer"]["mean"] == 0.25  # noqa: PLR2004
+    assert summary["micro_cer"] == 0.01  # noqa: PLR2004
+    assert summary["micro_wer"] == 0.1  # noqa: PLR2004
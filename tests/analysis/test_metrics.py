@@ -0,0 +1,53 @@
+"""Test OCR metrics."""
+
+import random
+
+import pytest
+
+from pyonb.analysis.metrics import wer
+
+
+def _reference_wer(gt: str, pred: str) -> float:
+    """Word Error Rate computed with the full dynamic programming matrix."""
+    gt_words = gt.split()
+    pred_words = pred.split()
+
+    dp = [[0] * (len(pred_words) + 1) for _ in range(len(gt_words) + 1)]
+    for i in range(len(gt_words) + 1):
+        dp[i][0] = i
+    for j in range(len(pred_words) + 1):
+        dp[0][j] = j
+
+    for i in range(1, len(gt_words) + 1):
+        for j in range(1, len(pred_words) + 1):
+            cost = 0 if gt_words[i - 1] == pred_words[j - 1] else 1
+            dp[i][j] = min(dp[i - 1][j] + 1, dp[i][j - 1] + 1, dp[i - 1][j - 1] + cost)
+
+    return round(dp[len(gt_words)][len(pred_words)] / max(1, len(gt_words)), 3)
+
+
+@pytest.mark.parametrize(
+    ("gt", "pred", "expected"),
+    [
+        ("", "", 0.0),
+        ("", "one two", 2.0),
+        ("one two", "", 1.0),
+        ("the patient is well", "the patient is well", 0.0),
+        ("the patient is well", "the patient is unwell", 0.25),
+        ("the patient is well", "patient is well today", 0.5),
+        ("BP 120/80  mg\ndaily", "BP 120/80 mg daily", 0.0),
+    ],
+)
+def test_wer(gt: str, pred: str, expected: float) -> None:
+    """Test WER on hand-checked examples."""
+    assert wer(gt, pred) == expected
+
+
+def test_wer_matches_reference() -> None:
+    """Test WER matches the dynamic programming definition on random word sequences."""
+    rng = random.Random(0)  # noqa: S311
+    vocabulary = ["the", "patient", "mg", "BP", "120/80", "daily", "Patient", "the."]
+    for _ in range(500):
+        gt = " ".join(rng.choices(vocabulary, k=rng.randint(0, 25)))
+        pred = " ".join(rng.choices(vocabulary, k=rng.randint(0, 25)))
+        assert wer(gt, pred) == _reference_wer(gt, pred)
@@ -0,0 +1,64 @@
+"""Test reading OCR results."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from pyonb.analysis import ocr_results
+from pyonb.analysis.ocr_results import OCRDocument, decode_payload, iter_ocr_documents
+
+ENTRIES = [
+    {"filename": "one.pdf", "duration_in_second": 1.5, "cached": False, "status_code": 200, "ocr-result": '"one"'},
+    {"filename": "failed.pdf", "duration_in_second": 0.1, "cached": False, "status_code": 500, "ocr-result": "error"},
+    {"filename": "two.pdf", "duration_in_second": 2.5, "cached": True, "status_code": 200, "ocr-result": '"two\\n"'},
+]
+EXPECTED = [OCRDocument("one.pdf", "one"), OCRDocument("two.pdf", "two\n")]
+
+
+@pytest.mark.parametrize(
+    ("payload", "expected"),
+    [
+        ("plain text", "plain text"),
+        ('"JSON-encoded \\"text\\""', 'JSON-encoded "text"'),
+        ('"quoted" text', '"quoted" text'),
+        ([{"content": "kreuzberg"}], "kreuzberg"),
+        ({"markdown": "# text"}, "# text"),
+    ],
+)
+def test_decode_payload(payload: object, expected: str) -> None:
+    """Test OCR text is extracted from each engine's payload."""
+    assert decode_payload(payload) == expected
+
+
+def test_iter_ocr_documents_single(marker_ocr_json_filepath: Path) -> None:
+    """Test reading a single inference_single response."""
+    documents = list(iter_ocr_documents(marker_ocr_json_filepath))
+
+    assert len(documents) == 1
+    assert documents[0].filename == "ms-note-one-page.pdf"
+    assert documents[0].text.startswith("## **MANCHESTER ROYAL INFIRMARY**")
+
+
+@pytest.mark.parametrize(
+    ("filename", "content"),
+    [
+        ("folder.json", json.dumps({"total_duration_in_second": 4.1, "result": ENTRIES})),
+        ("job.json", json.dumps({"job_id": "1", "status": "completed", "result": ENTRIES})),
+        ("folder.ndjson", "".join(json.dumps(entry) + "\n" for entry in ENTRIES)),
+        (
+            "folder.sse",
+            "".join(f"event: result\ndata: {json.dumps(entry)}\n\n" for entry in ENTRIES)
+            + 'event: done\ndata: {"total_duration_in_second": 4.1}\n\n',
+        ),
+    ],
+)
+def test_iter_ocr_documents_folder(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, filename: str, content: str
+) -> None:
+    """Test reading folder and job results, skipping failed documents, when read a few characters at a time."""
+    monkeypatch.setattr(ocr_results, "CHUNK_SIZE", 3)
+    file_path = tmp_path / filename
+    file_path.write_text(content)
+
+    assert list(iter_ocr_documents(file_path)) == EXPECTED
@@ -0,0 +1,137 @@
+"""Test single-flight coalescing of identical OCR requests."""
+
+import asyncio
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pyonb_api")
+
+from fastapi import UploadFile
+from pyonb_api import coalesce
+from pyonb_api.coalesce import SingleFlight, coalesce_upload, in_flight
+
+
+def test_shared() -> None:
+    """Test calls with the same key share one call, and calls with other keys don't."""
+    calls = []
+
+    async def fn(result: str) -> str:
+        calls.append(result)
+        await asyncio.sleep(0.01)
+        return result
+
+    async def run() -> list[tuple[str, bool]]:
+        flight = SingleFlight()
+        results = await asyncio.gather(
+            flight.do("a", lambda: fn("first")),
+            flight.do("a", lambda: fn("second")),
+            flight.do(("folder", "a"), lambda: fn("folder")),
+        )
+        assert len(flight) == 0
+        return list(results)
+
+    assert asyncio.run(run()) == [("first", False), ("first", True), ("folder", False)]
+    assert calls == ["first", "folder"]
+
+
+def test_exception_shared() -> None:
+    """Test every caller gets the exception of a failed call, and the next call starts afresh."""
+
+    async def fail() -> str:
+        await asyncio.sleep(0.01)
+        msg = "OCR failed"
+        raise ValueError(msg)
+
+    async def succeed() -> str:
+        return "text"
+
+    async def run() -> None:
+        flight = SingleFlight()
+        results = await asyncio.gather(flight.do("a", fail), flight.do("a", fail), return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError, ValueError]
+        assert await flight.do("a", succeed) == ("text", False)
+
+    asyncio.run(run())
+
+
+def test_leader_cancelled() -> None:
+    """Test the call carries on for the others if its first caller is cancelled, and stops once every caller is."""
+    finished = []
+
+    async def fn() -> str:
+        await asyncio.sleep(0.05)
+        finished.append(True)
+        return "text"
+
+    async def run() -> None:
+        flight = SingleFlight()
+        leader = asyncio.create_task(flight.do("a", fn))
+        follower = asyncio.create_task(flight.do("a", fn))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await follower == ("text", True)
+        assert finished == [True]
+
+        leader = asyncio.create_task(flight.do("b", fn))
+        follower = asyncio.create_task(flight.do("b", fn))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        follower.cancel()
+        await asyncio.sleep(0.1)
+        assert finished == [True]
+        assert len(flight) == 0
+
+    asyncio.run(run())
+
+
+def test_coalesce_upload() -> None:
+    """Test the shared request sends a copy of the upload, which outlives the upload and is deleted afterwards."""
+    sent: list[Path] = []
+
+    async def run() -> list[str]:
+        sending = asyncio.Event()
+        uploads_closed = asyncio.Event()
+
+        async def send(document: Path) -> str:
+            sent.append(document)
+            sending.set()
+            await uploads_closed.wait()
+            return document.read_text()
+
+        uploads = [UploadFile(BytesIO(b"%PDF"), filename="note.pdf") for _ in range(2)]
+        results = asyncio.gather(*(coalesce_upload(("single", "key"), "marker", upload, send) for upload in uploads))
+        await sending.wait()
+        for upload in uploads:
+            await upload.close()
+        uploads_closed.set()
+        return await results
+
+    assert asyncio.run(run()) == ["%PDF", "%PDF"]
+    assert len(sent) == 1
+    assert not sent[0].exists()
+    assert len(in_flight) == 0
+
+
+def test_coalesce_upload_spools_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test only the request that starts the call copies its upload, and the others just wait for the result."""
+    spooled: list[UploadFile] = []
+    spool_upload = coalesce.spool_upload
+
+    async def counted_spool_upload(file: UploadFile, engine: str) -> Path:
+        spooled.append(file)
+        return await spool_upload(file, engine)
+
+    monkeypatch.setattr(coalesce, "spool_upload", counted_spool_upload)
+
+    async def send(document: Path) -> str:
+        await asyncio.sleep(0.05)
+        return document.read_text()
+
+    async def run() -> list[str]:
+        uploads = [UploadFile(BytesIO(b"%PDF"), filename="note.pdf") for _ in range(5)]
+        return list(await asyncio.gather(*(coalesce_upload(("single", "key"), "marker", u, send) for u in uploads)))
+
+    assert asyncio.run(run()) == ["%PDF"] * 5
+    assert len(spooled) == 1
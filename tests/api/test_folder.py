@@ -0,0 +1,75 @@
+"""Test the concurrency limit shared by folder inference and job workers."""
+
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+pytest.importorskip("pyonb_api")
+
+from pyonb_api import folder, jobs
+from pyonb_api.cache import CacheMode
+from pyonb_api.jobs import Engine, JobRunner, JobStatus, JobStore
+
+
+class FakePool:
+    """OCR service backends that record how many documents they are sent at once."""
+
+    engine = "marker"
+
+    def __init__(self) -> None:
+        """Start with nothing in flight."""
+        self.in_flight = 0
+        self.peak = 0
+
+    def post(self, path: str, **kwargs: Any) -> "FakePool":  # noqa: ANN401, ARG002
+        """Return the response to a document."""
+        return self
+
+    async def __aenter__(self) -> SimpleNamespace:
+        """OCR a document, slowly."""
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.02)
+
+        async def text() -> str:
+            return '"text"'
+
+        return SimpleNamespace(status=200, text=text, headers={})
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        """Finish the document."""
+        self.in_flight -= 1
+
+
+def test_folder_and_job_share_concurrency(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """Test a folder request and a job running at once send no more documents than the engine's concurrency."""
+    filenames = [f"{i}.pdf" for i in range(4)]
+    folder_path, job_path = tmp_path / "folder", tmp_path / "job"
+    for i, path in enumerate((folder_path, job_path)):
+        path.mkdir()
+        for j, filename in enumerate(filenames):
+            # distinct documents, so no two are coalesced into one call
+            (path / filename).write_bytes(b"%%PDF-%d" % (i * len(filenames) + j))
+    pool = FakePool()
+    monkeypatch.setattr(folder, "_semaphores", {})
+    monkeypatch.setattr(jobs, "get_pool", lambda _: pool)
+
+    async def run() -> None:
+        runner = JobRunner(JobStore(tmp_path / "jobs.sqlite3", lease=60))
+        await runner.start({"marker": Engine(path="/inference", concurrency=2)})
+        try:
+            job_id = await runner.submit("marker", filenames, job_path, {}, CacheMode.BYPASS)
+            result = await folder.inference_on_folder(
+                pool, "/inference", folder_path, concurrency=2, engine="marker", cache=CacheMode.BYPASS
+            )
+            assert len(result["result"]) == len(filenames)
+            await runner._queues["marker"].join()  # noqa: SLF001
+            assert runner.store.get_job(job_id)["status"] == JobStatus.COMPLETED
+        finally:
+            await runner.stop()
+
+    asyncio.run(run())
+    assert pool.peak == 2  # noqa: PLR2004
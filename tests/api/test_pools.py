@@ -0,0 +1,114 @@
+"""Test the balancing and circuit breaking of OCR service backend pools."""
+
+import asyncio
+import socket
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+
+pytest.importorskip("pyonb_api")
+
+from prometheus_client import REGISTRY
+from pyonb_api import pools
+from pyonb_api.pools import Backend, BackendPool, NoBackendError
+
+
+class FakeSession:
+    """Client session whose health checks succeed or fail."""
+
+    def __init__(self, healthy: bool) -> None:
+        """Answer every health check with `healthy`."""
+        self.healthy = healthy
+
+    def get(self, url: str, **kwargs: Any) -> "FakeSession":  # noqa: ANN401, ARG002
+        """Return the health check response."""
+        return self
+
+    async def __aenter__(self) -> SimpleNamespace:
+        """Respond to the health check."""
+        return SimpleNamespace(ok=self.healthy)
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        """Finish the health check."""
+
+
+def make_pool(*urls: str) -> BackendPool:
+    """A marker pool with the given backends."""
+    pool = BackendPool("marker", [])
+    pool.backends = {url: Backend(url) for url in urls}
+    return pool
+
+
+def test_choose_least_outstanding() -> None:
+    """Test requests go to the backend with the fewest requests in flight, then the fewest requests sent."""
+    pool = make_pool("http://a:1", "http://b:1", "http://c:1")
+    pool.backends["http://a:1"].outstanding = 2
+    pool.backends["http://b:1"].outstanding = 1
+    pool.backends["http://c:1"].outstanding = 1
+    pool.backends["http://b:1"].requests = 5
+    assert pool.choose().url == "http://c:1"
+
+    pool.backends["http://c:1"].outstanding = 3
+    assert pool.choose().url == "http://b:1"
+
+
+def test_eject_and_readmit(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a failing backend is ejected, and re-admitted by a successful probe once it has been out long enough."""
+    pool = make_pool("http://a:1", "http://b:1")
+    a = pool.backends["http://a:1"]
+    for _ in range(pools.POOL_FAILURE_THRESHOLD - 1):
+        pool.record_failure(a)
+    assert a.available
+
+    pool.record_failure(a)
+    assert not a.available
+    assert pool.choose().url == "http://b:1"
+
+    # a healthy probe doesn't re-admit a backend before POOL_EJECT_SECONDS are up
+    monkeypatch.setattr(pools, "get_session", lambda _: FakeSession(healthy=True))
+    asyncio.run(pool.probe(a))
+    assert not a.available
+    assert a.failures == 0
+
+    a.ejected_until = 0
+    monkeypatch.setattr(pools, "get_session", lambda _: FakeSession(healthy=False))
+    asyncio.run(pool.probe(a))
+    assert not a.available
+
+    monkeypatch.setattr(pools, "get_session", lambda _: FakeSession(healthy=True))
+    asyncio.run(pool.probe(a))
+    assert a.available
+
+
+def test_no_backend() -> None:
+    """Test choosing a backend fails if every backend has been ejected."""
+    pool = make_pool("http://a:1")
+    pool.backends["http://a:1"].ejected_until = float("inf")
+    with pytest.raises(NoBackendError):
+        pool.choose()
+
+
+def test_resolve_removes_metrics(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test backends that no longer resolve are dropped from the pool, along with their metrics."""
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR", raising=False)
+    addresses = ["10.0.0.1", "10.0.0.2"]
+
+    def getaddrinfo(host: str, port: int, *args: Any, **kwargs: Any) -> list:  # noqa: ANN401, ARG001
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port)) for address in addresses]
+
+    monkeypatch.setattr(socket, "getaddrinfo", getaddrinfo)
+    pool = BackendPool("marker", [("marker", 8112)])
+    asyncio.run(pool.resolve())
+    assert set(pool.backends) == {"http://10.0.0.1:8112", "http://10.0.0.2:8112"}
+
+    def available(url: str) -> float | None:
+        return REGISTRY.get_sample_value("pyonb_backend_available", {"engine": "marker", "backend": url})
+
+    assert available("http://10.0.0.2:8112") == 1
+
+    addresses.pop()
+    asyncio.run(pool.resolve())
+    assert set(pool.backends) == {"http://10.0.0.1:8112"}
+    assert available("http://10.0.0.1:8112") == 1
+    assert available("http://10.0.0.2:8112") is None
@@ -4,6 +4,8 @@ Test functions in /src/api/app/routers.
 - Note: Tests require running Docker services.
 """
 
+import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import requests
@@ -37,6 +39,14 @@ def test_router_kreuzberg(ocr_forwarding_api_port: str) -> None:
     assert response.json() == {"service": "kreuzberg", "status": "healthy"}
 
 
+def test_backends(ocr_forwarding_api_port: str) -> None:
+    """Test each OCR service has a backend in its pool."""
+    response = requests.get(f"http://127.0.0.1:{ocr_forwarding_api_port}/backends", timeout=5)
+    assert response.status_code == requests.codes.ok
+    for service in ("marker", "docling", "paddleocr", "kreuzberg"):
+        assert any(backend["available"] for backend in response.json()[service])
+
+
 def test_inference_single_file_upload_marker(ocr_forwarding_api_port: str, single_pdf_filepath: Path) -> None:
     """Test PDF conversion using marker with single file endpoint."""
     url = f"http://127.0.0.1:{ocr_forwarding_api_port}/marker/inference_single"
@@ -99,6 +109,82 @@ def test_inference_single_file_upload_kreuzberg(ocr_forwarding_api_port: str, si
     assert response.json()["filename"] == single_pdf_filename
 
 
+def test_inference_single_file_sharded_paddleocr(ocr_forwarding_api_port: str, single_pdf_filepath: Path) -> None:
+    """Test OCR'ing a PDF one page per shard gives the same text as OCR'ing it whole."""
+    url = f"http://127.0.0.1:{ocr_forwarding_api_port}/paddleocr/inference_single"
+
+    single_pdf_filename = single_pdf_filepath.name
+
+    results = []
+    for shard_pages in (0, 1):
+        with Path.open(single_pdf_filepath, "rb") as f:
+            files = {"file_upload": (single_pdf_filename, f, "application/pdf")}
+            params = {"cache": "bypass", "shard_pages": shard_pages}
+            response = requests.post(url, files=files, params=params, timeout=60 * 60)
+        assert response.status_code == requests.codes.ok
+        results.append(response.json()["ocr-result"])
+
+    whole, sharded = results
+    assert sharded == whole
+
+
+def test_ocr_inference_routed(ocr_forwarding_api_port: str, single_pdf_filepath: Path) -> None:
+    """Test a PDF is OCR'd by the engine chosen for it."""
+    url = f"http://127.0.0.1:{ocr_forwarding_api_port}/ocr/inference"
+
+    single_pdf_filename = single_pdf_filepath.name
+
+    with Path.open(single_pdf_filepath, "rb") as f:
+        files = {"file_upload": (single_pdf_filename, f, "application/pdf")}
+        response = requests.post(url, files=files, params={"cache": "bypass"}, timeout=60 * 60)
+
+    assert response.status_code == requests.codes.ok
+    assert response.json()["filename"] == single_pdf_filename
+    routing = response.json()["routing"]
+    assert routing["route"] in {"text", "scan", "large_scan"}
+    assert response.json()["engine"] in routing["engines"]
+    assert response.json()["ocr-result"]
+
+
+def test_inference_single_file_cached_marker(ocr_forwarding_api_port: str, single_pdf_filepath: Path) -> None:
+    """Test re-submitting a PDF to marker returns the cached result, unless the cache is bypassed."""
+    url = f"http://127.0.0.1:{ocr_forwarding_api_port}/marker/inference_single"
+
+    single_pdf_filename = single_pdf_filepath.name
+
+    responses = []
+    for cache in ("refresh", "use", "bypass"):
+        with Path.open(single_pdf_filepath, "rb") as f:
+            files = {"file_upload": (single_pdf_filename, f, "application/pdf")}
+            response = requests.post(url, files=files, params={"cache": cache}, timeout=60 * 60)
+        assert response.status_code == requests.codes.ok
+        responses.append(response.json())
+
+    refreshed, cached, bypassed = responses
+    assert not refreshed["cached"]
+    assert cached["cached"]
+    assert cached["ocr-result"] == refreshed["ocr-result"]
+    assert not bypassed["cached"]
+
+
+def test_inference_single_file_coalesced_kreuzberg(ocr_forwarding_api_port: str, single_pdf_filepath: Path) -> None:
+    """Test concurrent identical requests, which share one request to the OCR service, all get the same result."""
+    url = f"http://127.0.0.1:{ocr_forwarding_api_port}/kreuzberg-ocr/inference_single"
+    content = single_pdf_filepath.read_bytes()
+
+    def post() -> requests.Response:
+        files = {"file_upload": (single_pdf_filepath.name, content, "application/pdf")}
+        return requests.post(url, files=files, params={"cache": "bypass"}, timeout=60 * 60)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        responses = list(executor.map(lambda _: post(), range(4)))
+
+    assert all(response.status_code == requests.codes.ok for response in responses)
+    results = {response.json()["ocr-result"] for response in responses}
+    assert len(results) == 1
+    assert results.pop()
+
+
 def test_inference_on_folder_marker(ocr_forwarding_api_port: str) -> None:
     """
     Test PDF conversion using marker pointed at a folder of files.
@@ -157,3 +243,32 @@ def test_inference_on_folder_paddleocr(ocr_forwarding_api_port: str) -> None:
         "uk-hospital-note-2.pdf",
         "uk-hospital-note-3.pdf",
     }
+
+
+def test_job_marker(ocr_forwarding_api_port: str) -> None:
+    """
+    Test submitting a job to run marker on a folder of files, and streaming its results.
+
+    Note:
+    - may take ~minutes to perform inference
+
+    """
+    url = f"http://127.0.0.1:{ocr_forwarding_api_port}/jobs"
+
+    response = requests.post(url, json={"engine": "marker"}, timeout=60)
+    assert response.status_code == requests.codes.accepted
+    job_id = response.json()["job_id"]
+    n_documents = response.json()["documents"]
+
+    with requests.get(f"{url}/{job_id}/stream", stream=True, timeout=60 * 60) as response:
+        assert response.status_code == requests.codes.ok
+        results = [json.loads(line) for line in response.iter_lines() if line]
+    assert len(results) == n_documents
+    assert all(result["status"] == "done" for result in results)
+
+    response = requests.get(f"{url}/{job_id}", timeout=5)
+    assert response.status_code == requests.codes.ok
+    assert response.json()["status"] == "completed"
+
+    response = requests.delete(f"{url}/{job_id}", timeout=5)
+    assert response.status_code == requests.codes.conflict
@@ -0,0 +1,29 @@
+"""Test splitting documents into shards, and joining their results."""
+
+import pytest
+
+pytest.importorskip("pyonb_api")
+
+from pyonb_api.sharding import merge_page_headers, page_headers, page_ranges
+
+
+def test_page_ranges() -> None:
+    """Test documents are split into shards of shard_pages pages, unless sharding is off."""
+    assert page_ranges(10, 4) == [(1, 4), (5, 8), (9, 10)]
+    assert page_ranges(10, 0) == [(1, 10)]
+    assert page_ranges(0, 4) == []
+
+
+def test_merge_page_headers() -> None:
+    """Test the page headers of a sharded document list the pages of every shard."""
+    headers = {"X-Text-Layer-Pages": "1-2", "X-OCR-Pages": "3", "Content-Type": "application/json"}
+    assert page_headers(headers) == {"X-Text-Layer-Pages": "1-2", "X-OCR-Pages": "3"}
+
+    shards = [
+        {"X-Text-Layer-Pages": "1-2", "X-OCR-Pages": "3"},
+        {"X-Text-Layer-Pages": "4", "X-OCR-Pages": "5-6"},
+        {"X-Text-Layer-Pages": "7-9", "X-OCR-Pages": ""},
+    ]
+    assert merge_page_headers(shards) == {"X-Text-Layer-Pages": "1-2,4,7-9", "X-OCR-Pages": "3,5-6"}
+    # a shard that didn't report its pages leaves the document's pages unknown
+    assert merge_page_headers([*shards, {}]) == {}
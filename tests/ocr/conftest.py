@@ -0,0 +1,25 @@
+"""Register the OCR services' metrics without clashing with the forwarding API's."""
+
+import contextlib
+
+from prometheus_client import REGISTRY
+
+
+def _pyonb_metrics() -> set:
+    """The collectors registered for pyonb metrics."""
+    return {collector for name, collector in REGISTRY._names_to_collectors.items() if name.startswith("pyonb_")}  # noqa: SLF001
+
+
+# The forwarding API and the OCR services run in separate processes, and define metrics with the same names. Their
+# tests run in one process, so the services' metrics are registered without the forwarding API's, then dropped.
+forwarding_api_metrics = _pyonb_metrics()
+for collector in forwarding_api_metrics:
+    REGISTRY.unregister(collector)
+try:
+    with contextlib.suppress(ImportError):
+        import pyonb_ocr_common.metrics  # noqa: F401
+finally:
+    for collector in _pyonb_metrics():
+        REGISTRY.unregister(collector)
+    for collector in forwarding_api_metrics:
+        REGISTRY.register(collector)
@@ -0,0 +1,24 @@
+"""Test the PaddleOCR service."""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("paddleocr")
+
+from pyonb_ocr_common.executor import OCRExecutor
+from pyonb_paddleocr import api
+from pyonb_paddleocr.models import preload_models
+
+
+def test_lifespan_process_executor(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the service starts with OCR_EXECUTOR=process, preloading models in the executor's processes."""
+    # the executor's processes read the models to preload from the environment; don't download any
+    monkeypatch.setenv("PADDLEOCR_PRELOAD_MODELS", "")
+    monkeypatch.setattr(api, "ocr_executor", OCRExecutor(kind="process", initializer=preload_models))
+
+    async def run() -> None:
+        async with api.lifespan(api.app):
+            pass
+
+    asyncio.run(run())
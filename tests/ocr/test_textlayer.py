@@ -0,0 +1,89 @@
+"""Test the text-layer fast path of the OCR services."""
+
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("pyonb_ocr_common")
+pytest.importorskip("pypdf")
+
+from PIL import Image
+from pyonb_ocr_common.textlayer import page_headers, trustworthy, with_text_layer
+from pypdf import PdfReader, PdfWriter
+
+BORN_DIGITAL_PDF = Path("tests/data/multiple_synthetic_docs/uk-hospital-note.pdf")
+SCAN_JPG = Path("tests/data/multiple_synthetic_docs/ms-note-one-page.jpg")
+
+
+@pytest.fixture(scope="module")
+def mixed_pdf() -> bytes:
+    """A PDF of two born-digital pages, a scanned (image-only) page, then another born-digital page."""
+    scan = BytesIO()
+    Image.open(SCAN_JPG).convert("RGB").save(scan, "PDF")
+    born_digital = PdfReader(BORN_DIGITAL_PDF)
+
+    writer = PdfWriter()
+    writer.add_page(born_digital.pages[0])
+    writer.add_page(born_digital.pages[1])
+    writer.add_page(PdfReader(scan).pages[0])
+    writer.add_page(born_digital.pages[2])
+    pdf = BytesIO()
+    writer.write(pdf)
+    return pdf.getvalue()
+
+
+def test_trustworthy() -> None:
+    """Test only text layers that are long enough and readable are trusted."""
+    assert trustworthy("The patient was admitted with chest pain and discharged the following day.")
+    assert not trustworthy("Page 1")
+    # unreadable characters: replacement characters, and private use characters from fonts with no Unicode mapping
+    assert not trustworthy("\ufffd" * 10 + "The patient was admitted with chest pain and discharged.")
+    assert not trustworthy("\ue000" * 60)
+
+
+def test_born_digital() -> None:
+    """Test a born-digital PDF is taken from its text layer, without OCR."""
+
+    def convert(**kwargs: int | None) -> str:
+        pytest.fail(f"OCR'd pages {kwargs} of a born-digital PDF")
+
+    text, report = with_text_layer(convert, BORN_DIGITAL_PDF)
+    assert report == {"text_layer": [1, 2, 3, 4, 5], "ocr": []}
+    assert text
+    assert page_headers(report) == {"X-Text-Layer-Pages": "1-5", "X-OCR-Pages": ""}
+
+
+def test_mixed(mixed_pdf: bytes) -> None:
+    """Test only the scanned page of a mixed PDF is OCR'd, and the text is joined in page order."""
+    calls = []
+
+    def convert(first_page: int | None, last_page: int | None) -> str:
+        calls.append((first_page, last_page))
+        return "OCR TEXT\n"
+
+    text, report = with_text_layer(convert, BytesIO(mixed_pdf), separator="\n\n")
+    assert calls == [(3, 3)]
+    assert report == {"text_layer": [1, 2, 4], "ocr": [3]}
+    assert page_headers(report) == {"X-Text-Layer-Pages": "1-2,4", "X-OCR-Pages": "3"}
+    parts = text.split("\n\n")
+    assert parts.index("OCR TEXT") == 2  # noqa: PLR2004
+
+    # only the pages asked for are checked
+    calls.clear()
+    _, report = with_text_layer(convert, BytesIO(mixed_pdf), first_page=3, last_page=4)
+    assert report == {"text_layer": [4], "ocr": [3]}
+    assert calls == [(3, 3)]
+
+
+def test_ocr_failure(mixed_pdf: bytes) -> None:
+    """Test a document fails if OCR of its other pages fails, rather than returning it with pages missing."""
+    with pytest.raises(RuntimeError, match="pages 3-3"):
+        with_text_layer(lambda **_: None, BytesIO(mixed_pdf))
+
+
+def test_unreadable() -> None:
+    """Test a file that can't be read as a PDF is OCR'd as usual."""
+    text, report = with_text_layer(lambda **kwargs: f"OCR of {kwargs}", BytesIO(b"not a pdf"), first_page=2)
+    assert text == "OCR of {'first_page': 2, 'last_page': None}"
+    assert report is None